@@ -163,19 +163,54 @@ _DASHBOARD_HTML = """
   <script>
     const API = '/api/v1/analytics';
 
-    async function loadSPCStats() {
+    const fmt = v => (v === null || v === undefined) ? '-' : v.toFixed(3);
+    const hline = (y, color, dash) => ({ type: 'line', xref: 'paper', x0: 0, x1: 1, y0: y, y1: y, line: { color, dash } });
+
+    function renderStats(d) {
+      document.getElementById('spc-stats').innerHTML = `
+        <div class="stat-row"><span class="stat-label">Readings</span><span class="stat-value">${d.count}</span></div>
+        <div class="stat-row"><span class="stat-label">Mean</span><span class="stat-value">${fmt(d.mean)}</span></div>
+        <div class="stat-row"><span class="stat-label">Std Dev</span><span class="stat-value">${fmt(d.std)}</span></div>
+        <div class="stat-row"><span class="stat-label">UCL</span><span class="stat-value">${fmt(d.control_limits?.ucl)}</span></div>
+        <div class="stat-row"><span class="stat-label">LCL</span><span class="stat-value">${fmt(d.control_limits?.lcl)}</span></div>
+        <div class="stat-row"><span class="stat-label">Anomalies</span><span class="stat-value">${d.anomaly_indices.length}</span></div>
+      `;
+    }
+
+    function plot(containerId, data, layout) {
+      const el = document.getElementById(containerId);
+      if (!data.length || !(data[0].y || data[0].z || []).length) {
+        el.innerHTML = '<div class="loading">No data for chart.</div>';
+        return;
+      }
+      el.innerHTML = '';
+      Plotly.react(containerId, data, Object.assign({ margin: { t: 20, r: 20, b: 40, l: 50 } }, layout), { responsive: true });
+    }
+
+    function renderCharts(s) {
+      const x = s.series.values.map((_, i) => i);
+      const lim = s.series.xbar_limits;
+      plot('chart-xbar', [{ x, y: s.series.values, text: s.series.labels, mode: 'lines+markers', name: 'Values', line: { color: '#2563eb' } }],
+        { xaxis: { title: 'Sample' }, yaxis: { title: 'Value' },
+          shapes: lim ? [hline(lim.center, 'green', 'dash'), hline(lim.ucl, 'red', 'dot'), hline(lim.lcl, 'red', 'dot')] : [] });
+      plot('chart-cusum', [{ x, y: s.series.cusum, text: s.series.labels, mode: 'lines+markers', name: 'CUSUM', line: { color: '#7c3aed' } }],
+        { xaxis: { title: 'Sample' }, yaxis: { title: 'CUSUM' }, shapes: [hline(0, 'gray', 'dash')] });
+      const total = s.pareto.values.reduce((a, b) => a + b, 0);
+      let run = 0;
+      const cum = s.pareto.values.map(v => (run += v) / (total || 1) * 100);
+      plot('chart-pareto', [
+        { type: 'bar', x: s.pareto.labels, y: s.pareto.values, name: 'Count', marker: { color: '#2563eb' } },
+        { x: s.pareto.labels, y: cum, mode: 'lines+markers', name: 'Cumulative %', yaxis: 'y2', line: { color: '#dc2626' } },
+      ], { yaxis: { title: 'Count' }, yaxis2: { overlaying: 'y', side: 'right', range: [0, 105], title: 'Cumulative %' } });
+      plot('chart-heatmap', [{ type: 'heatmap', x: s.heatmap.x, y: s.heatmap.y, z: s.heatmap.z, colorscale: 'Viridis' }], {});
+    }
+
+    async function loadSnapshot() {
       try {
-        const r = await fetch(API + '/spc/stats?limit=200');
-        const d = await r.json();
-        const el = document.getElementById('spc-stats');
-        el.innerHTML = `
-          <div class="stat-row"><span class="stat-label">Readings</span><span class="stat-value">${d.count}</span></div>
-          <div class="stat-row"><span class="stat-label">Mean</span><span class="stat-value">${d.mean?.toFixed(3) ?? '-'}</span></div>
-          <div class="stat-row"><span class="stat-label">Std Dev</span><span class="stat-value">${d.std?.toFixed(3) ?? '-'}</span></div>
-          <div class="stat-row"><span class="stat-label">UCL</span><span class="stat-value">${d.control_limits?.ucl?.toFixed(3) ?? '-'}</span></div>
-          <div class="stat-row"><span class="stat-label">LCL</span><span class="stat-value">${d.control_limits?.lcl?.toFixed(3) ?? '-'}</span></div>
-          <div class="stat-row"><span class="stat-label">Anomalies</span><span class="stat-value">${d.anomaly_indices?.length ?? 0}</span></div>
-        `;
+        const r = await fetch(API + '/dashboard/snapshot');
+        const s = await r.json();
+        renderStats(s.stats);
+        renderCharts(s);
       } catch (e) {
         document.getElementById('spc-stats').innerHTML = '<div class="error">Failed to load. Ensure data exists.</div>';
       }
@@ -196,33 +231,13 @@ _DASHBOARD_HTML = """
       }
     }
 
-    async function loadChart(endpoint, containerId) {
-      try {
-        const r = await fetch(API + endpoint);
-        const json = await r.json();
-        const el = document.getElementById(containerId);
-        el.innerHTML = '';
-        if (json.data && json.data.length > 0) {
-          Plotly.newPlot(containerId, json.data, json.layout || {}, { responsive: true });
-        } else {
-          el.innerHTML = '<div class="loading">No data for chart.</div>';
-        }
-      } catch (e) {
-        document.getElementById(containerId).innerHTML = '<div class="error">Failed to load chart.</div>';
-      }
-    }
-
     async function init() {
-      await loadSPCStats();
-      await loadMaintenanceSummary();
-      await loadChart('/charts/spc-xbar?limit=100', 'chart-xbar');
-      await loadChart('/charts/spc-cusum?limit=100', 'chart-cusum');
-      await loadChart('/charts/pareto', 'chart-pareto');
-      await loadChart('/charts/heatmap', 'chart-heatmap');
+      // One snapshot request for stats and all charts; the AI summary loads alongside it.
+      await Promise.all([loadSnapshot(), loadMaintenanceSummary()]);
     }
 
     init();
-    setInterval(loadSPCStats, 30000);
+    setInterval(loadSnapshot, 30000);
     setInterval(loadMaintenanceSummary, 60000);
   </script>
 </body>
@@ -0,0 +1,48 @@
+"""Prometheus metrics and on-demand profiler routes."""
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.profiler import profiler
+
+router = APIRouter()
+
+
+def _require_profiler_token(x_profiler_token: str | None = Header(None)) -> None:
+    token = get_settings().profiler_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Profiler is disabled (set PROFILER_TOKEN)")
+    if not hmac.compare_digest(x_profiler_token or "", token):
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, DB and span metrics."""
+    if not metrics.is_enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled (set METRICS_ENABLED=1)")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/debug/profiler", dependencies=[Depends(_require_profiler_token)])
+async def profiler_status():
+    return profiler.status()
+
+
+@router.post("/debug/profiler/start", dependencies=[Depends(_require_profiler_token)])
+async def profiler_start(
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="Sampling interval"),
+    duration_sec: float = Query(30.0, gt=0, le=600, description="Auto-stop after this long"),
+):
+    """Start the sampling profiler in this worker process."""
+    profiler.start(interval=interval_ms / 1000, duration=duration_sec)
+    return profiler.status()
+
+
+@router.post("/debug/profiler/stop", response_class=PlainTextResponse, dependencies=[Depends(_require_profiler_token)])
+async def profiler_stop():
+    """Stop the profiler and return collapsed stacks (flamegraph.pl / speedscope format)."""
+    return PlainTextResponse(profiler.stop())
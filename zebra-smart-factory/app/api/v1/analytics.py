@@ -1,17 +1,53 @@
-from fastapi import APIRouter, Depends, Query
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-import pandas as pd
+from sqlalchemy import case, func
+import numpy as np
 
-from app.core.database import get_db
+from app.core.database import get_analytics_db, get_db
+from app.core.metrics import span
+from app.core.serialization import LAYOUT_QUERY, FastJSONResponse, tabulate
+from app.models.latest import SensorLatest
 from app.models.sensor import SensorReading
-from app.services.spc import simple_limits, detect_anomalies_zscore, xbar_r_limits, cusum
-from app.services.charts import spc_xbar_chart, spc_cusum_chart, heatmap_chart, pareto_chart
-from app.schemas.analytics import ControlLimitsResponse, AnomalyResponse, SPCStatsResponse
+from app.services.aggregates import window_chart
+from app.services.baselines import Baseline, baseline_cache
+from app.services.spc import (
+    simple_limits, detect_anomalies_zscore, phase2_violations, subgroup_limits, ewma, imr, rolling_stats,
+)
+from app.services.latest import OUT_OF_CONTROL, WARMING_UP, rebuild_latest
+from app.services.multivariate import AlignedMatrix, correlation, fit_pca, load_matrix, rolling_correlation, score, spectral_order, top_pairs
+from app.services.resample import resample
+from app.services.retention import read_history
+from app.services.ring_buffer import ring_store
+from app.services.snapshot import build_snapshot
+from app.services.sketch_store import flush_sketches, load_sketch, load_sketches_by_sensor
+from app.services.spc_state import spc_state
+from app.services.trends import forecast_breaches
+from app.services.charts import (
+    spc_xbar_chart, spc_cusum_chart, heatmap_chart, pareto_chart, ewma_chart, imr_chart, rolling_chart,
+    correlation_heatmap_chart,
+)
+from app.schemas.analytics import (
+    ControlLimitsResponse, AnomalyResponse, SPCStatsResponse, PlantOverviewResponse, SensorLatestResponse,
+    CorrelationPair, CorrelationResponse, T2Point, T2Response, ResampleResponse, DashboardSnapshot,
+    WindowChartResponse, BreachForecastResponse,
+)
 
 router = APIRouter()
 
+LIMITS_QUERY = Query(
+    "auto",
+    pattern="^(auto|baseline|window)$",
+    description="auto: stored baseline when one exists for sensor_id, else window; baseline; window",
+)
+OVERVIEW_FIELDS = tuple(SensorLatestResponse.model_fields)
+RANGE_START_QUERY = Query(
+    None,
+    description="Read [start, end) instead of the last `limit` readings, from raw data or rollups as retained",
+)
+
 
 def _get_readings(
     db: Session,
@@ -29,21 +65,78 @@ def _get_readings(
     return [(r[0], r[1], r[2]) for r in rows]
 
 
+def _get_series(
+    db: Session,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    limit: int = 500,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> tuple[list | np.ndarray, list[float] | np.ndarray]:
+    """
+    Return (timestamps, values), oldest first. Single-sensor requests within the ring
+    capacity are zero-copy views of the sensor's ring buffer (datetime64 / float64 arrays).
+    With `start`, the range is read at the finest retained resolution that fits `limit`
+    points (bucket means for rollups).
+    """
+    if start is not None:
+        h = read_history(db, start, end, sensor_id=sensor_id, sensor_type=sensor_type, max_points=limit)
+        return h.timestamps, h.mean
+    if sensor_id and not sensor_type:
+        cached = ring_store.series(db, sensor_id, limit)
+        if cached is not None:
+            return cached
+    q = db.query(SensorReading.timestamp, SensorReading.value)
+    if sensor_id:
+        q = q.filter(SensorReading.sensor_id == sensor_id)
+    if sensor_type:
+        q = q.filter(SensorReading.sensor_type == sensor_type)
+    rows = q.order_by(SensorReading.timestamp.desc()).limit(limit).all()[::-1]
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+
+def _get_values(
+    db: Session,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    limit: int = 500,
+) -> np.ndarray:
+    """Values only, oldest first, as a float64 array (ring buffer view when possible)."""
+    if sensor_id and not sensor_type:
+        cached = ring_store.series(db, sensor_id, limit)
+        if cached is not None:
+            return cached[1]
+    rows = _get_readings(db, sensor_id, sensor_type, limit)
+    return np.fromiter((r[2] for r in reversed(rows)), dtype=float, count=len(rows))
+
+
+def _baseline_for(db: Session, sensor_id: str | None, mode: str) -> Baseline | None:
+    """Phase II baseline to judge against, or None to derive limits from the window."""
+    if mode == "window":
+        return None
+    baseline = baseline_cache.get(db, sensor_id) if sensor_id else None
+    if baseline is None and mode == "baseline":
+        raise HTTPException(status_code=404, detail=f"No active baseline for sensor {sensor_id!r}")
+    return baseline
+
+
 @router.get("/health")
 async def analytics_health():
     return {"status": "ok", "service": "analytics"}
 
 
 @router.get("/spc/stats", response_model=SPCStatsResponse)
-async def spc_stats(
+def spc_stats(
     sensor_id: str | None = Query(None, description="Filter by sensor ID"),
     sensor_type: str | None = Query(None, description="Filter by sensor type"),
     limit: int = Query(200, le=1000),
-    db: Session = Depends(get_db),
+    limits: str = LIMITS_QUERY,
+    db: Session = Depends(get_analytics_db),
 ):
     """SPC statistics: mean, std, control limits, anomaly indices."""
-    rows = _get_readings(db, sensor_id, sensor_type, limit)
-    if not rows:
+    baseline = _baseline_for(db, sensor_id, limits)
+    values = _get_values(db, sensor_id, sensor_type, limit)
+    if not len(values):
         return SPCStatsResponse(
             sensor_id=sensor_id,
             sensor_type=sensor_type,
@@ -51,42 +144,70 @@ async def spc_stats(
             control_limits=ControlLimitsResponse(center=0, ucl=0, lcl=0, sigma=0),
             anomaly_indices=[],
         )
-    values = [r[2] for r in reversed(rows)]
-    limits = simple_limits(values)
-    anomalies = detect_anomalies_zscore(values)
+    if baseline is not None:
+        control = baseline.limits
+        anomalies = phase2_violations(values, control)
+    else:
+        control = simple_limits(values)
+        anomalies = detect_anomalies_zscore(values)
     return SPCStatsResponse(
         sensor_id=sensor_id,
         sensor_type=sensor_type,
-        mean=sum(values) / len(values),
-        std=(sum((v - sum(values) / len(values)) ** 2 for v in values) / len(values)) ** 0.5 if len(values) > 1 else 0,
-        min=min(values),
-        max=max(values),
+        mean=float(values.mean()),
+        std=float(values.std()) if len(values) > 1 else 0,
+        min=float(values.min()),
+        max=float(values.max()),
         count=len(values),
         control_limits=ControlLimitsResponse(
-            center=limits.center,
-            ucl=limits.ucl,
-            lcl=limits.lcl,
-            sigma=limits.sigma,
+            center=control.center,
+            ucl=control.ucl,
+            lcl=control.lcl,
+            sigma=control.sigma,
         ),
         anomaly_indices=anomalies,
+        limits_source="baseline" if baseline is not None else "window",
+        baseline_version=baseline.version if baseline is not None else None,
     )
 
 
 @router.get("/spc/anomalies", response_model=AnomalyResponse)
-async def spc_anomalies(
+def spc_anomalies(
     sensor_id: str | None = Query(None),
     sensor_type: str | None = Query(None),
     limit: int = Query(200, le=1000),
-    method: str = Query("zscore", description="zscore or iqr"),
+    method: str = Query("zscore", description="zscore, iqr or baseline"),
     threshold: float = Query(3.0, description="Z-score threshold"),
-    db: Session = Depends(get_db),
+    limits: str = Query(
+        "auto",
+        pattern="^(auto|baseline|window)$",
+        description="baseline: judge zscore against the stored baseline (as method=baseline); auto/window: the window",
+    ),
+    iqr_bounds: str = Query(
+        "window",
+        pattern="^(window|sketch)$",
+        description="iqr: quartiles of the window, or of the sensor's sketches over [start, end)",
+    ),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    db: Session = Depends(get_analytics_db),
 ):
-    """Detect anomalies in sensor readings."""
+    """Detect anomalies in sensor readings. Stored baseline limits apply only with method=baseline or limits=baseline."""
     from app.services.spc import detect_anomalies_iqr
 
-    rows = _get_readings(db, sensor_id, sensor_type, limit)
-    values = [r[2] for r in reversed(rows)]
-    if method == "iqr":
+    baseline = None
+    if method == "baseline" or (method != "iqr" and limits == "baseline"):
+        baseline = _baseline_for(db, sensor_id, "baseline")
+    values = _get_values(db, sensor_id, sensor_type, limit)
+    if baseline is not None:
+        method = "baseline"
+        indices = phase2_violations(values, baseline.limits)
+    elif method == "iqr" and iqr_bounds == "sketch":
+        flush_sketches()
+        sketch, _ = load_sketch(db, sensor_id, sensor_type, start, end)
+        if not sketch.count:
+            raise HTTPException(status_code=404, detail="No sketches in range")
+        indices = detect_anomalies_iqr(values, bounds=sketch.iqr_bounds())
+    elif method == "iqr":
         indices = detect_anomalies_iqr(values)
     else:
         indices = detect_anomalies_zscore(values, threshold)
@@ -94,63 +215,413 @@ async def spc_anomalies(
 
 
 @router.get("/charts/spc-xbar")
-async def chart_spc_xbar(
+def chart_spc_xbar(
     sensor_id: str | None = Query(None),
     sensor_type: str | None = Query(None),
     limit: int = Query(100, le=500),
     subgroup_size: int = Query(5, ge=2, le=10),
-    db: Session = Depends(get_db),
+    limits: str = LIMITS_QUERY,
+    db: Session = Depends(get_analytics_db),
 ):
     """X-bar control chart as Plotly JSON."""
+    baseline = _baseline_for(db, sensor_id, limits)
     rows = _get_readings(db, sensor_id, sensor_type, limit)
     values = [r[2] for r in reversed(rows)]
     labels = [r[0] for r in reversed(rows)]
     if not values:
         return Response(content='{"data":[]}', media_type="application/json")
-    json_str = spc_xbar_chart(values, labels, subgroup_size)
+    fixed = subgroup_limits(baseline.limits, subgroup_size) if baseline is not None else None
+    json_str = spc_xbar_chart(values, labels, subgroup_size, limits=fixed)
     return Response(content=json_str, media_type="application/json")
 
 
 @router.get("/charts/spc-cusum")
-async def chart_spc_cusum(
+def chart_spc_cusum(
     sensor_id: str | None = Query(None),
     sensor_type: str | None = Query(None),
     limit: int = Query(100, le=500),
-    db: Session = Depends(get_db),
+    limits: str = LIMITS_QUERY,
+    db: Session = Depends(get_analytics_db),
 ):
     """CUSUM chart as Plotly JSON."""
+    baseline = _baseline_for(db, sensor_id, limits)
     rows = _get_readings(db, sensor_id, sensor_type, limit)
     values = [r[2] for r in reversed(rows)]
     labels = [r[0] for r in reversed(rows)]
     if not values:
         return Response(content='{"data":[]}', media_type="application/json")
-    json_str = spc_cusum_chart(values, labels)
+    if baseline is not None:
+        json_str = spc_cusum_chart(values, labels, target=baseline.limits.center, sigma=baseline.limits.sigma)
+    else:
+        json_str = spc_cusum_chart(values, labels)
     return Response(content=json_str, media_type="application/json")
 
 
+@router.get("/charts/ewma")
+def chart_ewma(
+    sensor_id: str | None = Query(None),
+    sensor_type: str | None = Query(None),
+    limit: int = Query(500, le=100_000),
+    lam: float = Query(0.2, gt=0, le=1, description="EWMA smoothing weight λ"),
+    width: float = Query(3.0, gt=0, alias="L", description="Limit width in sigmas"),
+    limits: str = LIMITS_QUERY,
+    start: datetime | None = RANGE_START_QUERY,
+    end: datetime | None = Query(None),
+    db: Session = Depends(get_analytics_db),
+):
+    """EWMA chart as Plotly JSON; centered on the stored baseline when one applies."""
+    baseline = _baseline_for(db, sensor_id, limits)
+    x, values = _get_series(db, sensor_id, sensor_type, limit, start, end)
+    if not len(values):
+        return Response(content='{"data":[]}', media_type="application/json")
+    center, sigma = (baseline.limits.center, baseline.limits.sigma) if baseline is not None else (None, None)
+    result = ewma(values, lam=lam, width=width, center=center, sigma=sigma)
+    return Response(content=ewma_chart(x, values, result, lam), media_type="application/json")
+
+
+@router.get("/charts/imr")
+def chart_imr(
+    sensor_id: str | None = Query(None),
+    sensor_type: str | None = Query(None),
+    limit: int = Query(500, le=100_000),
+    limits: str = LIMITS_QUERY,
+    start: datetime | None = RANGE_START_QUERY,
+    end: datetime | None = Query(None),
+    db: Session = Depends(get_analytics_db),
+):
+    """Individuals / moving-range chart as Plotly JSON."""
+    baseline = _baseline_for(db, sensor_id, limits)
+    x, values = _get_series(db, sensor_id, sensor_type, limit, start, end)
+    if len(values) < 2:
+        return Response(content='{"data":[]}', media_type="application/json")
+    center, sigma = (baseline.limits.center, baseline.limits.sigma) if baseline is not None else (None, None)
+    result = imr(values, center=center, sigma=sigma)
+    return Response(content=imr_chart(x, values, result), media_type="application/json")
+
+
+@router.get("/charts/rolling")
+def chart_rolling(
+    sensor_id: str | None = Query(None),
+    sensor_type: str | None = Query(None),
+    limit: int = Query(1000, le=100_000),
+    window: int = Query(20, ge=2, le=10_000, description="Window in samples"),
+    seconds: float | None = Query(None, gt=0, description="Window in seconds (overrides window)"),
+    start: datetime | None = RANGE_START_QUERY,
+    end: datetime | None = Query(None),
+    db: Session = Depends(get_analytics_db),
+):
+    """Rolling mean and p5-p95 band as Plotly JSON."""
+    x, values = _get_series(db, sensor_id, sensor_type, limit, start, end)
+    if not len(values):
+        return Response(content='{"data":[]}', media_type="application/json")
+    stats = rolling_stats(values, window=window, seconds=seconds, timestamps=x)
+    title = f"Rolling Statistics ({f'{seconds:g}s' if seconds else f'{window} samples'})"
+    return Response(content=rolling_chart(x, values, stats, title), media_type="application/json")
+
+
+@router.get("/spc/streaming")
+def spc_streaming(
+    sensor_id: str = Query(..., description="Sensor ID"),
+    db: Session = Depends(get_analytics_db),
+):
+    """Live EWMA / I-MR / rolling state for one sensor, maintained incrementally on ingest."""
+    state = spc_state.get(db, sensor_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No readings for sensor {sensor_id!r}")
+    return {"sensor_id": sensor_id} | state.snapshot()
+
+
+@router.get("/dashboard/snapshot", response_model=DashboardSnapshot)
+def dashboard_snapshot(
+    window: int = Query(500, ge=1, le=5000, description="Readings for the heatmap; the read covers every panel"),
+    stats_limit: int = Query(200, ge=1, le=5000),
+    chart_limit: int = Query(100, ge=1, le=5000, description="Readings in the X-bar and CUSUM series"),
+    subgroup_size: int = Query(5, ge=2, le=10),
+    db: Session = Depends(get_analytics_db),
+):
+    """Every dashboard panel from one read of the newest readings (one request on page load)."""
+    return build_snapshot(db, window, stats_limit, chart_limit, subgroup_size)
+
+
+@router.get("/windows/xbar", response_model=WindowChartResponse)
+def windows_xbar(
+    sensor_id: str = Query(...),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    limit: int = Query(2000, ge=1, le=50_000),
+    db: Session = Depends(get_analytics_db),
+):
+    """X-bar chart over edge-aggregated windows (each merged with its forwarded readings) as subgroups."""
+    chart = window_chart(db, sensor_id, start, end, limit)
+    if chart is None:
+        raise HTTPException(status_code=404, detail=f"No aggregated windows for sensor {sensor_id!r}")
+    return chart
+
+
+@router.get("/overview", response_model=PlantOverviewResponse)
+def plant_overview(
+    status: str | None = Query(None, pattern="^(in_control|out_of_control|warming_up)$"),
+    sensor_type: str | None = Query(None),
+    limit: int = Query(1000, ge=1, le=10_000),
+    offset: int = Query(0, ge=0),
+    layout: str = LAYOUT_QUERY,
+    db: Session = Depends(get_analytics_db),
+):
+    """Current value and control status of every sensor, served from `sensor_latest` (no reading scan)."""
+    q = db.query(SensorLatest)
+    if sensor_type:
+        q = q.filter(SensorLatest.sensor_type == sensor_type)
+    by_status = dict(q.with_entities(SensorLatest.status, func.count()).group_by(SensorLatest.status).all())
+    if status:
+        q = q.filter(SensorLatest.status == status)
+    rank = case((SensorLatest.status == OUT_OF_CONTROL, 0), (SensorLatest.status == WARMING_UP, 1), else_=2)
+    latest = SensorLatest
+    columns = (
+        latest.sensor_id, latest.sensor_type, latest.unit, latest.last_value, latest.last_timestamp,
+        latest.count, latest.mean, latest.m2, latest.minimum, latest.maximum,
+        latest.status, latest.center, latest.ucl, latest.lcl, latest.limits_source,
+    )
+    rows = [
+        (*r[:7], (r[7] / r[5]) ** 0.5 if r[5] > 1 and r[7] > 0 else 0.0, *r[8:])  # m2 -> std
+        for r in q.with_entities(*columns).order_by(rank, latest.sensor_id).offset(offset).limit(limit)
+    ]
+    return FastJSONResponse({
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "sensors": tabulate(OVERVIEW_FIELDS, rows, layout),
+    })
+
+
+@router.post("/overview/rebuild")
+def plant_overview_rebuild(db: Session = Depends(get_db)):
+    """Recompute `sensor_latest` from all readings (backfill after bulk loads)."""
+    return {"sensors": rebuild_latest(db)}
+
+
+MAX_BUCKETS = 50_000
+
+
+def _selection(
+    sensor_type: str | None,
+    sensor_ids: str | None,
+    hours: int,
+    start: datetime | None,
+    end: datetime | None,
+    bucket_seconds: int,
+) -> tuple[list[str] | None, datetime, datetime]:
+    """Parse a multi-sensor selection and range: (sensor ids, start, end); 422 when unusable."""
+    ids = [s.strip() for s in sensor_ids.split(",") if s.strip()] if sensor_ids else None
+    if not ids and not sensor_type:
+        raise HTTPException(status_code=422, detail="sensor_type or sensor_ids is required")
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=hours)
+    if (end - start).total_seconds() / bucket_seconds > MAX_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"Range spans more than {MAX_BUCKETS} buckets; raise bucket_seconds")
+    return ids, start, end
+
+
+@router.get("/resample", response_model=ResampleResponse)
+def resample_sensors(
+    sensor_type: str | None = Query(None),
+    sensor_ids: str | None = Query(None, description="Comma-separated sensor IDs"),
+    hours: int = Query(24, ge=1, description="Range ending now, unless start/end are given"),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    bucket_seconds: int = Query(60, ge=1, le=86_400),
+    method: str = Query("mean", pattern="^(mean|last|interpolate)$"),
+    max_gap: int = Query(0, ge=0, le=1000, description="Forward-fill up to N empty buckets"),
+    db: Session = Depends(get_analytics_db),
+):
+    """Many sensors on one common time grid (null where a sensor has no value for a bucket)."""
+    ids, start, end = _selection(sensor_type, sensor_ids, hours, start, end, bucket_seconds)
+    with span("analytics.resample"):
+        r = resample(db, start, end, bucket_seconds, method, sensor_ids=ids, sensor_type=sensor_type, max_gap=max_gap)
+        cells = r.values.astype(object)
+        cells[np.isnan(r.values)] = None
+    return ResampleResponse(
+        timestamps=r.grid.astype(datetime).tolist(),
+        bucket_seconds=bucket_seconds,
+        method=method,
+        source=r.tier,
+        series=dict(zip(r.sensors, cells.T.tolist())),
+    )
+
+
+def _aligned(
+    db: Session,
+    sensor_type: str | None,
+    sensor_ids: str | None,
+    hours: int,
+    start: datetime | None,
+    end: datetime | None,
+    bucket_seconds: int,
+) -> AlignedMatrix:
+    """Time-aligned bucket means for the selected sensors; 422/404 when unusable."""
+    ids, start, end = _selection(sensor_type, sensor_ids, hours, start, end, bucket_seconds)
+    with span("analytics.multivariate.load"):
+        aligned = load_matrix(db, start, end, bucket_seconds, sensor_ids=ids, sensor_type=sensor_type)
+    if len(aligned.sensors) < 2 or len(aligned.timestamps) < 3:
+        raise HTTPException(status_code=404, detail="Need at least 2 sensors with 3 aligned buckets in range")
+    return aligned
+
+
+@router.get("/multivariate/correlation", response_model=CorrelationResponse)
+def multivariate_correlation(
+    sensor_type: str | None = Query(None),
+    sensor_ids: str | None = Query(None, description="Comma-separated sensor IDs"),
+    hours: int = Query(24, ge=1, description="Range ending now, unless start/end are given"),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    bucket_seconds: int = Query(60, ge=1, le=86_400, description="Alignment bucket; 60 and 3600 read rollups"),
+    window: int | None = Query(None, ge=3, description="Also return correlations per rolling window of N buckets"),
+    step: int = Query(1, ge=1),
+    top: int = Query(10, ge=0, le=1000, description="Strongest pairs to list"),
+    db: Session = Depends(get_analytics_db),
+):
+    """Pearson correlation between sensors on time-aligned buckets (optionally rolling)."""
+    aligned = _aligned(db, sensor_type, sensor_ids, hours, start, end, bucket_seconds)
+    corr = correlation(aligned.values)
+    windows = rolling = None
+    if window is not None:
+        per_window = rolling_correlation(aligned.values, window, step)
+        windows = aligned.timestamps[window - 1 :: step][: len(per_window)].astype(datetime).tolist()
+        rolling = np.round(per_window, 4).tolist()
+    return CorrelationResponse(
+        sensors=aligned.sensors,
+        buckets=len(aligned.timestamps),
+        bucket_seconds=bucket_seconds,
+        matrix=np.round(corr, 4).tolist(),
+        top_pairs=[CorrelationPair(a=aligned.sensors[i], b=aligned.sensors[j], r=r) for i, j, r in top_pairs(corr, top)],
+        windows=windows,
+        rolling=rolling,
+    )
+
+
+@router.get("/multivariate/t2", response_model=T2Response)
+def multivariate_t2(
+    sensor_type: str | None = Query(None),
+    sensor_ids: str | None = Query(None, description="Comma-separated sensor IDs"),
+    hours: int = Query(24, ge=1),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    bucket_seconds: int = Query(60, ge=1, le=86_400),
+    reference_end: datetime | None = Query(None, description="Phase I period is [start, reference_end); default first half"),
+    variance: float = Query(0.9, gt=0, le=1, description="Variance retained by the principal components"),
+    alpha: float = Query(0.0027, gt=0, lt=0.5, description="False alarm rate of the T² and SPE limits"),
+    contributors: int = Query(3, ge=0, le=50, description="Top T² contributors per point"),
+    db: Session = Depends(get_analytics_db),
+):
+    """Hotelling T² and SPE on PCA of a reference period, scored over the whole range."""
+    aligned = _aligned(db, sensor_type, sensor_ids, hours, start, end, bucket_seconds)
+    if reference_end is not None:
+        ref = aligned.timestamps < np.datetime64(_naive_utc(reference_end), "s")
+    else:
+        ref = np.arange(len(aligned.timestamps)) < len(aligned.timestamps) // 2
+    if ref.sum() < 3:
+        raise HTTPException(status_code=422, detail="Reference period needs at least 3 aligned buckets")
+    with span("analytics.multivariate.t2"):
+        model = fit_pca(aligned.values[ref], aligned.sensors, variance=variance, alpha=alpha)
+        scores = score(model, aligned.values)
+        # Diagnose each point by the statistic that is further past its limit.
+        spe_ratio = scores.spe / model.spe_limit if model.spe_limit > 0 else np.zeros_like(scores.spe)
+        contrib = np.where((spe_ratio > scores.t2 / model.t2_limit)[:, None], scores.spe_contributions, scores.contributions)
+        top_idx = np.argsort(-contrib, axis=1, kind="stable")[:, :contributors]
+    names = np.array(aligned.sensors, dtype=object)
+    points = [
+        T2Point(
+            timestamp=ts,
+            t2=float(t2),
+            spe=float(spe),
+            out_of_control=bool(t2 > model.t2_limit or (model.spe_limit > 0 and spe > model.spe_limit)),
+            contributors=dict(zip(names[idx].tolist(), np.round(c[idx], 4).tolist())),
+        )
+        for ts, t2, spe, idx, c in zip(aligned.timestamps.astype(datetime).tolist(), scores.t2, scores.spe, top_idx, contrib)
+    ]
+    return T2Response(
+        sensors=model.sensors,
+        reference_buckets=model.n_reference,
+        components=len(model.eigenvalues),
+        explained_variance=model.explained,
+        t2_ucl=model.t2_limit,
+        spe_ucl=model.spe_limit,
+        points=points,
+    )
+
+
+@router.get("/charts/correlation")
+def chart_correlation(
+    sensor_type: str | None = Query(None),
+    sensor_ids: str | None = Query(None, description="Comma-separated sensor IDs"),
+    hours: int = Query(24, ge=1),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    bucket_seconds: int = Query(60, ge=1, le=86_400),
+    db: Session = Depends(get_analytics_db),
+):
+    """Sensor correlation heatmap as Plotly JSON, clustered so correlated sensors sit together."""
+    aligned = _aligned(db, sensor_type, sensor_ids, hours, start, end, bucket_seconds)
+    corr = correlation(aligned.values)
+    order = spectral_order(corr)
+    sensors = [aligned.sensors[i] for i in order]
+    json_str = correlation_heatmap_chart(sensors, corr[np.ix_(order, order)])
+    return Response(content=json_str, media_type="application/json")
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
 @router.get("/charts/heatmap")
-async def chart_heatmap(
+def chart_heatmap(
     limit: int = Query(500, le=2000),
-    db: Session = Depends(get_db),
+    stat: str = Query("mean", pattern=r"^(mean|p\d{1,2})$", description="mean or a percentile, e.g. p95"),
+    hours: int | None = Query(None, ge=1, description="Use sketches over the last N hours instead of raw rows"),
+    db: Session = Depends(get_analytics_db),
 ):
-    """Heatmap: sensor_type x sensor_id, value = mean reading."""
+    """Heatmap: sensor_type x sensor_id, value = mean reading (or a percentile)."""
+    import pandas as pd
+
+    if hours is not None:
+        return _sketch_heatmap(db, stat, hours)
     rows = db.query(SensorReading.sensor_type, SensorReading.sensor_id, SensorReading.value).order_by(
         SensorReading.timestamp.desc()
     ).limit(limit).all()
     if not rows:
         return Response(content='{"data":[]}', media_type="application/json")
-    df = pd.DataFrame(rows, columns=["sensor_type", "sensor_id", "value"])
-    pivot = df.pivot_table(index="sensor_type", columns="sensor_id", values="value", aggfunc="mean")
+    with span("analytics.heatmap.frame"):
+        df = pd.DataFrame(rows, columns=["sensor_type", "sensor_id", "value"])
+        if stat != "mean":
+            q = int(stat[1:]) / 100
+            df = df.groupby(["sensor_type", "sensor_id"], as_index=False)["value"].quantile(q)
+        pivot = df.pivot_table(index="sensor_type", columns="sensor_id", values="value", aggfunc="mean")
     if pivot.empty or pivot.size < 2:
         return Response(content='{"data":[]}', media_type="application/json")
     json_str = heatmap_chart(df, "sensor_id", "sensor_type", "value")
     return Response(content=json_str, media_type="application/json")
 
 
+def _sketch_heatmap(db: Session, stat: str, hours: int) -> Response:
+    import pandas as pd
+
+    flush_sketches()
+    merged = load_sketches_by_sensor(db, start=datetime.now(timezone.utc) - timedelta(hours=hours))
+    if len(merged) < 2:
+        return Response(content='{"data":[]}', media_type="application/json")
+    with span("analytics.heatmap.frame"):
+        df = pd.DataFrame(
+            [
+                (sensor_type, sensor_id, s.mean if stat == "mean" else float(s.percentiles([int(stat[1:])])[0]))
+                for (sensor_type, sensor_id), s in merged.items()
+            ],
+            columns=["sensor_type", "sensor_id", "value"],
+        )
+    return Response(content=heatmap_chart(df, "sensor_id", "sensor_type", "value"), media_type="application/json")
+
+
 @router.get("/charts/pareto")
-async def chart_pareto(
+def chart_pareto(
     limit: int = Query(500, le=2000),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_analytics_db),
 ):
     """Pareto chart: defect/anomaly count by sensor type."""
     rows = db.query(SensorReading.sensor_type, func.count(SensorReading.id)).group_by(
@@ -164,13 +635,28 @@ async def chart_pareto(
     return Response(content=json_str, media_type="application/json")
 
 
+@router.get("/maintenance/forecast", response_model=BreachForecastResponse)
+def maintenance_forecast(
+    sensor_id: str | None = Query(None),
+    window_hours: int = Query(48, ge=6, le=24 * 30, description="Hours of hourly means each trend is fitted on"),
+    horizon_hours: float = Query(168.0, gt=0, le=24 * 365, description="Only predict breaches this far ahead"),
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_analytics_db),
+):
+    """Sensors ranked by predicted time to breach their UCL/LCL, from robust drift fits over hourly means."""
+    now = datetime.now(timezone.utc)
+    sensors = forecast_breaches(db, sensor_id=sensor_id, window_hours=window_hours, horizon_hours=horizon_hours, now=now)
+    return BreachForecastResponse(generated_at=now, window_hours=window_hours, horizon_hours=horizon_hours, sensors=sensors[:limit])
+
+
 @router.get("/maintenance-summary")
 async def maintenance_summary(
     sensor_id: str | None = Query(None),
     limit: int = Query(100, le=500),
-    db: Session = Depends(get_db),
+    window_minutes: int | None = Query(None, ge=1, description="Only consider readings this recent"),
+    refresh: bool = Query(False, description="Bypass the summary cache"),
 ):
-    """AI-generated maintenance summary from recent anomalies and trends."""
-    from app.services.maintenance_agent import get_maintenance_summary
+    """AI-generated maintenance summary from recent anomalies and trends (cached per anomaly context)."""
+    from app.services.summary_service import summary_service
 
-    return await get_maintenance_summary(db, sensor_id, limit)
+    return await summary_service.get(sensor_id, limit, window_minutes, refresh=refresh)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.models.baseline import ControlBaseline
+from app.schemas.analytics import BaselineRecomputeRequest, BaselineResponse
+from app.services.baselines import compute_baselines
+
+router = APIRouter()
+
+
+@router.post("/recompute", response_model=list[BaselineResponse])
+def recompute_baselines(payload: BaselineRecomputeRequest, db: Session = Depends(get_db)):
+    """Phase I: store a new baseline version per sensor from an in-control reference period."""
+    if payload.reference_end <= payload.reference_start:
+        raise HTTPException(status_code=422, detail="reference_end must be after reference_start")
+    return compute_baselines(
+        db,
+        payload.reference_start,
+        payload.reference_end,
+        sensor_ids=payload.sensor_ids,
+        min_samples=payload.min_samples,
+    )
+
+
+@router.get("/", response_model=list[BaselineResponse])
+def list_baselines(
+    sensor_id: str | None = Query(None),
+    include_inactive: bool = Query(False, description="Include superseded versions"),
+    db: Session = Depends(get_db),
+):
+    """Stored baselines, newest version first."""
+    q = db.query(ControlBaseline)
+    if sensor_id:
+        q = q.filter(ControlBaseline.sensor_id == sensor_id)
+    if not include_inactive:
+        q = q.filter(ControlBaseline.active.is_(True))
+    return q.order_by(ControlBaseline.sensor_id, ControlBaseline.version.desc()).all()
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.database import get_analytics_db, get_db
+from app.models.rollup import BackfillRequest, PipelineWatermark
+from app.services import daily_summary
+from app.services.retention import WATERMARK, retention_service
+
+router = APIRouter()
+
+
+@router.get("/")
+def retention_status(db: Session = Depends(get_db)):
+    """Retention policy per tier and how far raw readings have been rolled up."""
+    wm = db.get(PipelineWatermark, WATERMARK)
+    return {
+        "tiers": [
+            {
+                "name": t.name,
+                "resolution_seconds": t.resolution,
+                "retention_days": t.retention.total_seconds() / 86400 if t.retention is not None else None,
+            }
+            for t in retention_service.policy
+        ],
+        "rolled_up_to": wm.position if wm is not None else None,
+        "last_reading_id": wm.last_id if wm is not None else None,
+        "backfill_pending": db.query(BackfillRequest).count(),
+    }
+
+
+@router.post("/run")
+def retention_run(db: Session = Depends(get_db)):
+    """Run the downsample-and-expire job now (it also runs every RETENTION_INTERVAL seconds)."""
+    report = retention_service.run_once(db)
+    if report is None:
+        raise HTTPException(status_code=409, detail="Retention job already running on another worker")
+    return report
+
+
+@router.get("/daily")
+def daily_summary_report(
+    start: datetime = Query(..., description="First day"),
+    end: datetime | None = Query(None, description="End (exclusive), default the day after start"),
+    db: Session = Depends(get_analytics_db),
+):
+    """Per-day, per-sensor-type summary from the incrementally maintained daily rows."""
+    wm = db.get(PipelineWatermark, daily_summary.WATERMARK)
+    return {
+        "processed_through_id": wm.last_id if wm is not None else None,
+        "days": daily_summary.daily_report(db, start, end),
+    }
+
+
+@router.post("/daily/run")
+def daily_summary_run(
+    chunk: int = Query(5000, ge=1, le=100_000, description="Reading ids per transaction"),
+    max_chunks: int | None = Query(None, ge=1, description="Stop after this many chunks (see `remaining`)"),
+    db: Session = Depends(get_db),
+):
+    """Fold the readings inserted since the last run into the daily rows (dags/daily_summary.py)."""
+    return daily_summary.run_incremental(db, chunk=chunk, max_chunks=max_chunks)
+
+
+@router.post("/daily/backfill")
+def daily_summary_backfill(
+    start: datetime = Query(..., description="Range start; widened to whole days"),
+    end: datetime = Query(..., description="Range end (exclusive)"),
+    db: Session = Depends(get_db),
+):
+    """Recompute the daily rows of a past range from raw readings; safe to repeat."""
+    if end <= start:
+        raise HTTPException(status_code=422, detail="end must be after start")
+    return daily_summary.backfill(db, start, end)
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.database import get_analytics_db, get_db
+from app.schemas.analytics import SketchRebuildRequest, SketchStatsResponse
+from app.services.sketch_store import build_sketches, flush_sketches, load_sketch
+
+router = APIRouter()
+
+
+def _percentile_list(text: str) -> list[float]:
+    try:
+        ps = [float(p) for p in text.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="percentiles must be comma-separated numbers")
+    if not ps or any(not 0 <= p <= 100 for p in ps):
+        raise HTTPException(status_code=422, detail="percentiles must be between 0 and 100")
+    return ps
+
+
+@router.get("/stats", response_model=SketchStatsResponse)
+def sketch_stats(
+    sensor_id: str | None = Query(None),
+    sensor_type: str | None = Query(None),
+    start: datetime | None = Query(None, description="Range start (rounded down to a bucket)"),
+    end: datetime | None = Query(None, description="Range end (exclusive)"),
+    percentiles: str = Query("1,5,25,50,75,95,99"),
+    k: float = Query(1.5, gt=0, description="IQR multiplier for the anomaly bounds"),
+    db: Session = Depends(get_analytics_db),
+):
+    """Percentiles, IQR bounds and distinct-value count over any range, from merged sketches."""
+    ps = _percentile_list(percentiles)
+    flush_sketches()
+    sketch, buckets = load_sketch(db, sensor_id, sensor_type, start, end)
+    if not sketch.count:
+        raise HTTPException(status_code=404, detail="No sketches in range")
+    lower, upper = sketch.iqr_bounds(k)
+    return SketchStatsResponse(
+        sensor_id=sensor_id,
+        sensor_type=sensor_type,
+        start=start,
+        end=end,
+        buckets=buckets,
+        count=sketch.count,
+        mean=sketch.mean,
+        std=sketch.std,
+        min=sketch.minimum,
+        max=sketch.maximum,
+        percentiles={f"p{p:g}": float(v) for p, v in zip(ps, sketch.percentiles(ps))},
+        iqr_lower=lower,
+        iqr_upper=upper,
+        distinct_values=sketch.distinct_count(),
+    )
+
+
+@router.post("/rebuild")
+def rebuild_sketches(payload: SketchRebuildRequest, db: Session = Depends(get_db)):
+    """Rebuild the sketch buckets overlapping [start, end) from raw readings."""
+    if payload.end <= payload.start:
+        raise HTTPException(status_code=422, detail="end must be after start")
+    flush_sketches()
+    return {"buckets": build_sketches(db, payload.start, payload.end, sensor_ids=payload.sensor_ids)}
@@ -1,26 +1,155 @@
-from fastapi import APIRouter, Depends
+import json
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+
+from app.core.database import AnalyticsSession, get_analytics_db, get_db
+from app.core.serialization import LAYOUT_QUERY, FastJSONResponse, tabulate
 from app.models.sensor import SensorReading
-from app.schemas.telemetry import TelemetryCreate, TelemetryResponse
+from app.schemas.telemetry import (
+    AggregateBatch,
+    HistoryResponse,
+    TelemetryBatch,
+    TelemetryBatchResponse,
+    TelemetryCreate,
+    TelemetryResponse,
+)
+from app.services.aggregates import ingest_windows
+from app.services.export import FORMATS, export_readings
+from app.services.ingest import dedup_key, ingest_readings, recent_keys
+from app.services.retention import read_history
+from app.services.wal import WalFullError, get_ingest_log
 
 router = APIRouter()
 
+NDJSON_CHUNK = 5000  # readings per insert statement for NDJSON uploads
+READING_FIELDS = ("id", "sensor_id", "sensor_type", "value", "unit", "timestamp")
+HISTORY_FIELDS = ("timestamp", "mean", "min", "max", "count")
+QUEUED = {202: {"model": TelemetryBatchResponse, "description": "Durably queued in the write-ahead log"}}
+
+
+async def _enqueue(payloads: list[TelemetryCreate]) -> JSONResponse:
+    """Append to the write-ahead log and acknowledge once fsync'd; dedup happens when it is loaded."""
+    log = get_ingest_log()
+    try:
+        seq = log.append([p.model_dump(mode="json", exclude_none=True) for p in payloads])
+    except WalFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    await log.durable(seq)
+    return JSONResponse(TelemetryBatchResponse(accepted=len(payloads), duplicates=0).model_dump(), status_code=202)
+
 
-@router.post("/", response_model=TelemetryResponse)
+@router.post("/", response_model=TelemetryResponse, responses=QUEUED)
 async def ingest_telemetry(payload: TelemetryCreate, db: Session = Depends(get_db)):
-    reading = SensorReading(
-        sensor_id=payload.sensor_id,
-        sensor_type=payload.sensor_type,
-        value=payload.value,
-        unit=payload.unit,
-    )
-    db.add(reading)
-    db.commit()
-    db.refresh(reading)
-    return reading
+    """Ingest one reading; a replay (same message_id or device timestamp) returns the stored one."""
+    if get_ingest_log() is not None:
+        return await _enqueue([payload])
+    return await run_in_threadpool(_ingest_one, db, payload)
+
+
+def _ingest_one(db: Session, payload: TelemetryCreate):
+    key = dedup_key(payload)
+    for _ in range(2):
+        readings, _ = ingest_readings(db, [payload])
+        if readings:
+            return TelemetryResponse.model_validate(readings[0])
+        existing = db.query(SensorReading).filter(SensorReading.dedup_key == key).first()
+        if existing is not None:
+            return TelemetryResponse.model_validate(existing).model_copy(update={"duplicate": True})
+        # Remembered as seen, but the stored row is gone (retention, a delete): store it again.
+        recent_keys.discard(key)
+    raise HTTPException(status_code=409, detail="Reading was rejected as a replay but is not stored")
+
+
+@router.post("/batch", response_model=TelemetryBatchResponse, responses=QUEUED)
+async def ingest_telemetry_batch(payload: TelemetryBatch, db: Session = Depends(get_db)):
+    """Ingest many readings in one statement; replayed readings are counted, not stored."""
+    if get_ingest_log() is not None:
+        return await _enqueue(payload.readings)
+    readings, duplicates = await run_in_threadpool(ingest_readings, db, payload.readings)
+    return TelemetryBatchResponse(accepted=len(readings), duplicates=duplicates)
+
+
+@router.post("/ndjson", response_model=TelemetryBatchResponse, responses=QUEUED)
+async def ingest_telemetry_ndjson(request: Request, db: Session = Depends(get_db)):
+    """Ingest newline-delimited JSON, one reading per line; the whole upload is validated first."""
+    payloads = []
+    for n, line in enumerate((await request.body()).splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            payloads.append(TelemetryCreate.model_validate_json(line))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail={"line": n, "errors": json.loads(e.json(include_url=False))})
+    if get_ingest_log() is not None:
+        return await _enqueue(payloads)
+    return await run_in_threadpool(_ingest_chunks, db, payloads)
+
+
+def _ingest_chunks(db: Session, payloads: list[TelemetryCreate]) -> TelemetryBatchResponse:
+    accepted = duplicates = 0
+    for i in range(0, len(payloads), NDJSON_CHUNK):
+        readings, dropped = ingest_readings(db, payloads[i:i + NDJSON_CHUNK])
+        accepted, duplicates = accepted + len(readings), duplicates + dropped
+    return TelemetryBatchResponse(accepted=accepted, duplicates=duplicates)
+
+
+@router.post("/aggregates", response_model=TelemetryBatchResponse)
+def ingest_aggregates(payload: AggregateBatch, db: Session = Depends(get_db)):
+    """Ingest edge-aggregated windows (count, mean, M2, min, max); a resent window counts as a duplicate."""
+    windows, duplicates = ingest_windows(db, payload.windows, payload.gateway_id)
+    return TelemetryBatchResponse(accepted=len(windows), duplicates=duplicates)
+
+
+@router.get("/export")
+def export_telemetry(
+    start: datetime = Query(..., description="Range start (inclusive)"),
+    end: datetime | None = Query(None, description="Range end (exclusive), default now"),
+    sensor_id: str | None = Query(None),
+    sensor_type: str | None = Query(None),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    """Stream raw readings over a time range as NDJSON or CSV, page by page (compressed on the fly)."""
+    rows = export_readings(AnalyticsSession, start, end, sensor_id=sensor_id, sensor_type=sensor_type, fmt=format)
+    return StreamingResponse(rows, media_type=FORMATS[format])
 
 
 @router.get("/", response_model=list[TelemetryResponse])
-async def list_telemetry(limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(SensorReading).order_by(SensorReading.timestamp.desc()).limit(limit).all()
+def list_telemetry(limit: int = 100, layout: str = LAYOUT_QUERY, db: Session = Depends(get_analytics_db)):
+    """Newest readings, selected as column tuples and encoded without building ORM objects or models."""
+    columns = [getattr(SensorReading, f) for f in READING_FIELDS]
+    rows = db.execute(select(*columns).order_by(SensorReading.timestamp.desc()).limit(limit)).all()
+    return FastJSONResponse(tabulate(READING_FIELDS, rows, layout, duplicate=False))
+
+
+@router.get("/history", response_model=HistoryResponse)
+def telemetry_history(
+    start: datetime = Query(..., description="Range start (inclusive)"),
+    end: datetime | None = Query(None, description="Range end (exclusive), default now"),
+    sensor_id: str | None = Query(None),
+    sensor_type: str | None = Query(None),
+    max_points: int | None = Query(None, ge=1, le=100_000),
+    layout: str = LAYOUT_QUERY,
+    db: Session = Depends(get_analytics_db),
+):
+    """Readings over a time range at the finest retained resolution (raw, 1m, 1h) that fits max_points."""
+    if not sensor_id and not sensor_type:
+        raise HTTPException(status_code=422, detail="sensor_id or sensor_type is required")
+    h = read_history(db, start, end, sensor_id=sensor_id, sensor_type=sensor_type, max_points=max_points)
+    series = (h.timestamps, h.mean, h.minimum, h.maximum, h.count)
+    if layout == "columns":
+        points = dict(zip(HISTORY_FIELDS, series))  # numpy arrays are encoded as they are
+    else:
+        points = tabulate(HISTORY_FIELDS, zip(h.timestamps, h.mean.tolist(), h.minimum.tolist(), h.maximum.tolist(), h.count.tolist()))
+    return FastJSONResponse({
+        "sensor_id": sensor_id,
+        "sensor_type": sensor_type,
+        "resolution": h.tier.name,
+        "resolution_seconds": h.tier.resolution,
+        "points": points,
+    })
@@ -0,0 +1,168 @@
+"""
+Admission control: a bulkhead per route class, and priority load shedding.
+
+Ingest and analytics requests are admitted through separate bulkheads. Each has a limit on
+in-flight requests and a bounded wait queue, so a burst of dashboard refreshes queues, and is
+shed, in its own compartment without taking the worker away from telemetry writes. Analytics is
+the lower priority: it is shed with 503 + Retry-After as soon as ingest has to queue, when its
+own queue is full, or after waiting `queue_timeout`. Ingest is shed only when its own queue
+overflows.
+"""
+import asyncio
+import time
+from collections import deque
+
+from fastapi import Request
+from starlette.responses import JSONResponse
+
+from app.core.database import is_statement_timeout
+from app.core.metrics import registry
+
+ACTIVE = registry.gauge("bulkhead_active", "Requests in flight per bulkhead")
+QUEUED = registry.gauge("bulkhead_queued", "Requests waiting for admission per bulkhead")
+QUEUE_WAIT = registry.histogram("bulkhead_queue_wait_seconds", "Time admitted requests spent queued")
+SHED = registry.counter("bulkhead_shed_total", "Requests rejected with 503, by bulkhead and reason")
+STATEMENT_TIMEOUTS = registry.counter("db_statement_timeouts_total", "Analytics statements cancelled by their timeout")
+
+
+class ShedError(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        queue: int = 0,
+        queue_timeout: float = 1.0,
+        retry_after: int = 1,
+        yields_to: "Bulkhead | None" = None,
+    ):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.yields_to = yields_to  # higher-priority bulkhead: shed while it is saturated
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def saturated(self) -> bool:
+        return self.active >= self.limit or bool(self._waiters)
+
+    def _shed(self, reason: str) -> ShedError:
+        SHED.inc(bulkhead=self.name, reason=reason)
+        return ShedError(reason, self.retry_after)
+
+    def _gauges(self) -> None:
+        ACTIVE.set(self.active, bulkhead=self.name)
+        QUEUED.set(len(self._waiters), bulkhead=self.name)
+
+    async def acquire(self) -> None:
+        if self.yields_to is not None and self.yields_to.saturated():
+            raise self._shed("priority")
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._gauges()
+            return
+        if len(self._waiters) >= self.queue:
+            raise self._shed("queue_full")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._gauges()
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)  # `release` hands its slot over
+        except asyncio.TimeoutError:
+            raise self._shed("queue_timeout") from None
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()  # cancelled just after being handed a slot: pass it on
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            self._gauges()
+        QUEUE_WAIT.observe(time.perf_counter() - t0, bulkhead=self.name)
+
+    def release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._gauges()
+                return
+        self.active -= 1
+        self._gauges()
+
+
+def classify(scope) -> str | None:
+    """Route class of a request: telemetry writes are ingest, analytics and telemetry reads analytics."""
+    path = scope["path"]
+    if path.startswith("/api/v1/telemetry"):
+        return "ingest" if scope["method"] == "POST" else "analytics"
+    if path.startswith("/api/v1/analytics"):
+        return "analytics"
+    return None
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, bulkheads: dict[str, Bulkhead], classify=classify):
+        self.app = app
+        self.bulkheads = bulkheads
+        self.classify = classify
+
+    async def __call__(self, scope, receive, send):
+        bulkhead = self.bulkheads.get(self.classify(scope)) if scope["type"] == "http" else None
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await bulkhead.acquire()
+        except ShedError as e:
+            response = JSONResponse(
+                {"detail": f"{bulkhead.name} overloaded ({e.reason}), retry later"},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            bulkhead.release()
+
+
+def bulkheads_from_settings(settings) -> dict[str, Bulkhead]:
+    ingest = Bulkhead("ingest", settings.ingest_concurrency, settings.ingest_queue, settings.ingest_queue_timeout)
+    analytics = Bulkhead(
+        "analytics",
+        settings.analytics_concurrency,
+        settings.analytics_queue,
+        settings.analytics_queue_timeout,
+        retry_after=settings.analytics_retry_after,
+        yields_to=ingest,
+    )
+    return {"ingest": ingest, "analytics": analytics}
+
+
+async def statement_timeout_handler(request: Request, exc: Exception):
+    """503 + Retry-After for a statement cancelled by the analytics timeout; anything else is a 500."""
+    if not is_statement_timeout(exc):
+        raise exc
+    from app.core.config import get_settings
+
+    STATEMENT_TIMEOUTS.inc(route=request.url.path)
+    return JSONResponse(
+        {"detail": "query exceeded the analytics statement timeout"},
+        status_code=503,
+        headers={"Retry-After": str(get_settings().analytics_retry_after)},
+    )
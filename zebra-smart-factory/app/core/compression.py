@@ -0,0 +1,246 @@
+"""
+Transparent HTTP compression in both directions (ASGI middleware).
+
+Requests: a body sent with `Content-Encoding: gzip | deflate | zstd` is inflated chunk by
+chunk as the route reads it, so JSON, NDJSON and batch ingest accept compressed gateway
+uplinks unchanged. Inflating past `max_request_bytes` answers 413, a corrupt or truncated body
+400, an unknown encoding 415.
+
+Responses: when Accept-Encoding allows it, a compressible body (JSON, NDJSON, CSV, text)
+is sent as zstd (if the `zstandard` package is installed) or gzip. A single-message body
+under `minimum_size` goes out as is. A streaming body is compressed incrementally: every
+chunk is flushed to the client as soon as it is produced, nothing is buffered.
+"""
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+
+from app.core.metrics import registry
+
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+
+BODY_BYTES = registry.counter(
+    "http_body_bytes_total", "HTTP body bytes by direction, content encoding and stage (raw or wire)"
+)
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip only
+    zstandard = None
+
+
+class _Encoder:
+    """Streaming compressor: `chunk` returns flushed output, `finish` ends the stream."""
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+            self._sync = zlib.Z_SYNC_FLUSH
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(self._sync)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._obj.compress(data) + self._obj.flush()
+
+
+class _FullError(Exception):
+    pass
+
+
+class _Decoder:
+    """Streaming decompressor: `chunk(data, max_length)` returns at most `max_length` bytes.
+
+    `complete` is False while a gzip/deflate stream has not reached its end marker, i.e. a
+    body that stops there was truncated.
+    """
+
+    def __init__(self, encoding: str):
+        self._zstd = encoding == "zstd"
+        if self._zstd:
+            # The writer pushes output in `write_size` pieces; `_write` stops it at the limit,
+            # so a bomb never inflates more than one piece past `max_length`.
+            self._out: list[bytes] = []
+            self._room = 0
+            self._obj = zstandard.ZstdDecompressor().stream_writer(self, write_size=1 << 16)
+        else:
+            self._obj = zlib.decompressobj(15 if encoding == "deflate" else 31)  # zlib / gzip container
+
+    def chunk(self, data: bytes, max_length: int) -> bytes:
+        if not self._zstd:
+            return self._obj.decompress(data, max_length)
+        self._out, self._room = [], max_length
+        try:
+            self._obj.write(data)
+        except _FullError:
+            pass
+        return b"".join(self._out)[:max_length]
+
+    def write(self, data: bytes) -> int:  # stream_writer sink
+        self._out.append(bytes(data))
+        self._room -= len(data)
+        if self._room <= 0:
+            raise _FullError
+        return len(data)
+
+    @property
+    def complete(self) -> bool:
+        return self._zstd or self._obj.eof
+
+
+def _decoder(encoding: str) -> _Decoder | None:
+    if encoding in ("gzip", "x-gzip", "deflate") or (encoding == "zstd" and zstandard is not None):
+        return _Decoder(encoding)
+    return None
+
+
+def encode(data: bytes, encoding: str, level: int = 6) -> bytes:
+    """Compress a whole body (clients, tests and benchmarks)."""
+    return _Encoder(encoding, level).finish(data) if encoding != "identity" else data
+
+
+def decode(data: bytes, encoding: str, limit: int = 1 << 30) -> bytes:
+    if encoding == "identity":
+        return data
+    dec = _decoder(encoding)
+    if dec is None:
+        raise ValueError(f"unsupported encoding {encoding!r}")
+    out = dec.chunk(data, limit + 1)
+    if not dec.complete:
+        raise ValueError(f"truncated {encoding} data")
+    return out
+
+
+def available_encodings() -> list[str]:
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Best encoding the client accepts (q > 0), preferring zstd over gzip; None for identity."""
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for enc in available_encodings():
+        if accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, level: int = 6, max_request_bytes: int = 64 << 20):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.max_request_bytes = max_request_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            decoder = _decoder(content_encoding)
+            if decoder is None:
+                response = PlainTextResponse(f"Unsupported Content-Encoding {content_encoding!r}", status_code=415)
+                await response(scope, receive, send)
+                return
+            scope, receive = self._inflating(scope, receive, decoder, content_encoding)
+        encoding = negotiate(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+        else:
+            await self.app(scope, receive, self._compressing(send, encoding))
+
+    def _inflating(self, scope, receive, decoder, encoding: str):
+        # The route sees a plain body: drop the encoding and the (compressed) length.
+        scope = dict(scope, headers=[(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")])
+        total = 0
+        limit = self.max_request_bytes
+
+        async def inflated():
+            nonlocal total
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            body = message.get("body", b"")
+            BODY_BYTES.inc(len(body), direction="request", encoding=encoding, stage="wire")
+            try:
+                body = decoder.chunk(body, limit - total + 1)
+            except Exception as e:  # zlib.error, zstandard.ZstdError
+                raise HTTPException(400, f"Corrupt {encoding} request body: {e}") from e
+            total += len(body)
+            if total > limit:
+                raise HTTPException(413, f"Decompressed request body exceeds {limit} bytes")
+            if not message.get("more_body", False) and not decoder.complete:
+                raise HTTPException(400, f"Truncated {encoding} request body")
+            BODY_BYTES.inc(len(body), direction="request", encoding=encoding, stage="raw")
+            return {**message, "body": body}
+
+        return scope, inflated
+
+    def _compressing(self, send, encoding: str):
+        state: dict = {"start": None, "encoder": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message  # held until the first body message decides
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if state["start"] is not None:
+                start, state["start"] = state["start"], None
+                headers = MutableHeaders(raw=list(start.get("headers", [])))
+                if not self._compressible(start["status"], headers) or (not more and len(body) < self.minimum_size):
+                    await send(start)
+                    await send(message)
+                    return
+                state["encoder"] = _Encoder(encoding, self.level)
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more:
+                    out = state["encoder"].finish(body)
+                    headers["content-length"] = str(len(out))
+                    self._count(encoding, body, out)
+                    await send({**start, "headers": headers.raw})
+                    await send({**message, "body": out})
+                    return
+                await send({**start, "headers": headers.raw})
+            encoder = state["encoder"]
+            if encoder is None:  # decided not to compress
+                await send(message)
+                return
+            out = encoder.chunk(body) if more else encoder.finish(body)
+            self._count(encoding, body, out)
+            await send({**message, "body": out})
+
+        return send_wrapper
+
+    @staticmethod
+    def _compressible(status: int, headers: MutableHeaders) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE)
+
+    @staticmethod
+    def _count(encoding: str, raw: bytes, wire: bytes) -> None:
+        BODY_BYTES.inc(len(raw), direction="response", encoding=encoding, stage="raw")
+        BODY_BYTES.inc(len(wire), direction="response", encoding=encoding, stage="wire")
@@ -9,7 +9,58 @@ class Settings(BaseSettings):
     postgres_user: str = "zebra_app"
     postgres_password: str = ""
     openai_api_key: str = ""
+    llm_backend: str = "auto"
+    llm_model: str = "gpt-4o-mini"
+    summary_cache_ttl: float = 600.0
+    summary_refresh_interval: float = 60.0
+    summary_stale_after: float = 30.0  # seconds before a served summary is revalidated in the background
     testing: bool = False
+    baseline_cache_ttl: float = 60.0
+    metrics_enabled: bool = False
+    profiler_token: str = ""
+    state_backend: str = "memory"  # memory | redis | sql
+    state_backend_url: str = ""
+    sketch_bucket_seconds: int = 3600
+    sketch_flush_interval: float = 10.0
+    ring_capacity: int = 1000
+    ring_max_sensors: int = 4096
+    ring_mmap_path: str = ""
+    retention_raw_days: float = 7.0
+    retention_minute_days: float = 90.0
+    retention_hour_days: float = 0.0  # 0 = keep forever
+    retention_interval: float = 300.0  # seconds between retention runs; 0 disables the job
+    retention_batch_size: int = 5000
+    retention_grace_seconds: int = 300
+    history_max_points: int = 2000
+    ingest_dedup_cache: int = 100_000  # recent idempotency keys remembered per worker
+    late_allowed_seconds: float = 300.0  # readings later than this (event time) go to backfill
+    compression_enabled: bool = True
+    compression_min_size: int = 1024  # smaller single-message responses are sent uncompressed
+    compression_level: int = 6  # gzip 1-9 / zstd 1-22
+    max_request_bytes: int = 64 << 20  # decompressed request body cap
+    ingest_wal_dir: str = ""  # write-ahead ingest log directory; empty = ingest writes the database directly
+    ingest_wal_segment_bytes: int = 64 << 20
+    ingest_wal_fsync_interval: float = 0.002  # group commit window: appends within it share one fsync
+    ingest_wal_max_bytes: int = 1 << 30  # backlog cap while the database is unreachable (then 503)
+    ingest_wal_batch: int = 5000  # readings per database load
+    ingest_wal_orphan_interval: float = 60.0  # seconds between sweeps for slots left by exited workers; 0 disables
+    db_pool_size: int = 10  # ingest / writes pool
+    db_max_overflow: int = 10
+    analytics_pool_size: int = 4  # separate pool for analytics reads
+    analytics_max_overflow: int = 0
+    analytics_statement_timeout: float = 15.0  # seconds per analytics statement; 0 = no limit
+    replica_database_url: str = ""  # read replica for analytics, charts, export and reports; empty = primary
+    replica_max_lag: float = 30.0  # seconds; a replica further behind is skipped for the primary
+    replica_check_interval: float = 5.0  # seconds between replica lag checks
+    admission_enabled: bool = True
+    ingest_concurrency: int = 20  # in-flight ingest requests per worker (<= db_pool_size + db_max_overflow)
+    ingest_queue: int = 1000
+    ingest_queue_timeout: float = 10.0
+    analytics_concurrency: int = 4  # in-flight analytics requests per worker (<= analytics pool)
+    analytics_queue: int = 16
+    analytics_queue_timeout: float = 2.0
+    analytics_retry_after: int = 5  # seconds, sent with shed analytics requests
+    warm_imports: bool = True  # load pandas / Plotly in the background once the worker is up
 
     @property
     def database_url(self) -> str:
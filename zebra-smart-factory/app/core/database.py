@@ -1,6 +1,26 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.metrics import registry
+
+REPLICA_LAG = registry.gauge("db_replica_lag_seconds", "Replication lag of the read replica at its last check")
+REPLICA_FALLBACKS = registry.counter("db_replica_fallbacks_total", "Replica checks that sent reads to the primary, by reason")
+
+# Postgres standby: 0 when it has replayed everything it received, else the age of the last replayed commit.
+PG_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def _driver_url(url: str) -> str:
+    return url.replace("postgresql://", "postgresql+psycopg2://", 1) if url.startswith("postgresql://") else url
 
 
 def _resolve_database_url() -> str:
@@ -11,17 +31,153 @@ def _resolve_database_url() -> str:
         or os.environ.get("POSTGRES_URL")
     )
     if url:
-        if url.startswith("postgresql://"):
-            url = url.replace("postgresql://", "postgresql+psycopg2://", 1)
-        return url
+        return _driver_url(url)
     from app.core.config import get_settings
     return get_settings().database_url
 
 
+def _create_engines():
+    """
+    Ingest and analytics get separate connection pools, so heavy reads cannot hold every
+    connection while telemetry writes wait. Analytics statements are bounded by
+    `analytics_statement_timeout` (server-side on Postgres). SQLite keeps one pool, because a
+    :memory: database exists once per connection; the timeout is enforced client-side there.
+    With `replica_database_url`, a third pool reads from the replica.
+    """
+    from app.core.config import get_settings
+
+    s = get_settings()
+    replica = _read_engine(_driver_url(s.replica_database_url), s) if s.replica_database_url else None
+    if "sqlite" in _db_url:
+        # Handlers run in the threadpool: a :memory: database must be one connection shared by all threads.
+        pool = {"poolclass": StaticPool} if ":memory:" in _db_url else {}
+        main = create_engine(_db_url, connect_args={"check_same_thread": False}, **pool)
+        _interruptible(main)
+        return main, main.execution_options(statement_timeout=s.analytics_statement_timeout or None), replica
+    main = create_engine(_db_url, pool_size=s.db_pool_size, max_overflow=s.db_max_overflow, pool_pre_ping=True)
+    return main, _read_engine(_db_url, s), replica
+
+
+def _read_engine(url: str, s):
+    """An analytics pool on `url`, with the analytics statement timeout."""
+    if url.startswith("sqlite"):
+        read = create_engine(url, connect_args={"check_same_thread": False})
+        _interruptible(read)
+        return read.execution_options(statement_timeout=s.analytics_statement_timeout or None)
+    connect_args = {}
+    if s.analytics_statement_timeout and url.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={int(s.analytics_statement_timeout * 1000)}"
+    return create_engine(
+        url, pool_size=s.analytics_pool_size, max_overflow=s.analytics_max_overflow, pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+
+
+def _interruptible(sqlite_engine) -> None:
+    """Honour the `statement_timeout` execution option (seconds) on SQLite via a progress handler."""
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _connect(dbapi_conn, record):
+        info = record.info
+        info["deadline"] = None
+        dbapi_conn.set_progress_handler(lambda: info["deadline"] is not None and time.monotonic() > info["deadline"], 1000)
+
+    @event.listens_for(sqlite_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        timeout = conn.get_execution_options().get("statement_timeout")
+        conn.info["deadline"] = time.monotonic() + timeout if timeout else None
+
+    # Cleared once the statement is done: a stale deadline would interrupt the rollback on checkin.
+    @event.listens_for(sqlite_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        conn.info["deadline"] = None
+
+    @event.listens_for(sqlite_engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            context.connection.info["deadline"] = None
+
+
+def is_statement_timeout(exc: BaseException) -> bool:
+    """A statement cancelled by its timeout (Postgres query_canceled, SQLite interrupt)."""
+    if not isinstance(exc, OperationalError):
+        return False
+    return getattr(exc.orig, "pgcode", None) == "57014" or "interrupted" in str(exc.orig)
+
+
+def replica_lag(conn) -> float:
+    """Seconds the replica behind `conn` lags its primary (0 for databases that are not a Postgres standby)."""
+    if conn.dialect.name != "postgresql":
+        return 0.0
+    return float(conn.execute(PG_REPLICA_LAG).scalar() or 0.0)
+
+
+class ReadRouter:
+    """
+    Bind for read-only sessions: the replica while it is reachable and at most `max_lag`
+    seconds behind, else the primary's analytics pool. The replica is checked at most every
+    `check_interval` seconds, so a lagging or failed replica costs one probe per interval.
+    """
+
+    def __init__(self, primary, replica=None, max_lag: float = 30.0, check_interval: float = 5.0, lag=replica_lag):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = lag
+        self.use_replica = False
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def bind(self):
+        if self.replica is None:
+            return self.primary
+        if time.monotonic() - self._checked >= self.check_interval and self._lock.acquire(blocking=False):
+            try:  # one probe at a time; other readers keep the last decision meanwhile
+                self.use_replica = self._probe()
+                self._checked = time.monotonic()
+            finally:
+                self._lock.release()
+        return self.replica if self.use_replica else self.primary
+
+    def _probe(self) -> bool:
+        try:
+            with self.replica.connect() as conn:
+                lag = self.lag(conn)
+        except SQLAlchemyError:
+            REPLICA_FALLBACKS.inc(reason="unreachable")
+            return False
+        REPLICA_LAG.set(lag)
+        if lag > self.max_lag:
+            REPLICA_FALLBACKS.inc(reason="lag")
+            return False
+        return True
+
+    def reset(self) -> None:
+        """Re-check the replica on the next read."""
+        self._checked = float("-inf")
+
+
+class _ReadSessionMaker(sessionmaker):
+    """Sessions bound to `read_router.bind()` at creation, unless a bind is passed."""
+
+    def __call__(self, **local_kw):
+        local_kw.setdefault("bind", read_router.bind())
+        return super().__call__(**local_kw)
+
+
+def _router_from_settings() -> ReadRouter:
+    from app.core.config import get_settings
+
+    s = get_settings()
+    return ReadRouter(analytics_engine, replica_engine, s.replica_max_lag, s.replica_check_interval)
+
+
 _db_url = _resolve_database_url()
-_connect_args = {"check_same_thread": False} if "sqlite" in _db_url else {}
-engine = create_engine(_db_url, connect_args=_connect_args)
+engine, analytics_engine, replica_engine = _create_engines()
+read_router = _router_from_settings()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AnalyticsSession = _ReadSessionMaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
 
@@ -31,3 +187,36 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_analytics_db():
+    """Read-only session: the replica when it is fresh enough, else the analytics pool; statement timeout applies."""
+    db = AnalyticsSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def dialect_insert(bind):
+    """`insert` with ON CONFLICT support for the bind's dialect (Postgres, SQLite), else None."""
+    name = bind.dialect.name if hasattr(bind, "dialect") else bind.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def epoch_bucket(bind, column, seconds: int):
+    """SQL expression: `column` floored to a `seconds` bucket, as integer epoch seconds."""
+    from sqlalchemy import BigInteger, Integer, cast, func, literal_column
+
+    # Inlined, not bound: Postgres only matches a GROUP BY expression with identical parameters.
+    size = literal_column(str(int(seconds)), Integer)
+    name = bind.dialect.name if hasattr(bind, "dialect") else bind.get_bind().dialect.name
+    if name == "sqlite":
+        return cast(func.strftime("%s", column), Integer) // size * size
+    return cast(func.floor(func.extract("epoch", column) / size) * size, BigInteger)
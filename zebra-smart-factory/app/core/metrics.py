@@ -0,0 +1,300 @@
+"""
+Opt-in request instrumentation: Prometheus-style metrics, per-request DB stats, timing spans.
+
+Everything here is a no-op until `enable()` is called (see `metrics_enabled` in Settings),
+so `span()` / `timed()` can stay in hot paths at negligible cost.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_enabled = False
+
+
+def _fmt_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        s = self._series.get(tuple(sorted(labels.items())))
+        return s[-1] if s else 0
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, s in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, s):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', repr(float(bound))),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', '+Inf'),))} {s[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {s[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {s[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help_text, **kwargs)
+            return m
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for m in metrics:
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template"
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries", "DB queries issued per HTTP request", buckets=COUNT_BUCKETS
+)
+REQUEST_DB_TIME = registry.histogram(
+    "http_request_db_seconds", "Total DB time per HTTP request"
+)
+DB_QUERY_LATENCY = registry.histogram("db_query_duration_seconds", "Individual DB statement latency")
+SPAN_LATENCY = registry.histogram("span_duration_seconds", "Named timing spans in the service layer")
+
+
+@dataclass
+class RequestStats:
+    """Per-request accumulator, shared through a context variable."""
+    db_queries: int = 0
+    db_time: float = 0.0
+    spans: dict[str, float] = field(default_factory=dict)
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block under `name`; recorded globally and on the current request."""
+    if not _enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        SPAN_LATENCY.observe(elapsed, span=name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.spans[name] = stats.spans.get(name, 0.0) + elapsed
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of span()."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time every statement executed on `engine`."""
+    if getattr(engine, "_zebra_instrumented", False):
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts or not _enabled:
+            if starts:
+                starts.pop()
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        DB_QUERY_LATENCY.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_time += elapsed
+
+    engine._zebra_instrumented = True
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and DB usage.
+    Also adds a Server-Timing header (db, spans, total) so a single request can be
+    broken down from the browser dev tools.
+    """
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        t0 = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(stats, time.perf_counter() - t0).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - t0
+            route = scope.get("route")
+            labels = {
+                "method": scope.get("method", ""),
+                "route": getattr(route, "path", "unmatched"),
+                "status": str(status["code"]),
+            }
+            REQUEST_LATENCY.observe(elapsed, **labels)
+            REQUEST_DB_QUERIES.observe(stats.db_queries, route=labels["route"])
+            REQUEST_DB_TIME.observe(stats.db_time, route=labels["route"])
+
+
+def _server_timing(stats: RequestStats, total: float) -> str:
+    parts = [f'db;dur={stats.db_time * 1000:.2f};desc="{stats.db_queries} queries"']
+    for name, secs in stats.spans.items():
+        parts.append(f"{name.replace(' ', '_')};dur={secs * 1000:.2f}")
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
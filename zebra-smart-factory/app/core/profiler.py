@@ -0,0 +1,91 @@
+"""
+On-demand sampling profiler.
+
+A daemon thread snapshots every other thread's stack via sys._current_frames() at a fixed
+interval and counts collapsed stacks ("outer;...;inner N"), the input format of
+flamegraph.pl and speedscope. Overhead is proportional to the sampling rate, not to the
+request rate, so it is safe to switch on briefly in production.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks: Counter[str] = Counter()
+        self._samples = 0
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._started_at: float | None = None
+        self._deadline: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float | None = None, duration: float | None = None) -> None:
+        """Start sampling; stops by itself after `duration` seconds if given."""
+        with self._lock:
+            if self.running:
+                return
+            if interval is not None:
+                self.interval = interval
+            self._stacks = Counter()
+            self._samples = 0
+            self._stop.clear()
+            self._started_at = time.monotonic()
+            self._deadline = self._started_at + duration if duration else None
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return collapsed stacks."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+        return self.collapsed()
+
+    def status(self) -> dict:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "running": self.running,
+            "interval_sec": self.interval,
+            "samples": self._samples,
+            "unique_stacks": len(self._stacks),
+            "elapsed_sec": round(elapsed, 3),
+        }
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                break
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == me:
+                        continue
+                    self._stacks[self._collapse(frame)] += 1
+                self._samples += 1
+
+    def _collapse(self, frame) -> str:
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+
+profiler = SamplingProfiler()
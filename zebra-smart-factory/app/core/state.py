@@ -0,0 +1,385 @@
+"""
+Pluggable shared state for caches, locks and pub/sub fan-out.
+
+One process (`STATE_BACKEND=memory`, the default) keeps everything in a dict. With several
+worker processes, pick a shared backend so caches, leader locks and invalidation messages
+are seen by every worker:
+
+- `redis`: `STATE_BACKEND_URL=redis://localhost:6379/0` (needs the `redis` package)
+- `sql`:   key/value rows in an `app_state` table on the app database (or STATE_BACKEND_URL).
+           Pub/sub uses LISTEN/NOTIFY on Postgres and a polled `app_events` table elsewhere
+           (e.g. a SQLite file shared by local workers).
+
+The API is synchronous and small on purpose: get/set with TTL, set_if_absent (locks and
+leader election), delete, publish/subscribe. Subscriber callbacks may run on a background
+thread; they receive the message payload as a string.
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from sqlalchemy import create_engine, delete, func, insert, text
+from sqlalchemy import select as sa_select
+from sqlalchemy.engine import Engine
+
+from app.models.state import AppEvent, AppState
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Callback = Callable[[str], None]
+
+# Created by migration 0009: run `python -m app.migrate` (with --database-url for a separate STATE_BACKEND_URL).
+state_table = AppState.__table__
+events_table = AppEvent.__table__
+
+
+class StateBackend:
+    name = "base"
+    shared = False
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Atomically set key if missing or expired; True when this call set it."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def publish(self, channel: str, message: str) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def _dispatch(self, callbacks: list[Callback], message: str) -> None:
+        for cb in callbacks:
+            try:
+                cb(message)
+            except Exception:
+                logger.exception("state backend subscriber failed")
+
+
+class MemoryBackend(StateBackend):
+    """Single-process backend: an LRU dict with expiry; publish calls subscribers inline."""
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+        self._subs: dict[str, list[Callback]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and time.time() >= expires:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self.set(key, value, ttl)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, channel: str, message: str) -> None:
+        self._dispatch(list(self._subs.get(channel, [])), message)
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        with self._lock:
+            self._subs.setdefault(channel, []).append(callback)
+
+
+class RedisBackend(StateBackend):
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis needs the 'redis' package") from e
+        self._client = redis.Redis.from_url(url)
+        self._pubsubs = []
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        return bool(self._client.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def publish(self, channel: str, message: str) -> None:
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+
+        def handler(msg):
+            data = msg["data"]
+            self._dispatch([callback], data.decode() if isinstance(data, bytes) else str(data))
+
+        pubsub.subscribe(**{channel: handler})
+        self._pubsubs.append((pubsub, pubsub.run_in_thread(sleep_time=0.5, daemon=True)))
+
+    def close(self) -> None:
+        for pubsub, thread in self._pubsubs:
+            thread.stop()
+            pubsub.close()
+        self._client.close()
+
+
+class SQLBackend(StateBackend):
+    """
+    Shared state in the database. Works on Postgres (LISTEN/NOTIFY pub/sub) and on any other
+    SQLAlchemy dialect with a polled events table, e.g. one SQLite file used by local workers.
+    """
+    name = "sql"
+    shared = True
+
+    def __init__(self, engine: Engine, poll_interval: float = 0.2, event_retention: float = 60.0):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.event_retention = event_retention
+        self._postgres = engine.dialect.name == "postgresql"
+        self._subs: dict[str, list[Callback]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._listen_ok = False  # the current LISTEN connection got its channels subscribed
+        self._pending_listen: list[str] = []
+        self._last_pruned = 0.0
+
+    def _upsert(self, conn, key: str, value: bytes, expires: float | None, only_if_absent: bool) -> int:
+        dialect = self.engine.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(state_table).values(key=key, value=value, expires_at=expires)
+            if only_if_absent:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["key"])
+            else:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["key"], set_={"value": value, "expires_at": expires}
+                )
+            return conn.execute(stmt).rowcount
+        exists = conn.execute(sa_select(state_table.c.key).where(state_table.c.key == key)).first()
+        if exists and only_if_absent:
+            return 0
+        conn.execute(delete(state_table).where(state_table.c.key == key))
+        conn.execute(insert(state_table).values(key=key, value=value, expires_at=expires))
+        return 1
+
+    def get(self, key: str) -> bytes | None:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                sa_select(state_table.c.value, state_table.c.expires_at).where(state_table.c.key == key)
+            ).first()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return bytes(row[0])
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        with self.engine.begin() as conn:
+            self._upsert(conn, key, value, time.time() + ttl if ttl else None, only_if_absent=False)
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(
+                delete(state_table).where(state_table.c.key == key, state_table.c.expires_at <= now)
+            )
+            return self._upsert(conn, key, value, now + ttl if ttl else None, only_if_absent=True) == 1
+
+    def delete(self, key: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(state_table).where(state_table.c.key == key))
+
+    def publish(self, channel: str, message: str) -> None:
+        with self.engine.begin() as conn:
+            if self._postgres:
+                conn.execute(text("SELECT pg_notify(:c, :m)"), {"c": channel, "m": message})
+                return
+            now = time.time()
+            conn.execute(insert(events_table).values(channel=channel, payload=message, created_at=now))
+            if now - self._last_pruned > self.event_retention:
+                self._last_pruned = now
+                conn.execute(delete(events_table).where(events_table.c.created_at < now - self.event_retention))
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        with self._lock:
+            self._subs.setdefault(channel, []).append(callback)
+            self._pending_listen.append(channel)
+            if self._thread is None:
+                target = self._listen_postgres if self._postgres else self._poll_events
+                self._thread = threading.Thread(target=target, name="state-subscriber", daemon=True)
+                self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _listen_postgres(self) -> None:
+        """LISTEN until closed. A dropped connection is re-opened with backoff and every channel re-subscribed."""
+        delay = 0.5
+        while not self._stop.is_set():
+            self._listen_ok = False
+            try:
+                self._listen()
+                return
+            except Exception:
+                if self._listen_ok:
+                    delay = 0.5  # it was listening: a fresh drop, not a failing reconnect
+                logger.warning(
+                    "state backend LISTEN connection lost (notifications until it is back are missed); "
+                    "reconnecting in %.1fs", delay, exc_info=True,
+                )
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, 30.0)
+
+    def _listen(self) -> None:
+        raw = self.engine.raw_connection()
+        try:
+            dbapi_conn = raw.driver_connection
+            dbapi_conn.autocommit = True
+            cur = dbapi_conn.cursor()
+            with self._lock:
+                pending, self._pending_listen = list(self._subs), []
+            while not self._stop.is_set():
+                for channel in pending:
+                    cur.execute(f'LISTEN "{channel}"')
+                self._listen_ok = True
+                with self._lock:
+                    pending, self._pending_listen = self._pending_listen, []
+                if select.select([dbapi_conn], [], [], 0.5) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    note = dbapi_conn.notifies.pop(0)
+                    self._dispatch(list(self._subs.get(note.channel, [])), note.payload)
+        finally:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def _poll_events(self) -> None:
+        with self.engine.connect() as conn:
+            last_id = conn.execute(sa_select(func.coalesce(func.max(events_table.c.id), 0))).scalar()
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                channels = list(self._subs)
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(
+                        sa_select(events_table.c.id, events_table.c.channel, events_table.c.payload)
+                        .where(events_table.c.id > last_id, events_table.c.channel.in_(channels))
+                        .order_by(events_table.c.id)
+                    ).all()
+            except Exception:
+                logger.exception("state backend poll failed")
+                continue
+            for event_id, channel, payload in rows:
+                last_id = event_id
+                self._dispatch(list(self._subs.get(channel, [])), payload)
+
+
+class RecentIds:
+    """Bounded set of recently seen ids (or other hashable keys), for de-duplicating messages."""
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._ids: OrderedDict[Hashable, None] = OrderedDict()
+
+    def __contains__(self, item_id: Hashable) -> bool:
+        return item_id in self._ids
+
+    def add(self, item_id: Hashable) -> bool:
+        """Remember item_id; False when it was already seen."""
+        if item_id in self._ids:
+            return False
+        self._ids[item_id] = None
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+        return True
+
+    def discard(self, item_id: Hashable) -> None:
+        self._ids.pop(item_id, None)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+
+def build_state_backend(kind: str, url: str = "", default_engine: Engine | None = None) -> StateBackend:
+    kind = kind.lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0")
+    if kind == "sql":
+        if url:
+            connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+            return SQLBackend(create_engine(url, connect_args=connect_args))
+        if default_engine is None:
+            from app.core.database import engine as default_engine
+        return SQLBackend(default_engine)
+    raise ValueError(f"Unknown STATE_BACKEND {kind!r} (memory, redis, sql)")
+
+
+_backend: StateBackend | None = None
+
+
+def get_state_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        from app.core.config import get_settings
+        settings = get_settings()
+        _backend = build_state_backend(settings.state_backend, settings.state_backend_url)
+    return _backend
+
+
+def set_state_backend(backend: StateBackend | None) -> None:
+    """Swap the process-wide backend (tests, custom deployments)."""
+    global _backend
+    _backend = backend
@@ -1,11 +1,44 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import telemetry, analytics
-from app.api import dashboard
-from app.core.database import engine, Base
+from sqlalchemy.exc import OperationalError
+from app.api.v1 import telemetry, analytics, baselines, sketches, retention
+from app.api import dashboard, metrics as metrics_routes
+from app.core import metrics
+from app.core.admission import AdmissionMiddleware, bulkheads_from_settings, statement_timeout_handler
+from app.core.compression import CompressionMiddleware
+from app.core.config import get_settings
+from app.core.database import AnalyticsSession, analytics_engine, engine, replica_engine, SessionLocal
+from app.core.state import get_state_backend
+from app.services.retention import retention_service
+from app.services.sketch_store import sketch_recorder
+from app.services.summary_service import summary_service
+from app.services.wal import get_ingest_log, open_ingest_log, set_ingest_log, wal_consumer
 
 app = FastAPI(title="ZebraStream IoT API", version="1.0.0")
 
+if get_settings().metrics_enabled:
+    metrics.enable()
+    metrics.instrument_engine(engine)
+    if analytics_engine.pool is not engine.pool:
+        metrics.instrument_engine(analytics_engine)
+    if replica_engine is not None:
+        metrics.instrument_engine(replica_engine)
+    app.add_middleware(metrics.MetricsMiddleware)
+
+settings = get_settings()
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        level=settings.compression_level,
+        max_request_bytes=settings.max_request_bytes,
+    )
+if settings.admission_enabled:  # outside compression: a shed request is never inflated
+    app.add_middleware(AdmissionMiddleware, bulkheads=bulkheads_from_settings(settings))
+app.add_exception_handler(OperationalError, statement_timeout_handler)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -15,13 +48,38 @@ app.add_middleware(
 )
 
 app.include_router(dashboard.router, tags=["dashboard"])
+app.include_router(metrics_routes.router, tags=["ops"])
 app.include_router(telemetry.router, prefix="/api/v1/telemetry", tags=["telemetry"])
 app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytics"])
+app.include_router(baselines.router, prefix="/api/v1/analytics/baselines", tags=["baselines"])
+app.include_router(sketches.router, prefix="/api/v1/analytics/sketches", tags=["sketches"])
+app.include_router(retention.router, prefix="/api/v1/retention", tags=["retention"])
 
 
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
+    # No DDL here: the schema is migrated once per deploy (python -m app.migrate).
+    summary_service.start(AnalyticsSession)  # summaries only read: replica when configured
+    retention_service.start(SessionLocal)
+    if open_ingest_log() is not None:
+        wal_consumer.start(SessionLocal)
+    if get_settings().warm_imports:
+        from app.services.charts import warm_up
+
+        asyncio.get_running_loop().run_in_executor(None, warm_up)  # off the request path, not awaited
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await summary_service.stop()
+    await retention_service.stop()
+    await wal_consumer.stop()
+    if (log := get_ingest_log()) is not None:
+        log.close()  # whatever is left replays on the next start
+        set_ingest_log(None)
+    with SessionLocal() as db:
+        sketch_recorder.flush(db)
+    get_state_backend().close()
 
 
 @app.get("/health")
@@ -0,0 +1,133 @@
+"""
+Schema migrations (Alembic; scripts in migrations/versions).
+
+    python -m app.migrate                  # upgrade the database to the latest revision
+    python -m app.migrate --check          # exit 1 unless the database is at the latest revision
+    python -m app.migrate --revision 0005  # upgrade or downgrade to a given revision
+    python -m app.migrate --database-url sqlite:///state.db  # another database, e.g. STATE_BACKEND_URL
+
+Run once per deploy, before the new app version starts serving: the app itself runs no DDL
+at boot. A database created before migrations existed (by the old boot-time `create_all`)
+has no `alembic_version` table; it is stamped with the newest revision its tables already
+match, then upgraded from there. Older revisions it lacks (columns `create_all` never added
+to existing tables) are applied on their own first.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Newest first: (revision, test on the inspected schema) for databases without a version table.
+_ADOPT = [
+    ("0008", lambda tables, columns: "sensor_windows" in tables),
+    ("0007", lambda tables, columns: "backfill_requests" in tables),
+    ("0006", lambda tables, columns: "dedup_key" in columns("sensor_readings")),
+    ("0005", lambda tables, columns: "sensor_rollups" in tables),
+    ("0004", lambda tables, columns: "sensor_latest" in tables),
+    ("0003", lambda tables, columns: "sensor_sketches" in tables),
+    ("0002", lambda tables, columns: "control_baselines" in tables),
+    ("0001", lambda tables, columns: "sensor_readings" in tables),
+]
+
+
+def alembic_config(connection: Connection | None = None) -> Config:
+    cfg = Config(str(ROOT / "alembic.ini"))
+    cfg.set_main_option("script_location", str(ROOT / "migrations"))
+    cfg.attributes["connection"] = connection
+    return cfg
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision(connection: Connection) -> str | None:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def _schema(connection: Connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    def columns(table: str) -> set[str]:
+        return {c["name"] for c in inspector.get_columns(table)} if table in tables else set()
+
+    return tables, columns
+
+
+def detect_revision(connection: Connection) -> str | None:
+    """Newest revision whose change an unversioned database already has, or None when it is empty."""
+    tables, columns = _schema(connection)
+    return next((rev for rev, matches in _ADOPT if matches(tables, columns)), None)
+
+
+def missing_revisions(connection: Connection, revision: str) -> list[str]:
+    """
+    Revisions up to `revision` whose change the database lacks, oldest first. `create_all`
+    created new tables but never altered existing ones, so a pre-migration database can have
+    a newer table without an older column (0007's table without 0006's `dedup_key`).
+    """
+    tables, columns = _schema(connection)
+    older = [rev for rev, _ in _ADOPT]
+    return [rev for rev, matches in reversed(_ADOPT[older.index(revision):]) if not matches(tables, columns)]
+
+
+def upgrade(engine: Engine, revision: str = "head") -> tuple[str | None, str | None]:
+    """Bring the schema to `revision` (adopting a pre-migration database); returns (before, after)."""
+    with engine.begin() as connection:
+        cfg = alembic_config(connection)
+        before = current_revision(connection)
+        if before is None:
+            before = detect_revision(connection)
+            if before is not None:
+                script = ScriptDirectory.from_config(cfg)
+                for gap in missing_revisions(connection, before):  # apply just that revision
+                    command.stamp(cfg, script.get_revision(gap).down_revision or "base")
+                    command.upgrade(cfg, gap)
+                command.stamp(cfg, before)
+        if revision == "head" or before is None or _is_ancestor(before, revision):
+            command.upgrade(cfg, revision)
+        else:
+            command.downgrade(cfg, revision)
+        return before, current_revision(connection)
+
+
+def _is_ancestor(rev: str, of: str) -> bool:
+    script = ScriptDirectory.from_config(alembic_config())
+    return any(s.revision == rev for s in script.iterate_revisions(of, "base"))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Migrate the database schema.")
+    parser.add_argument("--revision", default="head")
+    parser.add_argument("--check", action="store_true", help="Only report; exit 1 when not at the latest revision")
+    parser.add_argument("--database-url", default="", help="Migrate this database instead of the app's")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        from sqlalchemy import create_engine
+
+        engine = create_engine(args.database_url)
+    else:
+        from app.core.database import engine
+
+    if args.check:
+        with engine.connect() as connection:
+            current, head = current_revision(connection), head_revision()
+        print(f"database at {current or 'no revision'}, latest is {head}")
+        return 0 if current == head else 1
+    before, after = upgrade(engine, args.revision)
+    print(f"database migrated from {before or 'empty'} to {after}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,12 @@
+from app.models.baseline import ControlBaseline
+from app.models.latest import SensorLatest
+from app.models.rollup import BackfillRequest, PipelineWatermark, SensorRollup
 from app.models.sensor import SensorReading
+from app.models.sketch import SensorSketch
+from app.models.state import AppEvent, AppState
+from app.models.window import SensorWindow
 
-__all__ = ["SensorReading"]
+__all__ = [
+    "SensorReading", "ControlBaseline", "SensorSketch", "SensorLatest", "SensorRollup", "PipelineWatermark",
+    "BackfillRequest", "SensorWindow", "AppState", "AppEvent",
+]
@@ -0,0 +1,23 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class ControlBaseline(Base):
+    """Phase I control limits for one sensor, computed from an in-control reference period."""
+    __tablename__ = "control_baselines"
+    __table_args__ = (UniqueConstraint("sensor_id", "version", name="uq_control_baselines_sensor_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(String(50), index=True, nullable=False)
+    version = Column(Integer, nullable=False)
+    active = Column(Boolean, nullable=False, default=True, index=True)
+    center = Column(Float, nullable=False)
+    sigma = Column(Float, nullable=False)
+    ucl = Column(Float, nullable=False)
+    lcl = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    reference_start = Column(DateTime(timezone=True), nullable=False)
+    reference_end = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class SensorLatest(Base):
+    """One row per sensor: last reading, running (Welford) stats and current control status."""
+    __tablename__ = "sensor_latest"
+
+    sensor_id = Column(String(50), primary_key=True)
+    sensor_type = Column(String(50), nullable=False, index=True)
+    unit = Column(String(20), nullable=True)
+    last_value = Column(Float, nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    last_reading_id = Column(Integer, nullable=True)
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)  # sum of squared deviations from the mean
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    status = Column(String(20), nullable=False, index=True)
+    center = Column(Float, nullable=True)
+    ucl = Column(Float, nullable=True)
+    lcl = Column(Float, nullable=True)
+    limits_source = Column(String(20), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
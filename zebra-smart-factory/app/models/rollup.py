@@ -0,0 +1,45 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class SensorRollup(Base):
+    """Downsampled readings: moments per sensor and bucket at one resolution (60 s, 3600 s)."""
+    __tablename__ = "sensor_rollups"
+    __table_args__ = (
+        UniqueConstraint("sensor_id", "resolution", "bucket_start", name="uq_sensor_rollups_sensor_res_bucket"),
+        Index("ix_sensor_rollups_res_bucket", "resolution", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(String(50), nullable=False)
+    sensor_type = Column(String(50), nullable=False, index=True)
+    resolution = Column(Integer, nullable=False)  # bucket width in seconds
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    total_sq = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+
+
+class PipelineWatermark(Base):
+    """How far a background job has processed: a time position and the last reading id it saw."""
+    __tablename__ = "pipeline_watermarks"
+
+    name = Column(String(100), primary_key=True)
+    position = Column(DateTime(timezone=True), nullable=True)
+    last_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class BackfillRequest(Base):
+    """A closed sketch bucket that received readings too late to merge; rebuilt from raw rows."""
+    __tablename__ = "backfill_requests"
+    __table_args__ = (UniqueConstraint("sensor_id", "bucket_start", name="uq_backfill_requests_sensor_bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(String(50), nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -12,3 +12,5 @@ class SensorReading(Base):
     value = Column(Float, nullable=False)
     unit = Column(String(20), nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Idempotency key (sensor + client message id, or sensor + device timestamp); NULL = no dedup.
+    dedup_key = Column(String(200), unique=True, nullable=True)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, Float, Integer, LargeBinary, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class SensorSketch(Base):
+    """Per sensor and time bucket: moments plus serialized t-digest and HyperLogLog sketches."""
+    __tablename__ = "sensor_sketches"
+    __table_args__ = (UniqueConstraint("sensor_id", "bucket_start", name="uq_sensor_sketches_sensor_bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(String(50), index=True, nullable=False)
+    sensor_type = Column(String(50), nullable=False, index=True)
+    bucket_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    total_sq = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    digest = Column(LargeBinary, nullable=False)
+    distinct_values = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Float, Integer, LargeBinary, String, Text
+
+from app.core.database import Base
+
+
+class AppState(Base):
+    """Shared key/value state of the `sql` state backend (app.core.state)."""
+    __tablename__ = "app_state"
+
+    key = Column(String(255), primary_key=True)
+    value = Column(LargeBinary, nullable=False)
+    expires_at = Column(Float, nullable=True)  # epoch seconds
+
+
+class AppEvent(Base):
+    """Pub/sub messages of the `sql` state backend on databases without LISTEN/NOTIFY."""
+    __tablename__ = "app_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    channel = Column(String(100), nullable=False, index=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class SensorWindow(Base):
+    """An edge-aggregated window: moments of the samples a gateway did not forward individually."""
+    __tablename__ = "sensor_windows"
+    __table_args__ = (
+        UniqueConstraint("sensor_id", "window_start", "window_seconds", name="uq_sensor_windows_sensor_window"),
+        Index("ix_sensor_windows_sensor_start", "sensor_id", "window_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(String(50), nullable=False)
+    sensor_type = Column(String(50), nullable=False, index=True)
+    unit = Column(String(20), nullable=True)
+    gateway_id = Column(String(100), nullable=True)
+    window_start = Column(DateTime(timezone=True), nullable=False)
+    window_seconds = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)  # sum of squared deviations from the mean
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    last_value = Column(Float, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
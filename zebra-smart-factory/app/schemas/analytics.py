@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from datetime import datetime
 from typing import Optional
 
 
@@ -25,3 +26,200 @@ class SPCStatsResponse(BaseModel):
     count: int
     control_limits: ControlLimitsResponse
     anomaly_indices: list[int]
+    limits_source: str = "window"
+    baseline_version: Optional[int] = None
+
+
+class BaselineRecomputeRequest(BaseModel):
+    reference_start: datetime
+    reference_end: datetime
+    sensor_ids: Optional[list[str]] = None
+    min_samples: int = 20
+
+
+class BaselineResponse(BaseModel):
+    sensor_id: str
+    version: int
+    active: bool
+    center: float
+    sigma: float
+    ucl: float
+    lcl: float
+    sample_count: int
+    reference_start: datetime
+    reference_end: datetime
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SketchStatsResponse(BaseModel):
+    sensor_id: Optional[str] = None
+    sensor_type: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    buckets: int
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    percentiles: dict[str, float]
+    iqr_lower: float
+    iqr_upper: float
+    distinct_values: int
+
+
+class SketchRebuildRequest(BaseModel):
+    start: datetime
+    end: datetime
+    sensor_ids: Optional[list[str]] = None
+
+
+class SensorLatestResponse(BaseModel):
+    sensor_id: str
+    sensor_type: str
+    unit: Optional[str] = None
+    last_value: float
+    last_timestamp: datetime
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    status: str
+    center: Optional[float] = None
+    ucl: Optional[float] = None
+    lcl: Optional[float] = None
+    limits_source: Optional[str] = None
+
+
+class PlantOverviewResponse(BaseModel):
+    total: int
+    by_status: dict[str, int]
+    sensors: list[SensorLatestResponse]
+
+
+class CorrelationPair(BaseModel):
+    a: str
+    b: str
+    r: float
+
+
+class CorrelationResponse(BaseModel):
+    sensors: list[str]
+    buckets: int
+    bucket_seconds: int
+    matrix: list[list[float]]
+    top_pairs: list[CorrelationPair]
+    windows: Optional[list[datetime]] = None  # end of each rolling window
+    rolling: Optional[list[list[list[float]]]] = None
+
+
+class T2Point(BaseModel):
+    timestamp: datetime
+    t2: float
+    spe: float
+    out_of_control: bool
+    contributors: dict[str, float]
+
+
+class T2Response(BaseModel):
+    sensors: list[str]
+    reference_buckets: int
+    components: int
+    explained_variance: float
+    t2_ucl: float
+    spe_ucl: float
+    points: list[T2Point]
+
+
+class ResampleResponse(BaseModel):
+    timestamps: list[datetime]  # bucket starts
+    bucket_seconds: int
+    method: str
+    source: str  # retention tier read: raw, 1m or 1h
+    series: dict[str, list[Optional[float]]]
+
+
+class SnapshotStats(BaseModel):
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    control_limits: Optional[ControlLimitsResponse] = None
+    anomaly_indices: list[int]
+
+
+class SnapshotSeries(BaseModel):
+    labels: list[str]  # sensor id per value
+    values: list[float]
+    xbar_limits: Optional[ControlLimitsResponse] = None
+    cusum: list[float]
+
+
+class SnapshotPareto(BaseModel):
+    labels: list[str]
+    values: list[int]
+    source: str  # all readings (sensor_latest) or the window
+
+
+class SnapshotHeatmap(BaseModel):
+    x: list[str]  # sensor ids
+    y: list[str]  # sensor types
+    z: list[list[Optional[float]]]
+
+
+class DashboardSnapshot(BaseModel):
+    generated_at: datetime
+    window: int
+    stats: SnapshotStats
+    series: SnapshotSeries
+    pareto: SnapshotPareto
+    heatmap: SnapshotHeatmap
+
+
+class WindowPoint(BaseModel):
+    window_start: datetime
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    ucl: float
+    lcl: float
+    out_of_control: bool
+
+
+class WindowChartResponse(BaseModel):
+    sensor_id: str
+    center: float
+    sigma: float  # pooled within-window standard deviation
+    limits_source: str  # baseline | windows
+    points: list[WindowPoint]
+
+
+class BreachForecast(BaseModel):
+    sensor_id: str
+    sensor_type: Optional[str] = None
+    model: str  # linear | exponential
+    current: float  # fitted hourly mean now
+    slope_per_hour: float
+    t_stat: float
+    r2: float
+    points: int  # hours with data in the window
+    ucl: Optional[float] = None
+    lcl: Optional[float] = None
+    limits_source: Optional[str] = None  # baseline | lifetime
+    limit: Optional[str] = None  # ucl | lcl, when a breach is predicted
+    hours_to_breach: Optional[float] = None
+    breach_at: Optional[datetime] = None
+
+
+class BreachForecastResponse(BaseModel):
+    generated_at: datetime
+    window_hours: int
+    horizon_hours: float
+    sensors: list[BreachForecast]  # soonest predicted breach first
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
 from typing import Optional
 
@@ -8,6 +8,8 @@ class TelemetryCreate(BaseModel):
     sensor_type: str
     value: float
     unit: Optional[str] = None
+    timestamp: Optional[datetime] = None  # device time; server time when omitted
+    message_id: Optional[str] = Field(None, max_length=100, description="Idempotency key; replays are ignored")
 
 
 class TelemetryResponse(BaseModel):
@@ -17,6 +19,59 @@ class TelemetryResponse(BaseModel):
     value: float
     unit: Optional[str] = None
     timestamp: datetime
+    duplicate: bool = False
 
     class Config:
         from_attributes = True
+
+
+class TelemetryBatch(BaseModel):
+    readings: list[TelemetryCreate] = Field(..., max_length=10_000)
+
+
+class TelemetryBatchResponse(BaseModel):
+    accepted: int
+    duplicates: int
+
+
+class AggregateWindow(BaseModel):
+    """Moments of the samples an edge gateway aggregated over [window_start, window_start + window_seconds)."""
+    sensor_id: str
+    sensor_type: str
+    unit: Optional[str] = None
+    window_start: datetime
+    window_seconds: int = Field(..., ge=1, le=86_400)
+    count: int = Field(..., ge=1)
+    mean: float
+    m2: float = Field(0.0, ge=0.0, description="Sum of squared deviations from the mean (Welford M2)")
+    min: float
+    max: float
+    last: Optional[float] = Field(None, description="Last sample in the window")
+
+    @model_validator(mode="after")
+    def _consistent(self) -> "AggregateWindow":
+        slack = 1e-9 * max(1.0, abs(self.min), abs(self.max))
+        if not self.min - slack <= self.mean <= self.max + slack:
+            raise ValueError("window must satisfy min <= mean <= max")
+        return self
+
+
+class AggregateBatch(BaseModel):
+    gateway_id: Optional[str] = Field(None, max_length=100)
+    windows: list[AggregateWindow] = Field(..., max_length=10_000)
+
+
+class HistoryPoint(BaseModel):
+    timestamp: datetime
+    mean: float
+    min: float
+    max: float
+    count: int
+
+
+class HistoryResponse(BaseModel):
+    sensor_id: Optional[str] = None
+    sensor_type: Optional[str] = None
+    resolution: str  # raw | 1m | 1h
+    resolution_seconds: int
+    points: list[HistoryPoint]
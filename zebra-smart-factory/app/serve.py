@@ -0,0 +1,56 @@
+"""
+Multi-worker launcher.
+
+    python -m app.serve --workers 4            # or WEB_CONCURRENCY=4 python -m app.serve
+    python -m app.serve --migrate              # apply schema migrations first (no release step)
+
+Each worker is a separate process with its own caches and SPC state, coordinated through
+the state backend. More than one worker needs a shared backend (STATE_BACKEND=redis or
+sql); the in-memory backend is refused so workers don't silently diverge.
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+from app.core.config import get_settings
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with N worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--migrate", action="store_true", help="Run schema migrations once before starting workers")
+    args = parser.parse_args(argv)
+
+    backend = get_settings().state_backend.lower()
+    if args.workers > 1 and backend == "memory":
+        print(
+            "Refusing to start several workers with STATE_BACKEND=memory: caches, leader "
+            "election and SPC fan-out would be per process. Set STATE_BACKEND=redis or sql.",
+            file=sys.stderr,
+        )
+        return 2
+
+    if args.migrate:
+        from app.core.database import engine
+        from app.migrate import upgrade
+
+        before, after = upgrade(engine)
+        print(f"database migrated from {before or 'empty'} to {after}", file=sys.stderr)
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
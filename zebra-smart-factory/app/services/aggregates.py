@@ -0,0 +1,227 @@
+"""
+Edge-aggregated windows: ingest, and statistics that combine them with raw readings.
+
+An edge gateway (data_simulator.edge) forwards the samples that pass its deadband as ordinary
+readings and summarizes the rest per interval as (count, mean, M2, min, max). Every sample is
+then counted exactly once on the server, as a reading or inside a window. Windows are merged
+with readings and with each other by Chan's pairwise update, never by averaging means, so a
+sensor's count, mean and variance come out as if every sample had been uploaded.
+
+Windows do not feed the per-observation EWMA / I-MR state (a window mean is not an
+individual observation). They are rational subgroups instead: `window_chart` is an X-bar
+chart over windows with the pooled within-window sigma and limits scaled by each window's n.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.sensor import SensorReading
+from app.models.window import SensorWindow
+from app.schemas.telemetry import AggregateWindow
+from app.services.baselines import baseline_cache
+from app.services.latest import _status, record_moments
+from app.services.retention import _utc
+
+KEY = ["sensor_id", "window_start", "window_seconds"]
+
+
+def combine(count: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> tuple[int, float, float]:
+    """Pooled (count, mean, M2) of several groups: M2 adds the between-group spread."""
+    n = int(count.sum())
+    grand = float((count * mean).sum() / n)
+    return n, grand, float(m2.sum() + (count * (mean - grand) ** 2).sum())
+
+
+def ingest_windows(db: Session, windows: list[AggregateWindow], gateway_id: str | None = None) -> tuple[list[SensorWindow], int]:
+    """Store new windows (a resent window is a duplicate) and fold them into `sensor_latest`."""
+    rows, seen = [], set()
+    for w in windows:
+        start = _utc(w.window_start)
+        if (w.sensor_id, start, w.window_seconds) in seen:
+            continue
+        seen.add((w.sensor_id, start, w.window_seconds))
+        rows.append({
+            "sensor_id": w.sensor_id,
+            "sensor_type": w.sensor_type,
+            "unit": w.unit,
+            "gateway_id": gateway_id,
+            "window_start": start,
+            "window_seconds": w.window_seconds,
+            "count": w.count,
+            "mean": w.mean,
+            "m2": w.m2,
+            "minimum": w.min,
+            "maximum": w.max,
+            "last_value": w.last,
+        })
+    inserted = _insert(db, rows) if rows else []
+    for w in inserted:
+        db.expunge(w)
+    db.commit()
+    if inserted:
+        record_moments(db, latest_rows(inserted))
+    return inserted, len(windows) - len(inserted)
+
+
+def _insert(db: Session, rows: list[dict]) -> list[SensorWindow]:
+    insert = dialect_insert(db)
+    if insert is None:
+        inserted = []
+        for row in rows:  # portable fallback: one savepoint per row
+            window = SensorWindow(**row)
+            try:
+                with db.begin_nested():
+                    db.add(window)
+            except IntegrityError:
+                continue
+            inserted.append(window)
+        return inserted
+    stmt = insert(SensorWindow).values(rows).on_conflict_do_nothing(index_elements=KEY).returning(SensorWindow)
+    return list(db.scalars(stmt).all())
+
+
+def _end(w) -> datetime:
+    return _utc(w.window_start) + timedelta(seconds=w.window_seconds)
+
+
+def latest_rows(windows: list[SensorWindow]) -> list[dict[str, Any]]:
+    """One `sensor_latest` row per sensor from its windows (status placeholders for new rows)."""
+    by_sensor: dict[str, list[SensorWindow]] = defaultdict(list)
+    for w in windows:
+        by_sensor[w.sensor_id].append(w)
+    rows = []
+    for sensor_id, ws in by_sensor.items():
+        n, mean, m2 = combine(*(np.array([getattr(w, c) for w in ws], dtype=float) for c in ("count", "mean", "m2")))
+        last = max(ws, key=_end)
+        value = last.last_value if last.last_value is not None else last.mean
+        rows.append({
+            "sensor_id": sensor_id,
+            "sensor_type": last.sensor_type,
+            "unit": last.unit,
+            "last_value": value,
+            "last_timestamp": _end(last),
+            "last_reading_id": None,
+            "count": n,
+            "mean": mean,
+            "m2": m2,
+            "minimum": min(w.minimum for w in ws),
+            "maximum": max(w.maximum for w in ws),
+        } | _status(None, value))
+    return rows
+
+
+def window_totals(db: Session) -> list[dict[str, Any]]:
+    """Per-sensor moments of all stored windows, aggregated in SQL (for rebuilds)."""
+    w = SensorWindow
+    ranked = db.query(
+        w.sensor_id, w.sensor_type, w.unit, w.window_start, w.window_seconds, w.mean, w.last_value,
+        func.row_number().over(partition_by=w.sensor_id, order_by=w.window_start.desc()).label("rn"),
+    ).subquery()
+    last = {r.sensor_id: r for r in db.query(ranked).filter(ranked.c.rn == 1).all()}
+    rows = []
+    for sensor_id, n, total, total_sq, lo, hi in db.query(
+        w.sensor_id, func.sum(w.count), func.sum(w.count * w.mean), func.sum(w.m2 + w.count * w.mean * w.mean),
+        func.min(w.minimum), func.max(w.maximum),
+    ).group_by(w.sensor_id):
+        mean = total / n
+        r = last[sensor_id]
+        value = r.last_value if r.last_value is not None else r.mean
+        rows.append({
+            "sensor_id": sensor_id,
+            "sensor_type": r.sensor_type,
+            "unit": r.unit,
+            "last_value": value,
+            "last_timestamp": _end(r),
+            "last_reading_id": None,
+            "count": int(n),
+            "mean": mean,
+            "m2": max(total_sq - n * mean * mean, 0.0),
+            "minimum": lo,
+            "maximum": hi,
+        } | _status(None, value))
+    return rows
+
+
+def window_chart(
+    db: Session, sensor_id: str, start: datetime | None = None, end: datetime | None = None, limit: int = 2000, k: float = 3.0
+) -> dict[str, Any] | None:
+    """
+    X-bar chart with one subgroup per window: the window's moments merged with the forwarded
+    readings inside it. Limits are the active baseline, else the grand mean and pooled sigma.
+    """
+    q = db.query(SensorWindow).filter(SensorWindow.sensor_id == sensor_id)
+    if start is not None:
+        q = q.filter(SensorWindow.window_start >= _utc(start))
+    if end is not None:
+        q = q.filter(SensorWindow.window_start < _utc(end))
+    windows = q.order_by(SensorWindow.window_start.desc()).limit(limit).all()[::-1]
+    if not windows:
+        return None
+    starts = np.array([_utc(w.window_start).timestamp() for w in windows])
+    ends = starts + np.array([w.window_seconds for w in windows])
+    n = np.array([w.count for w in windows], dtype=float)
+    mean = np.array([w.mean for w in windows])
+    m2 = np.array([w.m2 for w in windows])
+    lo = np.array([w.minimum for w in windows])
+    hi = np.array([w.maximum for w in windows])
+
+    raw = (
+        db.query(SensorReading.timestamp, SensorReading.value)
+        .filter(
+            SensorReading.sensor_id == sensor_id,
+            SensorReading.timestamp >= windows[0].window_start,
+            SensorReading.timestamp < _end(windows[-1]),
+        )
+        .order_by(SensorReading.timestamp)
+        .all()
+    )
+    epochs = np.fromiter((_utc(r[0]).timestamp() for r in raw), dtype=float, count=len(raw))
+    values = np.fromiter((r[1] for r in raw), dtype=float, count=len(raw))
+    first, stop = np.searchsorted(epochs, starts), np.searchsorted(epochs, ends)
+    for i in np.flatnonzero(stop > first):  # forwarded readings are the exceptions: few windows have any
+        v = values[first[i]:stop[i]]
+        nr, mr = len(v), v.mean()
+        total = n[i] + nr
+        delta = mr - mean[i]
+        m2[i] += ((v - mr) ** 2).sum() + delta * delta * n[i] * nr / total
+        mean[i] += delta * nr / total
+        n[i] = total
+        lo[i], hi[i] = min(lo[i], v.min()), max(hi[i], v.max())
+
+    baseline = baseline_cache.get(db, sensor_id)
+    if baseline is not None:
+        center, sigma, source = baseline.limits.center, baseline.limits.sigma, "baseline"
+    else:
+        dof = (n - 1).sum()
+        center = float((n * mean).sum() / n.sum())
+        sigma = float(np.sqrt(m2.sum() / dof)) if dof > 0 else 0.0
+        source = "windows"
+    half = k * sigma / np.sqrt(n)
+    ucl, lcl = center + half, center - half
+    std = np.sqrt(np.divide(m2, n - 1, out=np.zeros_like(m2), where=n > 1))
+    return {
+        "sensor_id": sensor_id,
+        "center": center,
+        "sigma": sigma,
+        "limits_source": source,
+        "points": [
+            {
+                "window_start": _utc(w.window_start),
+                "count": int(n[i]),
+                "mean": float(mean[i]),
+                "std": float(std[i]),
+                "min": float(lo[i]),
+                "max": float(hi[i]),
+                "ucl": float(ucl[i]),
+                "lcl": float(lcl[i]),
+                "out_of_control": bool(mean[i] > ucl[i] or mean[i] < lcl[i]),
+            }
+            for i, w in enumerate(windows)
+        ],
+    }
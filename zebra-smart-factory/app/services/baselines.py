@@ -0,0 +1,155 @@
+"""
+Phase I / Phase II SPC baselines.
+
+Phase I: control limits are computed once per sensor from a designated in-control reference
+period and stored as a new version in `control_baselines`. Phase II: live data is judged
+against the active version, served from an in-process cache, instead of against limits
+derived from the very window being judged. A recompute on any worker invalidates every
+worker's cache through the state backend.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.state import get_state_backend
+from app.models.baseline import ControlBaseline
+from app.models.sensor import SensorReading
+from app.services.spc import ControlLimits
+
+
+class Baseline(NamedTuple):
+    sensor_id: str
+    version: int
+    limits: ControlLimits
+    sample_count: int
+
+
+def compute_baselines(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    sensor_ids: list[str] | None = None,
+    k: float = 3.0,
+    min_samples: int = 20,
+) -> list[ControlBaseline]:
+    """
+    Compute and store a new baseline version for every sensor with at least `min_samples`
+    readings in [start, end). One grouped two-pass aggregate query; limits are derived vectorized.
+    The reference period is assumed to be in control.
+    """
+    in_period = [SensorReading.timestamp >= start, SensorReading.timestamp < end]
+    if sensor_ids:
+        in_period.append(SensorReading.sensor_id.in_(sensor_ids))
+    # Two passes: sigma from deviations about the per-sensor mean, not avg(x^2) - avg(x)^2,
+    # which cancels catastrophically when the mean is large against the spread.
+    means = (
+        db.query(SensorReading.sensor_id.label("sensor_id"), func.avg(SensorReading.value).label("mean"))
+        .filter(*in_period)
+        .group_by(SensorReading.sensor_id)
+        .subquery()
+    )
+    deviation = SensorReading.value - means.c.mean
+    q = (
+        db.query(
+            SensorReading.sensor_id,
+            func.count(SensorReading.value),
+            means.c.mean,
+            func.avg(deviation * deviation),
+        )
+        .join(means, means.c.sensor_id == SensorReading.sensor_id)
+        .filter(*in_period)
+        .group_by(SensorReading.sensor_id, means.c.mean)
+    )
+    rows = [r for r in q.all() if r[1] >= min_samples]
+    if not rows:
+        return []
+
+    ids = [r[0] for r in rows]
+    counts = np.array([r[1] for r in rows], dtype=np.int64)
+    mean = np.array([r[2] for r in rows], dtype=float)
+    sigma = np.sqrt(np.clip(np.array([r[3] for r in rows], dtype=float), 0.0, None))
+
+    versions = dict(
+        db.query(ControlBaseline.sensor_id, func.max(ControlBaseline.version))
+        .filter(ControlBaseline.sensor_id.in_(ids))
+        .group_by(ControlBaseline.sensor_id)
+        .all()
+    )
+    db.query(ControlBaseline).filter(
+        ControlBaseline.sensor_id.in_(ids), ControlBaseline.active.is_(True)
+    ).update({ControlBaseline.active: False}, synchronize_session=False)
+
+    created = [
+        ControlBaseline(
+            sensor_id=sid,
+            version=(versions.get(sid) or 0) + 1,
+            active=True,
+            center=float(mean[i]),
+            sigma=float(sigma[i]),
+            ucl=float(mean[i] + k * sigma[i]),
+            lcl=float(mean[i] - k * sigma[i]),
+            sample_count=int(counts[i]),
+            reference_start=start,
+            reference_end=end,
+        )
+        for i, sid in enumerate(ids)
+    ]
+    db.add_all(created)
+    db.commit()
+    baseline_cache.invalidate()
+    get_state_backend().publish(INVALIDATE_CHANNEL, ",".join(ids))
+    return created
+
+
+INVALIDATE_CHANNEL = "baselines.invalidate"
+
+
+class BaselineCache:
+    """Active baselines by sensor_id, loaded in one query and reloaded after `ttl` seconds."""
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._by_sensor: dict[str, Baseline] | None = None
+        self._loaded_at = 0.0
+        self._subscribed = None
+        self._lock = threading.Lock()
+
+    def invalidate(self, _message: str | None = None) -> None:
+        self._by_sensor = None
+
+    def get(self, db: Session, sensor_id: str) -> Baseline | None:
+        return self.all(db).get(sensor_id)
+
+    def all(self, db: Session) -> dict[str, Baseline]:
+        self._subscribe()
+        if self._by_sensor is None or time.monotonic() - self._loaded_at > self.ttl:
+            rows = db.query(ControlBaseline).filter(ControlBaseline.active.is_(True)).all()
+            self._by_sensor = {
+                r.sensor_id: Baseline(
+                    r.sensor_id,
+                    r.version,
+                    ControlLimits(r.center, r.ucl, r.lcl, r.sigma),
+                    r.sample_count,
+                )
+                for r in rows
+            }
+            self._loaded_at = time.monotonic()
+        return self._by_sensor
+
+    def _subscribe(self) -> None:
+        backend = get_state_backend()
+        if self._subscribed is backend:
+            return
+        with self._lock:
+            if self._subscribed is not backend:
+                backend.subscribe(INVALIDATE_CHANNEL, self.invalidate)
+                self._subscribed = backend
+
+
+baseline_cache = BaselineCache(ttl=get_settings().baseline_cache_ttl)
@@ -1,19 +1,32 @@
 """Plotly chart generation for SPC, heatmaps, Pareto."""
-from typing import Any
+from typing import TYPE_CHECKING, Any
 import plotly.graph_objects as go
-import pandas as pd
-from app.services.spc import ControlLimits, simple_limits, cusum, xbar_r_limits
+import numpy as np
+from app.core.metrics import span, timed
+from app.services.spc import ControlLimits, EWMAResult, IMRResult, simple_limits, cusum, xbar_r_limits
 
+if TYPE_CHECKING:
+    import pandas as pd
 
+
+def warm_up() -> None:
+    """Import pandas and build a throwaway figure, so the first chart request doesn't pay for it."""
+    import pandas  # noqa: F401
+
+    go.Figure(go.Scattergl(x=[0], y=[0])).to_json()
+
+
+@timed("charts.xbar")
 def spc_xbar_chart(
     values: list[float],
     labels: list[str] | None = None,
     subgroup_size: int = 5,
+    limits: ControlLimits | None = None,
 ) -> dict[str, Any]:
-    """Generate X-bar control chart as Plotly JSON."""
+    """Generate X-bar control chart as Plotly JSON. `limits` overrides window-derived limits."""
     if labels is None:
         labels = [str(i) for i in range(len(values))]
-    xbar_lim, _ = xbar_r_limits(values, subgroup_size)
+    xbar_lim = limits if limits is not None else xbar_r_limits(values, subgroup_size)[0]
 
     fig = go.Figure()
     fig.add_trace(
@@ -34,14 +47,21 @@ def spc_xbar_chart(
         yaxis_title="Value",
         template="plotly_white",
     )
-    return fig.to_json()
+    with span("charts.serialize"):
+        return fig.to_json()
 
 
-def spc_cusum_chart(values: list[float], labels: list[str] | None = None) -> dict[str, Any]:
+@timed("charts.cusum")
+def spc_cusum_chart(
+    values: list[float],
+    labels: list[str] | None = None,
+    target: float | None = None,
+    sigma: float | None = None,
+) -> dict[str, Any]:
     """Generate CUSUM chart as Plotly JSON."""
     if labels is None:
         labels = [str(i) for i in range(len(values))]
-    cusum_vals = cusum(values)
+    cusum_vals = cusum(values, target=target, sigma=sigma)
 
     fig = go.Figure()
     fig.add_trace(
@@ -60,12 +80,15 @@ def spc_cusum_chart(values: list[float], labels: list[str] | None = None) -> dic
         yaxis_title="CUSUM",
         template="plotly_white",
     )
-    return fig.to_json()
+    with span("charts.serialize"):
+        return fig.to_json()
 
 
-def heatmap_chart(df: pd.DataFrame, x: str, y: str, z: str) -> dict[str, Any]:
+@timed("charts.heatmap")
+def heatmap_chart(df: "pd.DataFrame", x: str, y: str, z: str) -> dict[str, Any]:
     """Generate heatmap from DataFrame."""
-    pivot = df.pivot_table(index=y, columns=x, values=z, aggfunc="mean")
+    with span("charts.heatmap.pivot"):
+        pivot = df.pivot_table(index=y, columns=x, values=z, aggfunc="mean")
     fig = go.Figure(data=go.Heatmap(z=pivot.values, x=pivot.columns, y=pivot.index, colorscale="Viridis"))
     fig.update_layout(
         title=f"Heatmap: {z} by {x} x {y}",
@@ -73,9 +96,11 @@ def heatmap_chart(df: pd.DataFrame, x: str, y: str, z: str) -> dict[str, Any]:
         yaxis_title=y,
         template="plotly_white",
     )
-    return fig.to_json()
+    with span("charts.serialize"):
+        return fig.to_json()
 
 
+@timed("charts.pareto")
 def pareto_chart(labels: list[str], values: list[float], title: str = "Pareto Chart") -> dict[str, Any]:
     """Generate Pareto chart (sorted bar + cumulative %)."""
     pairs = sorted(zip(labels, values), key=lambda x: -x[1])
@@ -106,4 +131,81 @@ def pareto_chart(labels: list[str], values: list[float], title: str = "Pareto Ch
         template="plotly_white",
         showlegend=True,
     )
-    return fig.to_json()
+    with span("charts.serialize"):
+        return fig.to_json()
+
+
+@timed("charts.ewma")
+def ewma_chart(x: list, values: list[float], result: EWMAResult, lam: float) -> dict[str, Any]:
+    """EWMA chart with time-varying limits as Plotly JSON."""
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=x, y=values, mode="markers", name="Values", marker=dict(color="#94a3b8", size=4)))
+    fig.add_trace(go.Scattergl(x=x, y=result.z, mode="lines", name="EWMA", line=dict(color="#2563eb")))
+    fig.add_trace(go.Scattergl(x=x, y=result.ucl, mode="lines", name="UCL", line=dict(color="red", dash="dot")))
+    fig.add_trace(go.Scattergl(x=x, y=result.lcl, mode="lines", name="LCL", line=dict(color="red", dash="dot")))
+    fig.add_hline(y=result.center, line_dash="dash", line_color="green", annotation_text="CL")
+    fig.update_layout(
+        title=f"EWMA Chart (λ={lam:g})",
+        xaxis_title="Time",
+        yaxis_title="Value",
+        template="plotly_white",
+    )
+    with span("charts.serialize"):
+        return fig.to_json()
+
+
+@timed("charts.imr")
+def imr_chart(x: list, values: list[float], result: IMRResult) -> dict[str, Any]:
+    """Individuals and moving-range charts (stacked) as Plotly JSON."""
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, subplot_titles=("Individuals", "Moving Range"))
+    fig.add_trace(
+        go.Scattergl(x=x, y=values, mode="lines+markers", name="Value", line=dict(color="#2563eb")),
+        row=1, col=1,
+    )
+    fig.add_trace(
+        go.Scattergl(x=x[1:], y=result.mr, mode="lines+markers", name="MR", line=dict(color="#7c3aed")),
+        row=2, col=1,
+    )
+    i_lim, mr_lim = result.individuals, result.moving_range
+    for y, dash, color, text in [
+        (i_lim.center, "dash", "green", "CL"), (i_lim.ucl, "dot", "red", "UCL"), (i_lim.lcl, "dot", "red", "LCL"),
+    ]:
+        fig.add_hline(y=y, line_dash=dash, line_color=color, annotation_text=text, row=1, col=1)
+    for y, dash, color, text in [(mr_lim.center, "dash", "green", "MR̄"), (mr_lim.ucl, "dot", "red", "UCL")]:
+        fig.add_hline(y=y, line_dash=dash, line_color=color, annotation_text=text, row=2, col=1)
+    fig.update_layout(title="I-MR Chart", template="plotly_white", showlegend=False)
+    with span("charts.serialize"):
+        return fig.to_json()
+
+
+@timed("charts.rolling")
+def rolling_chart(x: list, values: list[float], stats: dict, title: str = "Rolling Statistics") -> dict[str, Any]:
+    """Values with rolling mean and p5-p95 band as Plotly JSON."""
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=x, y=stats["p95"], mode="lines", name="p95", line=dict(width=0), showlegend=False))
+    fig.add_trace(
+        go.Scattergl(
+            x=x, y=stats["p5"], mode="lines", name="p5-p95", line=dict(width=0),
+            fill="tonexty", fillcolor="rgba(37, 99, 235, 0.15)",
+        )
+    )
+    fig.add_trace(go.Scattergl(x=x, y=values, mode="markers", name="Values", marker=dict(color="#94a3b8", size=4)))
+    fig.add_trace(go.Scattergl(x=x, y=stats["mean"], mode="lines", name="Rolling mean", line=dict(color="#2563eb")))
+    fig.update_layout(title=title, xaxis_title="Time", yaxis_title="Value", template="plotly_white")
+    with span("charts.serialize"):
+        return fig.to_json()
+
+
+@timed("charts.correlation_heatmap")
+def correlation_heatmap_chart(sensors: list[str], matrix: np.ndarray, title: str = "Sensor Correlation") -> dict[str, Any]:
+    """Correlation matrix heatmap; values rounded to 3 decimals to keep p x p JSON small."""
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=np.round(matrix, 3), x=sensors, y=sensors, zmin=-1, zmax=1, colorscale="RdBu", reversescale=True,
+        )
+    )
+    fig.update_layout(title=title, template="plotly_white", yaxis=dict(autorange="reversed"))
+    with span("charts.serialize"):
+        return fig.to_json()
@@ -0,0 +1,71 @@
+"""
+Streaming export of raw readings as NDJSON or CSV.
+
+Rows are read a page at a time (keyset on id, so every page is an index range scan) and each
+page is yielded as one chunk; the compression middleware compresses and flushes chunk by
+chunk, so neither the rows nor the encoded body are ever held in memory whole. The session
+is opened here rather than taken from the request: it must outlive the route handler.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.sensor import SensorReading
+from app.services.retention import _utc
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+COLUMNS = ("sensor_id", "sensor_type", "value", "unit", "timestamp")
+
+
+def _page(db: Session, after_id: int, limit: int, start, end, sensor_id, sensor_type) -> list[tuple]:
+    q = db.query(SensorReading.id, *(getattr(SensorReading, c) for c in COLUMNS)).filter(
+        SensorReading.id > after_id, SensorReading.timestamp >= start, SensorReading.timestamp < end
+    )
+    if sensor_id:
+        q = q.filter(SensorReading.sensor_id == sensor_id)
+    if sensor_type:
+        q = q.filter(SensorReading.sensor_type == sensor_type)
+    return q.order_by(SensorReading.id).limit(limit).all()
+
+
+def encode_page(rows: list[tuple], fmt: str, header: bool = False) -> bytes:
+    """Rows of (id, *COLUMNS) as NDJSON lines or CSV records."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        if header:
+            writer.writerow(COLUMNS)
+        writer.writerows((sid, stype, value, unit or "", _utc(ts).isoformat()) for _, sid, stype, value, unit, ts in rows)
+        return buf.getvalue().encode()
+    return "".join(
+        json.dumps({"sensor_id": sid, "sensor_type": stype, "value": value, "unit": unit, "timestamp": _utc(ts).isoformat()}) + "\n"
+        for _, sid, stype, value, unit, ts in rows
+    ).encode()
+
+
+async def export_readings(
+    session_factory: sessionmaker,
+    start: datetime,
+    end: datetime | None = None,
+    *,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    fmt: str = "ndjson",
+    page_size: int = 5000,
+) -> AsyncIterator[bytes]:
+    """Readings in [start, end) in insertion order, one encoded chunk per page."""
+    start, end = _utc(start), _utc(end or datetime.now(timezone.utc))
+    after_id, first = 0, True
+    with session_factory() as db:
+        while True:
+            rows = _page(db, after_id, page_size, start, end, sensor_id, sensor_type)
+            db.rollback()  # end the read transaction between pages: no snapshot held open while the client drains
+            if rows or first:
+                yield encode_page(rows, fmt, header=first)
+            if len(rows) < page_size:
+                return
+            after_id, first = rows[-1][0], False
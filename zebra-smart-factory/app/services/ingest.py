@@ -0,0 +1,114 @@
+"""
+Idempotent reading ingest, then post-commit fan-out: live SPC state, latest-state table, sketches.
+
+A reading carrying a `message_id` (or, failing that, a device timestamp) gets a `dedup_key`
+with a unique index. Batches go in as one INSERT .. ON CONFLICT DO NOTHING RETURNING, so a
+replayed reading is dropped by the database without a per-row lookup, and only the rows
+actually inserted reach the consumers. Keys seen recently by this worker are skipped before
+the insert. Readings beyond the allowed event-time lateness are handled by
+app.services.lateness.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import dialect_insert
+from app.core.state import RecentIds
+from app.models.sensor import SensorReading
+from app.schemas.telemetry import TelemetryCreate
+from app.services.lateness import lateness_tracker, route_too_late
+from app.services.latest import record_latest
+from app.services.ring_buffer import ring_store
+from app.services.sketch_store import sketch_recorder
+from app.services.spc_state import spc_state
+from app.services.summary_service import summary_service
+
+recent_keys = RecentIds(get_settings().ingest_dedup_cache)
+
+
+def dedup_key(payload: TelemetryCreate) -> str | None:
+    if payload.message_id:
+        return f"m:{payload.sensor_id}:{payload.message_id}"
+    if payload.timestamp is not None:
+        ts = payload.timestamp if payload.timestamp.tzinfo else payload.timestamp.replace(tzinfo=timezone.utc)
+        return f"t:{payload.sensor_id}:{ts.astimezone(timezone.utc).isoformat()}"
+    return None
+
+
+def ingest_readings(db: Session, payloads: list[TelemetryCreate]) -> tuple[list[SensorReading], int]:
+    """Insert new readings and fan them out; returns (inserted readings, duplicates dropped)."""
+    now = datetime.now(timezone.utc)
+    rows, batch_keys = [], set()
+    for p in payloads:
+        key = dedup_key(p)
+        if key is not None and (key in batch_keys or key in recent_keys):
+            continue
+        if key is not None:
+            batch_keys.add(key)
+        rows.append({
+            "sensor_id": p.sensor_id,
+            "sensor_type": p.sensor_type,
+            "value": p.value,
+            "unit": p.unit,
+            "timestamp": p.timestamp or now,
+            "dedup_key": key,
+        })
+    readings = _insert(db, rows) if rows else []
+    for r in readings:
+        db.expunge(r)  # keep the returned attributes loaded: no refresh query per row after commit
+    db.commit()
+    for key in batch_keys:
+        recent_keys.add(key)  # inserted now, or already stored: either way a replay
+    readings.sort(key=lambda r: (r.timestamp, r.id))
+    if readings:
+        after_ingest(db, readings)
+    return readings, len(payloads) - len(readings)
+
+
+def _insert(db: Session, rows: list[dict]) -> list[SensorReading]:
+    insert = dialect_insert(db)
+    if insert is None:
+        return _insert_rows(db, rows)
+    stmt = (
+        insert(SensorReading)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["dedup_key"])
+        .returning(SensorReading)
+    )
+    return list(db.scalars(stmt).all())
+
+
+def _insert_rows(db: Session, rows: list[dict]) -> list[SensorReading]:
+    """Portable fallback for dialects without ON CONFLICT: one savepoint per row."""
+    inserted = []
+    for row in rows:
+        reading = SensorReading(**row)
+        try:
+            with db.begin_nested():
+                db.add(reading)
+        except IntegrityError:
+            continue
+        inserted.append(reading)
+    return inserted
+
+
+def after_ingest(db: Session, readings: list[SensorReading]) -> None:
+    """Feed committed readings to in-process consumers, then to the other workers."""
+    states, on_time, too_late = {}, [], []
+    for r in readings:
+        if lateness_tracker.too_late(r.sensor_id, r.timestamp):
+            too_late.append(r)
+            continue
+        on_time.append(r)
+        states[r.sensor_id] = spc_state.observe(db, r.sensor_id, r.value, r.timestamp, reading_id=r.id)
+        summary_service.observe(r.sensor_id, r.value)
+    ring_store.append(readings)
+    spc_state.publish(readings)
+    if too_late:
+        spc_state.invalidate({r.sensor_id for r in too_late})
+        on_time += route_too_late(db, too_late)
+    record_latest(db, readings, states)
+    sketch_recorder.add(on_time)
+    sketch_recorder.maybe_flush(db)
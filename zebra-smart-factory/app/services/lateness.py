@@ -0,0 +1,106 @@
+"""
+Event-time lateness on ingest.
+
+Each worker tracks the newest device timestamp per sensor; a reading more than
+`LATE_ALLOWED_SECONDS` behind it is too late for the incremental consumers:
+
+- live SPC state corrects readings inside the window in place (spc_state replays in event
+  time order); sensors that got a too-late reading are reseeded from the DB instead;
+- sketch merges are order-independent, so a too-late reading whose bucket is still open is
+  merged as usual; a closed bucket is queued in `backfill_requests` and only that bucket is
+  rebuilt from raw rows, by the retention job;
+- rollups: the retention job already folds rows that land behind its watermark.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import dialect_insert
+from app.models.rollup import BackfillRequest
+from app.models.sensor import SensorReading
+from app.services.sketch_store import bucket_start, build_sketches, sketch_recorder
+
+
+def _epoch(ts: datetime) -> float:
+    return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class LatenessTracker:
+    """Newest event time per sensor (bounded LRU) and the allowed lateness behind it."""
+
+    def __init__(self, allowed: float, max_sensors: int = 10_000):
+        self.allowed = allowed
+        self.max_sensors = max_sensors
+        self._newest: OrderedDict[str, float] = OrderedDict()
+
+    def too_late(self, sensor_id: str, ts: datetime) -> bool:
+        t = _epoch(ts)
+        newest = self._newest.get(sensor_id)
+        if newest is None or t >= newest:
+            self._newest[sensor_id] = t
+            self._newest.move_to_end(sensor_id)
+            while len(self._newest) > self.max_sensors:
+                self._newest.popitem(last=False)
+            return False
+        return t < newest - self.allowed
+
+    def clear(self) -> None:
+        self._newest.clear()
+
+
+def _closed_before(now: datetime) -> datetime:
+    """Buckets ending before this get no more on-time values from any worker's recorder."""
+    s = get_settings()
+    return now - timedelta(seconds=s.sketch_bucket_seconds + s.late_allowed_seconds + s.sketch_flush_interval)
+
+
+def _raw_retained_since(now: datetime) -> datetime | None:
+    days = get_settings().retention_raw_days
+    return now - timedelta(days=days) if days > 0 else None
+
+
+def route_too_late(db: Session, readings: list[SensorReading], now: datetime | None = None) -> list[SensorReading]:
+    """Queue the closed sketch buckets of too-late readings; returns those to merge as usual."""
+    now = now or datetime.now(timezone.utc)
+    closed, retained = _closed_before(now), _raw_retained_since(now)
+    merge, queue = [], set()
+    for r in readings:
+        b = bucket_start(r.timestamp)
+        if b < closed and (retained is None or b >= retained):
+            queue.add((r.sensor_id, b))
+        else:
+            merge.append(r)  # open bucket, or raw already expired: nothing to rebuild from
+    if queue:
+        rows = [{"sensor_id": sid, "bucket_start": b} for sid, b in sorted(queue)]
+        insert = dialect_insert(db)
+        if insert is not None:
+            db.execute(insert(BackfillRequest).values(rows).on_conflict_do_nothing(index_elements=["sensor_id", "bucket_start"]))
+        else:
+            for row in rows:
+                if db.query(BackfillRequest.id).filter_by(**row).first() is None:
+                    db.add(BackfillRequest(**row))
+        db.commit()
+    return merge
+
+
+def process_backfill(db: Session, now: datetime | None = None, limit: int = 500) -> int:
+    """Rebuild queued sketch buckets from raw rows; returns the number of buckets processed."""
+    now = now or datetime.now(timezone.utc)
+    requests = db.query(BackfillRequest).order_by(BackfillRequest.id).limit(limit).all()
+    if not requests:
+        return 0
+    sketch_recorder.flush(db)  # values buffered here would otherwise be counted twice
+    size = timedelta(seconds=get_settings().sketch_bucket_seconds)
+    retained = _raw_retained_since(now)
+    for req in requests:
+        start = req.bucket_start if req.bucket_start.tzinfo else req.bucket_start.replace(tzinfo=timezone.utc)
+        db.delete(req)
+        if retained is None or start >= retained:
+            build_sketches(db, start, start + size, sensor_ids=[req.sensor_id])  # commits the delete too
+    db.commit()
+    return len(requests)
+
+
+lateness_tracker = LatenessTracker(get_settings().late_allowed_seconds)
@@ -0,0 +1,222 @@
+"""
+Materialized per-sensor latest state (`sensor_latest`), upserted on ingest.
+
+Each ingest batch is reduced to one row per sensor (count, mean, M2, min, max, last reading,
+control status) and merged into the table with a single INSERT .. ON CONFLICT DO UPDATE.
+Running stats combine with Chan's parallel Welford update inside the statement, so
+concurrent workers never lose an update; the last value only moves forward in time.
+Status comes from the live SPC state: the sensor's baseline limits when it has one,
+otherwise its provisional window limits.
+"""
+from collections import defaultdict
+from typing import Any
+
+import numpy as np
+from sqlalchemy import Float, case, cast, delete, func, insert, text
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.latest import SensorLatest
+from app.models.sensor import SensorReading
+from app.services.baselines import baseline_cache
+from app.services.spc_state import StreamingSPC
+
+_LAST = ("sensor_type", "unit", "last_value", "last_timestamp", "last_reading_id")
+_STATUS = ("status", "center", "ucl", "lcl", "limits_source")
+
+IN_CONTROL = "in_control"
+OUT_OF_CONTROL = "out_of_control"
+WARMING_UP = "warming_up"
+
+
+def _status(state: StreamingSPC | None, value: float, k: float = 3.0) -> dict[str, Any]:
+    if state is None:
+        return {"status": WARMING_UP, "center": None, "ucl": None, "lcl": None, "limits_source": None}
+    center, sigma = state.ewma.center, state.ewma.sigma
+    ucl, lcl = center + k * sigma, center - k * sigma
+    if state.warming_up:
+        status = WARMING_UP
+    elif not (lcl <= value <= ucl) or state.ewma.out_of_control:
+        status = OUT_OF_CONTROL
+    else:
+        status = IN_CONTROL
+    return {
+        "status": status,
+        "center": center,
+        "ucl": ucl,
+        "lcl": lcl,
+        "limits_source": "baseline" if state.baseline_version is not None else "window",
+    }
+
+
+def record_latest(db: Session, readings: list[SensorReading], states: dict[str, StreamingSPC]) -> None:
+    """Ingest hook: fold committed readings into `sensor_latest` (one statement per batch)."""
+    by_sensor: dict[str, list[SensorReading]] = defaultdict(list)
+    for r in readings:
+        by_sensor[r.sensor_id].append(r)
+    rows = []
+    for sensor_id, rs in by_sensor.items():
+        values = np.fromiter((r.value for r in rs), dtype=float, count=len(rs))
+        last = max(rs, key=lambda r: (r.timestamp, r.id))
+        mean = float(values.mean())
+        rows.append({
+            "sensor_id": sensor_id,
+            "sensor_type": last.sensor_type,
+            "unit": last.unit,
+            "last_value": last.value,
+            "last_timestamp": last.timestamp,
+            "last_reading_id": last.id,
+            "count": len(rs),
+            "mean": mean,
+            "m2": float(((values - mean) ** 2).sum()),
+            "minimum": float(values.min()),
+            "maximum": float(values.max()),
+        } | _status(states.get(sensor_id), last.value))
+    if rows:
+        _upsert(db, rows)
+        db.commit()
+
+
+def record_moments(db: Session, rows: list[dict[str, Any]]) -> None:
+    """Fold pre-aggregated moments (edge windows) in; the control status is left to the live state."""
+    if rows:
+        _upsert(db, rows, replace=_LAST)
+        db.commit()
+
+
+def _upsert(db: Session, rows: list[dict[str, Any]], replace: tuple[str, ...] = _LAST + _STATUS) -> None:
+    insert = dialect_insert(db)
+    if insert is None:
+        _merge_rows(db, rows, replace)
+        return
+    stmt = insert(SensorLatest.__table__).values(rows)
+    t, ex = SensorLatest.__table__.c, stmt.excluded
+    n = t.count + ex.count
+    delta = ex.mean - t.mean
+    weight = cast(ex.count, Float) / n
+    newer = ex.last_timestamp >= t.last_timestamp
+
+    def if_newer(col):
+        return case((newer, ex[col]), else_=t[col])
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sensor_id"],
+        set_={
+            "count": n,
+            "mean": t.mean + delta * weight,
+            "m2": t.m2 + ex.m2 + delta * delta * cast(t.count, Float) * weight,
+            "minimum": case((ex.minimum < t.minimum, ex.minimum), else_=t.minimum),
+            "maximum": case((ex.maximum > t.maximum, ex.maximum), else_=t.maximum),
+            **{col: if_newer(col) for col in replace},
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+
+
+def _merge_rows(db: Session, rows: list[dict[str, Any]], replace: tuple[str, ...]) -> None:
+    """Portable read-modify-write fallback for dialects without ON CONFLICT."""
+    existing = {
+        r.sensor_id: r
+        for r in db.query(SensorLatest).filter(SensorLatest.sensor_id.in_([r["sensor_id"] for r in rows])).with_for_update()
+    }
+    for row in rows:
+        cur = existing.get(row["sensor_id"])
+        if cur is None:
+            db.add(SensorLatest(**row))
+            continue
+        n = cur.count + row["count"]
+        delta = row["mean"] - cur.mean
+        cur.m2 = cur.m2 + row["m2"] + delta * delta * cur.count * row["count"] / n
+        cur.mean = cur.mean + delta * row["count"] / n
+        cur.count = n
+        cur.minimum = min(cur.minimum, row["minimum"])
+        cur.maximum = max(cur.maximum, row["maximum"])
+        if row["last_timestamp"] >= cur.last_timestamp:
+            for key in replace:
+                setattr(cur, key, row[key])
+
+
+def rebuild_latest(db: Session) -> int:
+    """
+    Recompute every row from `sensor_readings` and edge windows (backfill). Returns the number of sensors.
+
+    The delete, the recompute and the insert are one transaction that locks the table first
+    (EXCLUSIVE on Postgres: reads go on, ingest upserts wait; SQLite's write lock, taken by the
+    delete), so an upsert can neither land between the delete and the insert nor be wiped by
+    them. A batch committed to `sensor_readings` but not yet upserted when the rebuild scans
+    is counted by both. M2 is summed from deviations about the mean in a second pass
+    (avg(x²) - mean² cancels catastrophically for large, tight values).
+    """
+    from app.services.aggregates import window_totals
+
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("LOCK TABLE sensor_latest IN EXCLUSIVE MODE"))
+        db.execute(delete(SensorLatest))
+        means = (
+            db.query(SensorReading.sensor_id.label("sensor_id"), func.avg(SensorReading.value).label("mean"))
+            .group_by(SensorReading.sensor_id)
+            .subquery()
+        )
+        deviation = SensorReading.value - means.c.mean
+        stats = (
+            db.query(
+                SensorReading.sensor_id,
+                func.count(SensorReading.value),
+                means.c.mean,
+                func.sum(deviation * deviation),
+                func.min(SensorReading.value),
+                func.max(SensorReading.value),
+            )
+            .join(means, means.c.sensor_id == SensorReading.sensor_id)
+            .group_by(SensorReading.sensor_id, means.c.mean)
+            .all()
+        )
+        ranked = (
+            db.query(
+                SensorReading,
+                func.row_number()
+                .over(partition_by=SensorReading.sensor_id, order_by=(SensorReading.timestamp.desc(), SensorReading.id.desc()))
+                .label("rn"),
+            ).subquery()
+        )
+        last = {r.sensor_id: r for r in db.query(ranked).filter(ranked.c.rn == 1).all()}
+        baselines = baseline_cache.all(db)
+
+        rows = []
+        for sensor_id, n, mean, m2, lo, hi in stats:
+            r = last[sensor_id]
+            m2 = max(float(m2 or 0.0), 0.0)
+            sigma = float(np.sqrt(m2 / n))
+            baseline = baselines.get(sensor_id)
+            center, sd = (baseline.limits.center, baseline.limits.sigma) if baseline else (mean, sigma)
+            ucl, lcl = center + 3 * sd, center - 3 * sd
+            rows.append(dict(
+                sensor_id=sensor_id,
+                sensor_type=r.sensor_type,
+                unit=r.unit,
+                last_value=r.value,
+                last_timestamp=r.timestamp,
+                last_reading_id=r.id,
+                count=n,
+                mean=mean,
+                m2=m2,
+                minimum=lo,
+                maximum=hi,
+                status=IN_CONTROL if lcl <= r.value <= ucl else OUT_OF_CONTROL,
+                center=center,
+                ucl=ucl,
+                lcl=lcl,
+                limits_source="baseline" if baseline else "window",
+            ))
+        if rows:
+            db.execute(insert(SensorLatest), rows)
+        windows = window_totals(db)
+        if windows:
+            _upsert(db, windows, replace=_LAST)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return db.query(func.count(SensorLatest.sensor_id)).scalar()
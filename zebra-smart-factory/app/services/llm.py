@@ -0,0 +1,78 @@
+"""LLM clients for the maintenance agent: OpenAI and an offline stub."""
+import asyncio
+import re
+
+from app.core.config import Settings, get_settings
+
+
+class LLMClient:
+    """Minimal chat-completion interface used by the maintenance agent."""
+    name = "base"
+
+    async def complete(self, system: str, user: str) -> str:
+        raise NotImplementedError
+
+
+class OpenAIClient(LLMClient):
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", temperature: float = 0.3):
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+
+    async def complete(self, system: str, user: str) -> str:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(api_key=self.api_key)
+        response = await client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            temperature=self.temperature,
+        )
+        return response.choices[0].message.content or "No summary generated."
+
+
+class StubLLMClient(LLMClient):
+    """
+    Deterministic offline stand-in: summarises the numbers found in the prompt.
+    `delay` simulates completion latency; `calls` counts completions (for tests).
+    """
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, system: str, user: str) -> str:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        total = re.search(r"(\d+) total", user)
+        anomalies = re.search(r"Anomalies detected: (\d+)", user)
+        n_anom = int(anomalies.group(1)) if anomalies else 0
+        text = f"[stub] Reviewed {total.group(1) if total else 0} recent readings. "
+        if n_anom:
+            text += f"{n_anom} readings fall outside their control limits; inspect the flagged sensors."
+        else:
+            text += "All sensors are within control limits."
+        return text
+
+
+def get_llm_client(settings: Settings | None = None) -> LLMClient | None:
+    """
+    Resolve the configured backend (LLM_BACKEND): openai, stub, none, or auto
+    (OpenAI when an API key is set, otherwise none -> structured fallback summary).
+    """
+    settings = settings or get_settings()
+    backend = settings.llm_backend.lower()
+    if backend == "stub":
+        return StubLLMClient()
+    if backend == "none":
+        return None
+    if settings.openai_api_key and backend in ("auto", "openai"):
+        return OpenAIClient(settings.openai_api_key, settings.llm_model)
+    return None
@@ -1,123 +1,200 @@
 """LangChain/OpenAI maintenance summary agent."""
+import hashlib
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from typing import Any
+
+import numpy as np
 from sqlalchemy.orm import Session
+
 from app.models.sensor import SensorReading
-from app.services.spc import simple_limits, detect_anomalies_zscore
-from app.core.config import get_settings
+from app.services.llm import LLMClient, get_llm_client
+from app.services.spc import detect_anomalies_zscore_grouped, group_stats
+
+
+@dataclass
+class MaintenanceContext:
+    """Everything derived from one summary query; shared by the LLM and fallback paths."""
+    total: int = 0
+    sensors: list[dict[str, Any]] = field(default_factory=list)
+    anomalies: list[dict[str, Any]] = field(default_factory=list)
+    forecasts: list[dict[str, Any]] = field(default_factory=list)  # predicted limit breaches, soonest first
+
+    @property
+    def sensor_types(self) -> list[str]:
+        return list(dict.fromkeys(s["sensor_type"] for s in self.sensors))
+
+    def prompt(self) -> str:
+        text = (
+            f"Sensor readings summary: {self.total} total. "
+            f"By sensor: " + ", ".join(f"{s['key']}: n={s['n']}, mean={s['mean']:.2f}" for s in self.sensors) + ". "
+        )
+        if self.anomalies:
+            text += f" Anomalies detected: {len(self.anomalies)}. Details: " + str(self.anomalies[:5])
+        if self.forecasts:
+            text += " Predicted limit breaches (from drift trends): " + "; ".join(
+                f"{f['sensor_id']} {f['limit'].upper()} in ~{f['hours_to_breach']:.0f} h ({f['slope_per_hour']:+.3g}/h)"
+                for f in self.forecasts[:5]
+            )
+        return text
+
+    def fingerprint(self) -> str:
+        """Stable hash of which sensors are present, how many anomalies each has and which are heading for a limit."""
+        per_sensor = Counter(a["sensor"] for a in self.anomalies)
+        at_risk = sorted(f"{f['sensor_id']}:{f['limit']}" for f in self.forecasts)
+        basis = json.dumps([sorted(s["key"] for s in self.sensors), sorted(per_sensor.items()), at_risk])
+        return hashlib.sha256(basis.encode()).hexdigest()[:16]
+
+
+def load_context(
+    db: Session,
+    sensor_id: str | None = None,
+    limit: int = 100,
+    window_minutes: int | None = None,
+) -> MaintenanceContext:
+    """
+    Fetch the most recent `limit` readings (optionally for one sensor, within a time window)
+    in a single column-projected query and compute per-sensor z-score anomalies in one pass.
+    """
+    q = db.query(SensorReading.sensor_id, SensorReading.sensor_type, SensorReading.value)
+    if sensor_id:
+        q = q.filter(SensorReading.sensor_id == sensor_id)
+    if window_minutes:
+        since = datetime.now(timezone.utc) - timedelta(minutes=window_minutes)
+        q = q.filter(SensorReading.timestamp >= since)
+    rows = q.order_by(SensorReading.timestamp.desc()).limit(limit).all()
+    if not rows:
+        return MaintenanceContext()
+
+    ids = np.array([r[0] for r in rows], dtype=object)
+    values = np.fromiter((r[2] for r in rows), dtype=float, count=len(rows))
+    names, first, codes = np.unique(ids, return_index=True, return_inverse=True)
+    stats = group_stats(values, codes, len(names))
+    flagged = detect_anomalies_zscore_grouped(values, codes, stats=stats)
+
+    # Keep first-seen (most recent) sensor order, as the dict grouping used to.
+    order = np.argsort(first, kind="stable")
+    ucl = stats.mean + 3 * stats.sigma
+    lcl = stats.mean - 3 * stats.sigma
+    keys = [f"{names[g]} ({rows[first[g]][1]})" for g in range(len(names))]
+    sensors = [
+        {
+            "key": keys[g],
+            "sensor_id": names[g],
+            "sensor_type": rows[first[g]][1],
+            "n": int(stats.count[g]),
+            "mean": float(stats.mean[g]),
+            "ucl": float(ucl[g]),
+            "lcl": float(lcl[g]),
+        }
+        for g in order
+    ]
+    anomalies = [
+        {
+            "sensor": keys[codes[i]],
+            "value": float(values[i]),
+            "ucl": float(ucl[codes[i]]),
+            "lcl": float(lcl[codes[i]]),
+        }
+        for i in flagged
+    ]
+    return MaintenanceContext(total=len(rows), sensors=sensors, anomalies=anomalies)
+
+
+def build_context(
+    db: Session,
+    sensor_id: str | None = None,
+    limit: int = 100,
+    window_minutes: int | None = None,
+) -> MaintenanceContext:
+    """`load_context` plus the sensors whose drift trend predicts a limit breach."""
+    from app.services.trends import forecast_breaches
+
+    ctx = load_context(db, sensor_id, limit, window_minutes)
+    if ctx.total:
+        ctx.forecasts = [f for f in forecast_breaches(db, sensor_id=sensor_id) if f["hours_to_breach"] is not None]
+    return ctx
+
+
+SYSTEM_PROMPT = "You are a maintenance engineer for a smart factory. Be concise and actionable."
 
 
 async def get_maintenance_summary(
     db: Session,
     sensor_id: str | None = None,
     limit: int = 100,
+    window_minutes: int | None = None,
 ) -> dict[str, Any]:
     """
     Generate AI maintenance summary from recent sensor data and anomalies.
-    Falls back to a structured summary if OpenAI key is missing.
+    Falls back to a structured summary if no LLM backend is configured.
     """
-    settings = get_settings()
-    if not settings.openai_api_key:
-        return _fallback_summary(db, sensor_id, limit)
+    ctx = build_context(db, sensor_id, limit, window_minutes)
+    return await summarize(ctx, get_llm_client())
 
-    q = db.query(SensorReading).order_by(SensorReading.timestamp.desc()).limit(limit)
-    if sensor_id:
-        q = q.filter(SensorReading.sensor_id == sensor_id)
-    readings = q.all()
-
-    if not readings:
-        return {"summary": "No sensor data available.", "anomalies": [], "recommendations": []}
-
-    # Build context for LLM
-    by_type: dict[str, list[float]] = {}
-    for r in readings:
-        key = f"{r.sensor_id} ({r.sensor_type})"
-        if key not in by_type:
-            by_type[key] = []
-        by_type[key].append(r.value)
-
-    anomalies_found: list[dict[str, Any]] = []
-    for key, values in by_type.items():
-        if len(values) < 3:
-            continue
-        limits = simple_limits(values)
-        indices = detect_anomalies_zscore(values)
-        for i in indices:
-            anomalies_found.append({
-                "sensor": key,
-                "value": values[i],
-                "ucl": limits.ucl,
-                "lcl": limits.lcl,
-            })
-
-    context = (
-        f"Sensor readings summary: {len(readings)} total. "
-        f"By sensor: " + ", ".join(f"{k}: n={len(v)}, mean={sum(v)/len(v):.2f}" for k, v in by_type.items()) + ". "
-    )
-    if anomalies_found:
-        context += f" Anomalies detected: {len(anomalies_found)}. Details: " + str(anomalies_found[:5])
+
+async def summarize(ctx: MaintenanceContext, llm: LLMClient | None) -> dict[str, Any]:
+    """Turn a computed context into a summary, via `llm` when given."""
+    if llm is None:
+        return _fallback_summary(ctx)
+
+    if not ctx.total:
+        return {"summary": "No sensor data available.", "anomalies": [], "forecast": [], "recommendations": []}
 
     try:
-        from openai import AsyncOpenAI
-
-        client = AsyncOpenAI(api_key=settings.openai_api_key)
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a maintenance engineer for a smart factory. Be concise and actionable."},
-                {"role": "user", "content": f"Based on this IoT sensor data:\n\n{context}\n\nProvide a brief maintenance summary (2-4 sentences) and 1-3 specific recommendations."},
-            ],
-            temperature=0.3,
+        summary_text = await llm.complete(
+            SYSTEM_PROMPT,
+            f"Based on this IoT sensor data:\n\n{ctx.prompt()}\n\nProvide a brief maintenance summary (2-4 sentences) and 1-3 specific recommendations.",
         )
-        summary_text = response.choices[0].message.content or "No summary generated."
     except Exception as e:
-        summary_text = _fallback_summary(db, sensor_id, limit)["summary"]
+        summary_text = _fallback_summary(ctx)["summary"]
         summary_text += f" (AI unavailable: {e})"
 
     return {
         "summary": summary_text,
-        "anomalies": anomalies_found[:10],
-        "recommendations": _default_recommendations(anomalies_found),
+        "anomalies": ctx.anomalies[:10],
+        "forecast": _forecast_items(ctx.forecasts),
+        "recommendations": _default_recommendations(ctx.anomalies, ctx.forecasts),
     }
 
 
-def _fallback_summary(db: Session, sensor_id: str | None, limit: int) -> dict[str, Any]:
+def _fallback_summary(ctx: MaintenanceContext) -> dict[str, Any]:
     """Non-AI fallback when OpenAI is unavailable."""
-    q = db.query(SensorReading).order_by(SensorReading.timestamp.desc()).limit(limit)
-    if sensor_id:
-        q = q.filter(SensorReading.sensor_id == sensor_id)
-    readings = q.all()
-    if not readings:
-        return {"summary": "No data.", "anomalies": [], "recommendations": []}
-
-    by_type: dict[str, list[float]] = {}
-    for r in readings:
-        key = r.sensor_type
-        if key not in by_type:
-            by_type[key] = []
-        by_type[key].append(r.value)
-
-    anomalies = []
-    for key, values in by_type.items():
-        if len(values) >= 3:
-            indices = detect_anomalies_zscore(values)
-            for i in indices:
-                anomalies.append({"sensor": key, "value": values[i]})
+    if not ctx.total:
+        return {"summary": "No data.", "anomalies": [], "forecast": [], "recommendations": []}
 
     summary = (
-        f"Total readings: {len(readings)}. "
-        f"Sensor types: {', '.join(by_type.keys())}. "
-        f"Anomalies detected: {len(anomalies)}."
+        f"Total readings: {ctx.total}. "
+        f"Sensor types: {', '.join(ctx.sensor_types)}. "
+        f"Anomalies detected: {len(ctx.anomalies)}."
     )
+    if ctx.forecasts:
+        soonest = ctx.forecasts[0]
+        summary += (
+            f" Sensors trending toward a control limit: {len(ctx.forecasts)}"
+            f" (soonest: {soonest['sensor_id']} {soonest['limit'].upper()} in ~{soonest['hours_to_breach']:.0f} h)."
+        )
     return {
         "summary": summary,
-        "anomalies": anomalies[:10],
-        "recommendations": _default_recommendations(anomalies),
+        "anomalies": ctx.anomalies[:10],
+        "forecast": _forecast_items(ctx.forecasts),
+        "recommendations": _default_recommendations(ctx.anomalies, ctx.forecasts),
     }
 
 
-def _default_recommendations(anomalies: list[dict]) -> list[str]:
-    """Default recommendations based on anomaly count."""
-    recs = []
+def _forecast_items(forecasts: list[dict]) -> list[dict]:
+    keys = ("sensor_id", "limit", "hours_to_breach", "slope_per_hour", "model")
+    return [{k: f[k] for k in keys} for f in forecasts[:5]]
+
+
+def _default_recommendations(anomalies: list[dict], forecasts: list[dict] | None = None) -> list[str]:
+    """Default recommendations based on anomaly count and predicted limit breaches."""
+    recs = [
+        f"Inspect {f['sensor_id']} within ~{f['hours_to_breach']:.0f} h: trending toward its {f['limit'].upper()}."
+        for f in (forecasts or [])[:3]
+    ]
     if len(anomalies) > 5:
         recs.append("Schedule preventive maintenance - multiple anomalies detected.")
     if len(anomalies) > 0:
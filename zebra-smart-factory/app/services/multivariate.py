@@ -0,0 +1,201 @@
+"""
+Multivariate SPC across sensors on time-aligned buckets.
+
+Readings are bucketed per sensor (bucket means, from rollups or raw rows; see
+app.services.retention.bucket_rows) and pivoted into a T x p matrix. Short gaps are
+forward-filled, sensors with too little coverage are dropped, and buckets still missing a
+sensor are skipped. Everything below is vectorized over that matrix:
+
+- correlation matrices, over the whole range or per sliding window of buckets;
+- Hotelling T² on the leading principal components of the standardized reference period,
+  with the Phase II limit k(m+1)(m-1)/(m(m-k)) F(k, m-k); SPE (Q) on the residual with
+  Box's g·χ²(h) limit; per-sensor contributions to both for diagnosis.
+
+F and χ² quantiles use the Paulson / Wilson-Hilferty normal approximations, so there is no
+SciPy dependency.
+"""
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from statistics import NormalDist
+from typing import Any, NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy.orm import Session
+
+from app.core.metrics import timed
+from app.services.resample import ffill
+from app.services.retention import bucket_rows
+
+
+class AlignedMatrix(NamedTuple):
+    timestamps: np.ndarray  # datetime64[s], one per row
+    sensors: list[str]  # one per column
+    values: np.ndarray  # T x p bucket means
+
+
+@timed("multivariate.align")
+def align(rows: list[dict[str, Any]], max_gap: int = 3, min_coverage: float = 0.8) -> AlignedMatrix:
+    """Pivot per-sensor bucket moments into a gap-free T x p matrix of bucket means."""
+    if not rows:
+        return AlignedMatrix(np.empty(0, dtype="datetime64[s]"), [], np.empty((0, 0)))
+    sensors, sensor_codes = np.unique(np.array([r["sensor_id"] for r in rows], dtype=str), return_inverse=True)
+    epochs = np.fromiter((int(r["bucket_start"].timestamp()) for r in rows), dtype=np.int64, count=len(rows))
+    times, time_codes = np.unique(epochs, return_inverse=True)
+    means = np.fromiter((r["total"] / r["count"] for r in rows), dtype=float, count=len(rows))
+    x = np.full((len(times), len(sensors)), np.nan)
+    x[time_codes, sensor_codes] = means
+    x = ffill(x, max_gap)
+    keep = (~np.isnan(x)).mean(axis=0) >= min_coverage
+    x = x[:, keep]
+    complete = ~np.isnan(x).any(axis=1)
+    return AlignedMatrix(times[complete].astype("datetime64[s]"), sensors[keep].tolist(), x[complete])
+
+
+def load_matrix(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int = 60,
+    sensor_ids: list[str] | None = None,
+    sensor_type: str | None = None,
+    max_gap: int = 3,
+    min_coverage: float = 0.8,
+) -> AlignedMatrix:
+    rows = bucket_rows(db, bucket_seconds, start, end, sensor_type=sensor_type, sensor_ids=sensor_ids)
+    return align(rows, max_gap=max_gap, min_coverage=min_coverage)
+
+
+def _standardize(x: np.ndarray, axis: int = 0) -> np.ndarray:
+    centered = x - x.mean(axis=axis, keepdims=True)
+    sd = np.sqrt((centered ** 2).mean(axis=axis, keepdims=True))
+    return centered / np.where(sd > 0, sd, 1.0)  # constant sensors correlate 0 with everything
+
+
+@timed("multivariate.correlation")
+def correlation(x: np.ndarray) -> np.ndarray:
+    """Pearson correlation matrix (p x p) of the columns of x."""
+    z = _standardize(x)
+    corr = z.T @ z / max(len(x), 1)
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+@timed("multivariate.rolling_correlation")
+def rolling_correlation(x: np.ndarray, window: int, step: int = 1) -> np.ndarray:
+    """Correlation matrix per sliding window of `window` buckets: (n_windows, p, p)."""
+    if len(x) < window:
+        return np.empty((0, x.shape[1], x.shape[1]))
+    windows = sliding_window_view(x, window, axis=0)[::step]  # (k, p, window) view, no copy
+    z = _standardize(windows, axis=2)
+    corr = z @ z.transpose(0, 2, 1) / window
+    idx = np.arange(x.shape[1])
+    corr[:, idx, idx] = 1.0
+    return corr
+
+
+def top_pairs(corr: np.ndarray, k: int = 10) -> list[tuple[int, int, float]]:
+    """The k sensor pairs with the strongest |correlation|, as (i, j, r)."""
+    i, j = np.triu_indices(len(corr), 1)
+    r = corr[i, j]
+    best = np.argsort(-np.abs(r), kind="stable")[:k]
+    return [(int(i[b]), int(j[b]), float(r[b])) for b in best]
+
+
+def spectral_order(corr: np.ndarray) -> np.ndarray:
+    """Column order that places strongly correlated sensors next to each other (heatmaps)."""
+    if len(corr) < 3:
+        return np.arange(len(corr))
+    weights = np.abs(corr)
+    _, vecs = np.linalg.eigh(np.diag(weights.sum(axis=1)) - weights)  # graph Laplacian of |r|
+    return np.argsort(vecs[:, 1], kind="stable")  # Fiedler vector
+
+
+def _chi2_quantile(q: float, df: float) -> float:
+    """Wilson-Hilferty."""
+    z = NormalDist().inv_cdf(q)
+    a = 2 / (9 * df)
+    return df * max(1 - a + z * math.sqrt(a), 0.0) ** 3
+
+
+def _f_quantile(q: float, d1: float, d2: float) -> float:
+    """Paulson's normal approximation to the F distribution, solved for F."""
+    z = NormalDist().inv_cdf(q)
+    a, b = 2 / (9 * d1), 2 / (9 * d2)
+    qa, qb, qc = (1 - b) ** 2 - z * z * b, -2 * (1 - a) * (1 - b), (1 - a) ** 2 - z * z * a
+    disc = qb * qb - 4 * qa * qc
+    if qa <= 0 or disc < 0:
+        return _chi2_quantile(q, d1) / d1  # d2 too small for the approximation: use the d2 -> inf limit
+    return ((-qb + math.sqrt(disc)) / (2 * qa)) ** 3
+
+
+@dataclass
+class PCAModel:
+    sensors: list[str]
+    mean: np.ndarray
+    scale: np.ndarray
+    loadings: np.ndarray  # p x k
+    eigenvalues: np.ndarray  # k retained
+    explained: float  # fraction of standardized variance retained
+    n_reference: int
+    t2_limit: float
+    spe_limit: float
+
+
+class MultivariateScores(NamedTuple):
+    t2: np.ndarray
+    spe: np.ndarray
+    contributions: np.ndarray  # T x p, rows sum to t2
+    spe_contributions: np.ndarray  # T x p squared residuals, rows sum to spe
+
+
+@timed("multivariate.fit_pca")
+def fit_pca(
+    x: np.ndarray,
+    sensors: list[str],
+    variance: float = 0.9,
+    alpha: float = 0.0027,
+    max_components: int | None = None,
+) -> PCAModel:
+    """Phase I: PCA of the standardized reference matrix, T² and SPE limits at level alpha."""
+    m, p = x.shape
+    if m < 3:
+        raise ValueError("need at least 3 reference buckets")
+    mean = x.mean(axis=0)
+    scale = x.std(axis=0, ddof=1)
+    scale[scale == 0] = 1.0
+    z = (x - mean) / scale
+    vals, vecs = np.linalg.eigh(z.T @ z / (m - 1))
+    vals, vecs = np.clip(vals[::-1], 0.0, None), vecs[:, ::-1]
+    total = vals.sum()
+    k = int(np.searchsorted(np.cumsum(vals) / total, variance) + 1) if total > 0 else 1
+    k = max(1, min(k, p, m - 2, max_components or p))
+    k = min(k, max(int((vals > 1e-12 * max(total, 1e-300)).sum()), 1))
+    t2_limit = k * (m + 1) * (m - 1) / (m * (m - k)) * _f_quantile(1 - alpha, k, m - k)
+    residual = vals[k:]
+    theta1, theta2 = residual.sum(), (residual ** 2).sum()
+    spe_limit = theta2 / theta1 * _chi2_quantile(1 - alpha, theta1 ** 2 / theta2) if theta2 > 0 else 0.0
+    return PCAModel(
+        sensors=list(sensors),
+        mean=mean,
+        scale=scale,
+        loadings=vecs[:, :k],
+        eigenvalues=vals[:k],
+        explained=float(vals[:k].sum() / total) if total > 0 else 1.0,
+        n_reference=m,
+        t2_limit=float(t2_limit),
+        spe_limit=float(spe_limit),
+    )
+
+
+@timed("multivariate.score")
+def score(model: PCAModel, x: np.ndarray) -> MultivariateScores:
+    """Phase II: T², SPE and per-sensor contributions to both for each row of x."""
+    z = (x - model.mean) / model.scale
+    scores = z @ model.loadings
+    lam = np.where(model.eigenvalues > 0, model.eigenvalues, np.inf)
+    t2 = (scores ** 2 / lam).sum(axis=1)
+    residual = z - scores @ model.loadings.T
+    contributions = z * ((scores / lam) @ model.loadings.T)
+    return MultivariateScores(t2, (residual ** 2).sum(axis=1), contributions, residual ** 2)
@@ -0,0 +1,171 @@
+"""
+Resampling of irregular sensor streams onto one common time grid.
+
+All sensors are binned in one pass over flat arrays (sensor code, epoch seconds, value):
+`searchsorted` maps each reading to its bucket and `bincount` on the flat index
+`sensor * n_buckets + bucket` reduces every (sensor, bucket) cell at once, so cost is
+O(readings + sensors x buckets) regardless of how many sensors there are. Methods:
+
+- mean: (weighted) mean of the readings in the bucket;
+- last: latest reading in the bucket;
+- interpolate: linear interpolation of each sensor's series at the bucket start, one
+  `np.interp` over all sensors laid end to end on a shifted time axis.
+
+Ranges older than the raw retention are read from the finest rollup tier that covers them;
+each rollup bucket then counts as one point at its midpoint, weighted by its reading count.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.metrics import timed
+from app.models.sensor import SensorReading
+from app.services.retention import Tier, _utc, bucket_rows, policy_from_settings
+
+METHODS = ("mean", "last", "interpolate")
+
+
+@dataclass
+class Points:
+    """Flat readings of many sensors; `codes` index into `sensors`."""
+
+    sensors: list[str]
+    codes: np.ndarray  # int64
+    epochs: np.ndarray  # float64 seconds
+    values: np.ndarray  # float64
+    weights: np.ndarray | None = None  # readings per point (rollup buckets), None = 1 each
+    tier: str = "raw"
+
+
+@dataclass
+class Resampled:
+    grid: np.ndarray  # datetime64[s] bucket starts
+    sensors: list[str]
+    values: np.ndarray  # buckets x sensors, NaN where a sensor has no value
+    method: str
+    bucket_seconds: int
+    tier: str
+
+
+def ffill(values: np.ndarray, max_gap: int) -> np.ndarray:
+    """Forward-fill NaNs along axis 0, at most `max_gap` rows past the last value."""
+    rows = np.arange(len(values))[:, None]
+    last = np.maximum.accumulate(np.where(np.isnan(values), 0, rows), axis=0)
+    filled = values[last, np.arange(values.shape[1])]
+    filled[rows - last > max_gap] = np.nan
+    return filled
+
+
+def make_grid(start: datetime, end: datetime, bucket_seconds: int) -> np.ndarray:
+    """Bucket starts (epoch seconds) from `start` floored to the bucket width, up to `end`."""
+    first = int(_utc(start).timestamp()) // bucket_seconds * bucket_seconds
+    return np.arange(first, _utc(end).timestamp(), bucket_seconds, dtype=np.int64)
+
+
+@timed("resample.bin")
+def resample_points(points: Points, grid: np.ndarray, bucket_seconds: int, method: str = "mean") -> np.ndarray:
+    """Reduce flat points onto `grid` (epoch bucket starts): a len(grid) x n_sensors matrix."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    n, p = len(grid), len(points.sensors)
+    if method == "interpolate":
+        return _interpolate(points, grid.astype(float), p)
+    bins = np.searchsorted(grid, points.epochs, side="right") - 1
+    inside = (bins >= 0) & (points.epochs < grid[-1] + bucket_seconds) if n else np.zeros(len(bins), bool)
+    codes, bins, values = points.codes[inside], bins[inside], points.values[inside]
+    flat = codes * n + bins  # sensor-major, so the result is reshaped as p x n
+    out = np.full(n * p, np.nan)
+    if method == "mean":
+        w = np.ones(len(values)) if points.weights is None else points.weights[inside]
+        count = np.bincount(flat, weights=w, minlength=n * p)
+        total = np.bincount(flat, weights=values * w, minlength=n * p)
+        np.divide(total, count, out=out, where=count > 0)
+    else:  # last: order by (cell, time) and keep each cell's final entry
+        order = np.lexsort((points.epochs[inside], flat))
+        flat, values = flat[order], values[order]
+        final = np.r_[flat[1:] != flat[:-1], True] if len(flat) else np.zeros(0, bool)
+        out[flat[final]] = values[final]
+    return out.reshape(p, n).T
+
+
+def _interpolate(points: Points, grid: np.ndarray, p: int) -> np.ndarray:
+    out = np.full((len(grid), p), np.nan)
+    if not len(points.values) or not len(grid):
+        return out
+    # Lay the sensors end to end: sensor k lives on [k * span, (k + 1) * span) of a shared axis.
+    origin = min(grid[0], points.epochs.min())
+    span = max(grid[-1], points.epochs.max()) - origin + 1.0
+    order = np.lexsort((points.epochs, points.codes))
+    codes, x, y = points.codes[order], points.epochs[order] - origin + points.codes[order] * span, points.values[order]
+    first = np.full(p, np.inf)
+    last = np.full(p, -np.inf)
+    np.minimum.at(first, codes, points.epochs[order])
+    np.maximum.at(last, codes, points.epochs[order])
+    xq = (grid - origin)[:, None] + np.arange(p)[None, :] * span
+    interp = np.interp(xq.ravel(), x, y).reshape(xq.shape)
+    within = (grid[:, None] >= first[None, :]) & (grid[:, None] <= last[None, :])  # no extrapolation
+    out[within] = interp[within]
+    return out
+
+
+def load_points(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+    *,
+    sensor_ids: list[str] | None = None,
+    sensor_type: str | None = None,
+    policy: list[Tier] | None = None,
+    now: datetime | None = None,
+) -> Points:
+    """Readings in [start, end) from the finest retained tier not coarser than the bucket width."""
+    policy = policy or policy_from_settings()
+    now = now or datetime.now(timezone.utc)
+    start = _utc(start)
+    usable = [t for t in policy if t.resolution <= bucket_seconds]
+    tier = next((t for t in usable if t.covers(start, now)), usable[-1] if usable else policy[0])
+    if tier.resolution == 0:
+        q = db.query(SensorReading.sensor_id, SensorReading.timestamp, SensorReading.value).filter(
+            SensorReading.timestamp >= start, SensorReading.timestamp < _utc(end)
+        )
+        if sensor_ids:
+            q = q.filter(SensorReading.sensor_id.in_(sensor_ids))
+        if sensor_type:
+            q = q.filter(SensorReading.sensor_type == sensor_type)
+        rows = q.all()
+        sensor_col = [r[0] for r in rows]
+        epochs = np.fromiter((_utc(r[1]).timestamp() for r in rows), dtype=float, count=len(rows))
+        values = np.fromiter((r[2] for r in rows), dtype=float, count=len(rows))
+        weights = None
+    else:
+        rows = bucket_rows(db, tier.resolution, start, end, sensor_type=sensor_type, sensor_ids=sensor_ids)
+        sensor_col = [r["sensor_id"] for r in rows]
+        half = tier.resolution / 2
+        epochs = np.fromiter((r["bucket_start"].timestamp() + half for r in rows), dtype=float, count=len(rows))
+        weights = np.fromiter((r["count"] for r in rows), dtype=float, count=len(rows))
+        values = np.fromiter((r["total"] for r in rows), dtype=float, count=len(rows)) / np.maximum(weights, 1)
+    sensors, codes = np.unique(np.array(sensor_col, dtype=str), return_inverse=True)
+    return Points(sensors.tolist(), codes.astype(np.int64), epochs, values, weights, tier.name)
+
+
+def resample(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+    method: str = "mean",
+    *,
+    sensor_ids: list[str] | None = None,
+    sensor_type: str | None = None,
+    max_gap: int = 0,
+) -> Resampled:
+    """Align the selected sensors on a common grid; `max_gap` forward-fills short gaps."""
+    points = load_points(db, start, end, bucket_seconds, sensor_ids=sensor_ids, sensor_type=sensor_type)
+    grid = make_grid(start, end, bucket_seconds)
+    matrix = resample_points(points, grid, bucket_seconds, method)
+    if max_gap > 0 and matrix.size:
+        matrix = ffill(matrix, max_gap)
+    return Resampled(grid.astype("datetime64[s]"), points.sensors, matrix, method, bucket_seconds, points.tier)
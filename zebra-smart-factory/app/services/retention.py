@@ -0,0 +1,439 @@
+"""
+Retention and downsampling for raw readings.
+
+Three tiers with their own retention (settings): raw readings (default 7 days), 1-minute
+rollups (90 days) and hourly rollups (forever). A background job, run by one worker at a
+time under a state-backend lock:
+
+0. rebuilds the sketch buckets queued by too-late readings (app.services.lateness);
+1. folds late readings (timestamp behind the rollup watermark, id above the last id the job
+   saw) into the existing rollups;
+2. rolls up each complete hour past the watermark into both resolutions, one hour per
+   transaction, moving the watermark in the same transaction (a crash never double counts);
+3. deletes expired raw rows that are already rolled up, then expired rollups, in batches of
+   `retention_batch_size` rows per transaction so no lock is held for long.
+
+`read_history` serves a time range from the finest tier that still covers its start and
+fits in `max_points`; rollup reads fill the not-yet-rolled tail from raw rows on the fly.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+import numpy as np
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import dialect_insert, epoch_bucket
+from app.core.state import WORKER_ID, get_state_backend
+from app.models.rollup import PipelineWatermark, SensorRollup
+from app.models.sensor import SensorReading
+from app.services.lateness import process_backfill
+
+logger = logging.getLogger(__name__)
+
+MINUTE, HOUR = 60, 3600
+WATERMARK = "rollups"
+LOCK_KEY = "retention-lock"
+_MOMENTS = ("count", "total", "total_sq", "minimum", "maximum")
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    resolution: int  # bucket width in seconds; 0 = raw readings
+    retention: timedelta | None  # None = keep forever
+
+    def covers(self, start: datetime, now: datetime) -> bool:
+        return self.retention is None or start >= now - self.retention
+
+
+def policy_from_settings() -> list[Tier]:
+    """Finest tier first."""
+    s = get_settings()
+
+    def days(d: float) -> timedelta | None:
+        return timedelta(days=d) if d > 0 else None
+
+    return [
+        Tier("raw", 0, days(s.retention_raw_days)),
+        Tier("1m", MINUTE, days(s.retention_minute_days)),
+        Tier("1h", HOUR, days(s.retention_hour_days)),
+    ]
+
+
+def _utc(ts: datetime) -> datetime:
+    """Naive datetimes (SQLite) are UTC."""
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def _floor(ts: datetime, seconds: int) -> datetime:
+    epoch = int(_utc(ts).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, timezone.utc)
+
+
+def aggregate_raw(
+    db: Session,
+    resolution: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    *,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    sensor_ids: list[str] | None = None,
+    min_id: int | None = None,
+    max_id: int | None = None,
+) -> list[dict[str, Any]]:
+    """Raw readings grouped per sensor and `resolution`-second bucket (ids in (min_id, max_id])."""
+    value = SensorReading.value
+    bucket = epoch_bucket(db, SensorReading.timestamp, resolution).label("bucket")
+    q = db.query(
+        SensorReading.sensor_id,
+        func.max(SensorReading.sensor_type),
+        bucket,
+        func.count(value),
+        func.sum(value),
+        func.sum(value * value),
+        func.min(value),
+        func.max(value),
+    )
+    if start is not None:
+        q = q.filter(SensorReading.timestamp >= start)
+    if end is not None:
+        q = q.filter(SensorReading.timestamp < end)
+    if sensor_id:
+        q = q.filter(SensorReading.sensor_id == sensor_id)
+    if sensor_type:
+        q = q.filter(SensorReading.sensor_type == sensor_type)
+    if sensor_ids:
+        q = q.filter(SensorReading.sensor_id.in_(sensor_ids))
+    if min_id is not None:
+        q = q.filter(SensorReading.id > min_id)
+    if max_id is not None:
+        q = q.filter(SensorReading.id <= max_id)
+    return [
+        {
+            "sensor_id": sid,
+            "sensor_type": stype,
+            "resolution": resolution,
+            "bucket_start": datetime.fromtimestamp(int(b), timezone.utc),
+            "count": n,
+            "total": total,
+            "total_sq": total_sq,
+            "minimum": lo,
+            "maximum": hi,
+        }
+        for sid, stype, b, n, total, total_sq, lo, hi in q.group_by(SensorReading.sensor_id, bucket).all()
+    ]
+
+
+def _upsert(db: Session, rows: list[dict[str, Any]], merge: bool, chunk: int = 500) -> None:
+    """Write rollup rows: add into existing buckets (merge) or replace them."""
+    insert = dialect_insert(db)
+    if insert is None:
+        _merge_rows(db, rows, merge)
+        return
+    for i in range(0, len(rows), chunk):
+        stmt = insert(SensorRollup.__table__).values(rows[i : i + chunk])
+        t, ex = SensorRollup.__table__.c, stmt.excluded
+        if merge:
+            set_ = {
+                "count": t.count + ex.count,
+                "total": t.total + ex.total,
+                "total_sq": t.total_sq + ex.total_sq,
+                "minimum": case((ex.minimum < t.minimum, ex.minimum), else_=t.minimum),
+                "maximum": case((ex.maximum > t.maximum, ex.maximum), else_=t.maximum),
+            }
+        else:
+            set_ = {col: ex[col] for col in _MOMENTS}
+        db.execute(stmt.on_conflict_do_update(index_elements=["sensor_id", "resolution", "bucket_start"], set_=set_))
+
+
+def _merge_rows(db: Session, rows: list[dict[str, Any]], merge: bool) -> None:
+    """Portable read-modify-write fallback for dialects without ON CONFLICT."""
+    for row in rows:
+        cur = (
+            db.query(SensorRollup)
+            .filter_by(sensor_id=row["sensor_id"], resolution=row["resolution"], bucket_start=row["bucket_start"])
+            .with_for_update()
+            .first()
+        )
+        if cur is None:
+            db.add(SensorRollup(**row))
+        elif merge:
+            cur.count += row["count"]
+            cur.total += row["total"]
+            cur.total_sq += row["total_sq"]
+            cur.minimum = min(cur.minimum, row["minimum"])
+            cur.maximum = max(cur.maximum, row["maximum"])
+        else:
+            for col in _MOMENTS:
+                setattr(cur, col, row[col])
+
+
+class RetentionService:
+    """Scheduled downsample-then-expire job; `run_once` can also be called directly."""
+
+    def __init__(
+        self,
+        policy: list[Tier] | None = None,
+        interval: float = 300.0,
+        batch_size: int = 5000,
+        grace_seconds: int = 300,
+        max_hours: int = 24 * 7,
+        lock_ttl: float = 900.0,
+    ):
+        self.policy = policy or policy_from_settings()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+        self.max_hours = max_hours
+        self.lock_ttl = lock_ttl
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_settings(cls) -> "RetentionService":
+        s = get_settings()
+        return cls(interval=s.retention_interval, batch_size=s.retention_batch_size, grace_seconds=s.retention_grace_seconds)
+
+    def run_once(self, db: Session, now: datetime | None = None) -> dict[str, int] | None:
+        """One pass; returns counts, or None when another worker holds the lock."""
+        backend = get_state_backend()
+        if not backend.set_if_absent(LOCK_KEY, WORKER_ID.encode(), ttl=self.lock_ttl):
+            return None
+        try:
+            return self._run(db, _utc(now or datetime.now(timezone.utc)))
+        finally:
+            backend.delete(LOCK_KEY)
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        if self._task is not None or self.interval <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop(session_factory))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self, session_factory: Callable[[], Session]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self._run_in_session, session_factory)
+            except Exception:
+                logger.exception("retention run failed")
+
+    def _run_in_session(self, session_factory: Callable[[], Session]) -> None:
+        with session_factory() as db:
+            report = self.run_once(db)
+        if report:
+            logger.info("retention: %s", report)
+
+    def _run(self, db: Session, now: datetime) -> dict[str, int]:
+        report = {"backfilled": 0, "late": 0, "hours": 0, "raw_deleted": 0, "rollups_deleted": 0}
+        report["backfilled"] = process_backfill(db, now)
+        snapshot = db.query(func.max(SensorReading.id)).scalar() or 0
+        wm = db.get(PipelineWatermark, WATERMARK)
+        if wm is None:
+            wm = PipelineWatermark(name=WATERMARK, position=None, last_id=snapshot)
+            db.add(wm)
+        if wm.position is None:
+            first = db.query(func.min(SensorReading.timestamp)).filter(SensorReading.id <= snapshot).scalar()
+            if first is not None:
+                wm.position, wm.last_id = _floor(first, HOUR), snapshot
+            db.commit()
+
+        if wm.position is not None:
+            report["late"] = self._fold_late(db, wm, snapshot)
+            report["hours"] = self._roll_up(db, wm, snapshot, _floor(now - timedelta(seconds=self.grace_seconds), HOUR))
+
+        raw, *rollups = self.policy
+        if raw.retention is not None and wm.position is not None:
+            cutoff = min(_floor(now - raw.retention, HOUR), _utc(wm.position))  # never delete what isn't rolled up
+            report["raw_deleted"] = self._delete_batches(
+                db, SensorReading, SensorReading.timestamp < cutoff, SensorReading.id <= snapshot
+            )
+        for tier in rollups:
+            if tier.retention is not None:
+                report["rollups_deleted"] += self._delete_batches(
+                    db,
+                    SensorRollup,
+                    SensorRollup.resolution == tier.resolution,
+                    SensorRollup.bucket_start < _floor(now - tier.retention, tier.resolution),
+                )
+        return report
+
+    def _rollup_rows(self, db: Session, start=None, end=None, **filters) -> list[dict[str, Any]]:
+        return [row for tier in self.policy[1:] for row in aggregate_raw(db, tier.resolution, start, end, **filters)]
+
+    def _fold_late(self, db: Session, wm: PipelineWatermark, snapshot: int) -> int:
+        """Readings that arrived behind the watermark are added into their (closed) buckets."""
+        folded, position = 0, _utc(wm.position)
+        while (wm.last_id or 0) < snapshot:
+            lo = wm.last_id or 0
+            hi = min(lo + self.batch_size, snapshot)
+            rows = self._rollup_rows(db, None, position, min_id=lo, max_id=hi)
+            if rows:
+                _upsert(db, rows, merge=True)
+                folded += sum(r["count"] for r in rows if r["resolution"] == self.policy[1].resolution)
+            wm.last_id = hi
+            db.commit()
+        return folded
+
+    def _roll_up(self, db: Session, wm: PipelineWatermark, snapshot: int, target: datetime) -> int:
+        """Roll up whole hours [watermark, target); empty stretches are skipped in one step."""
+        hours, position = 0, _utc(wm.position)
+        while position < target and hours < self.max_hours:
+            end = position + timedelta(seconds=HOUR)
+            rows = self._rollup_rows(db, position, end, max_id=snapshot)
+            if rows:
+                _upsert(db, rows, merge=False)
+                position = end
+            else:
+                nxt = (
+                    db.query(func.min(SensorReading.timestamp))
+                    .filter(SensorReading.timestamp >= end, SensorReading.id <= snapshot)
+                    .scalar()
+                )
+                position = min(_floor(nxt, HOUR), target) if nxt is not None else target
+            wm.position = position
+            db.commit()
+            hours += 1
+        return hours
+
+    def _delete_batches(self, db: Session, model, *conditions) -> int:
+        deleted = 0
+        while True:
+            ids = select(model.id).where(*conditions).limit(self.batch_size)
+            n = db.execute(
+                delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            deleted += n
+            if n < self.batch_size:
+                return deleted
+
+
+@dataclass
+class History:
+    tier: Tier
+    timestamps: list[datetime]
+    mean: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    count: np.ndarray
+
+
+def read_history(
+    db: Session,
+    start: datetime,
+    end: datetime | None = None,
+    *,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    max_points: int | None = None,
+    policy: list[Tier] | None = None,
+    now: datetime | None = None,
+) -> History:
+    """Readings over [start, end) at the finest retained resolution with at most `max_points`."""
+    now = _utc(now or datetime.now(timezone.utc))
+    start, end = _utc(start), _utc(end or now)
+    max_points = max_points or get_settings().history_max_points
+    policy = policy or policy_from_settings()
+    span = (end - start).total_seconds()
+    for tier in policy:
+        if not tier.covers(start, now):
+            continue
+        if tier.resolution == 0:
+            q = db.query(SensorReading.timestamp, SensorReading.value).filter(
+                SensorReading.timestamp >= start, SensorReading.timestamp < end
+            )
+            if sensor_id:
+                q = q.filter(SensorReading.sensor_id == sensor_id)
+            if sensor_type:
+                q = q.filter(SensorReading.sensor_type == sensor_type)
+            rows = q.order_by(SensorReading.timestamp).limit(max_points + 1).all()
+            if len(rows) <= max_points:
+                values = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+                return History(tier, [_utc(r[0]) for r in rows], values, values, values, np.ones(len(rows), dtype=int))
+        elif span / tier.resolution <= max_points:
+            return _rollup_history(db, tier, start, end, sensor_id, sensor_type)
+    return _rollup_history(db, policy[-1], start, end, sensor_id, sensor_type)
+
+
+def bucket_rows(
+    db: Session,
+    resolution: int,
+    start: datetime,
+    end: datetime,
+    *,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    sensor_ids: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Per-sensor bucket moments over [start, end): stored rollups up to the watermark when
+    `resolution` is a rollup tier, raw rows aggregated on the fly for the rest.
+    """
+    start, end = _utc(start), _utc(end)
+    first = _floor(start, resolution)
+    rolled_to = first
+    if resolution in (MINUTE, HOUR):
+        wm = db.get(PipelineWatermark, WATERMARK)
+        if wm is not None and wm.position is not None:
+            rolled_to = max(min(_utc(wm.position), end), first)
+    rows = []
+    if rolled_to > first:
+        q = db.query(SensorRollup.sensor_id, SensorRollup.bucket_start, *(getattr(SensorRollup, c) for c in _MOMENTS)).filter(
+            SensorRollup.resolution == resolution,
+            SensorRollup.bucket_start >= first,
+            SensorRollup.bucket_start < rolled_to,
+        )
+        if sensor_id:
+            q = q.filter(SensorRollup.sensor_id == sensor_id)
+        if sensor_type:
+            q = q.filter(SensorRollup.sensor_type == sensor_type)
+        if sensor_ids:
+            q = q.filter(SensorRollup.sensor_id.in_(sensor_ids))
+        rows += [
+            {"sensor_id": r[0], "bucket_start": _utc(r[1]), **dict(zip(_MOMENTS, r[2:]))}
+            for r in q.all()
+        ]
+    if end > rolled_to:
+        rows += aggregate_raw(
+            db, resolution, rolled_to, end, sensor_id=sensor_id, sensor_type=sensor_type, sensor_ids=sensor_ids
+        )
+    return rows
+
+
+def _rollup_history(
+    db: Session, tier: Tier, start: datetime, end: datetime, sensor_id: str | None, sensor_type: str | None
+) -> History:
+    import pandas as pd
+
+    rows = bucket_rows(db, tier.resolution, start, end, sensor_id=sensor_id, sensor_type=sensor_type)
+    df = pd.DataFrame(rows, columns=["bucket_start", *_MOMENTS])
+    # Several sensors (sensor_type filter) share a bucket: combine their moments.
+    df = df.groupby("bucket_start", sort=True).agg(
+        count=("count", "sum"), total=("total", "sum"), minimum=("minimum", "min"), maximum=("maximum", "max")
+    )
+    count = df["count"].to_numpy(dtype=int)
+    return History(
+        tier,
+        [ts.to_pydatetime() for ts in df.index],
+        df["total"].to_numpy(dtype=float) / np.maximum(count, 1),
+        df["minimum"].to_numpy(dtype=float),
+        df["maximum"].to_numpy(dtype=float),
+        count,
+    )
+
+
+retention_service = RetentionService.from_settings()
@@ -0,0 +1,282 @@
+"""
+Fixed-size ring buffers of the most recent readings per sensor.
+
+Each ring stores timestamps (int64 epoch ns) and values (float64) twice, at slot i and at
+i + capacity, so the latest n readings are always one contiguous slice: `latest(n)` hands
+out NumPy views with no copying or per-row Python objects. Rings are filled from the DB on
+first use (cold start) and then appended to by the ingest path; a reading older than the
+ring's newest (late data) makes it reload in timestamp order on the next read.
+
+With `RING_MMAP_PATH` set the rings live in one memory-mapped file shared by every worker
+process on the host (writers serialize on an flock; POSIX only). Otherwise they are
+per-process and kept current across workers by the state backend's readings fan-out.
+Rings are allocated `slack` slots larger than they read, so a view stays valid while up
+to `slack` concurrent appends land.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.state import RecentIds, get_state_backend
+from app.models.sensor import SensorReading
+from app.services.spc_state import READINGS_CHANNEL
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MAGIC = 0x5A45425241524E47  # "ZEBRARNG"
+_NAME_BYTES = 64
+COUNT, HEAD, LOADED, LOADED_MAX_ID = 0, 1, 2, 3  # meta slots
+
+
+def _ns(ts: datetime | None) -> int:
+    if ts is None:
+        ts = datetime.now(timezone.utc)
+    elif ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    delta = ts - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
+
+
+class RingBuffer:
+    """One sensor's ring over caller-provided (possibly memory-mapped) arrays."""
+
+    def __init__(self, size: int, timestamps: np.ndarray | None = None, values: np.ndarray | None = None,
+                 meta: np.ndarray | None = None):
+        self.size = size
+        self.timestamps = np.zeros(2 * size, dtype=np.int64) if timestamps is None else timestamps
+        self.values = np.zeros(2 * size, dtype=np.float64) if values is None else values
+        self.meta = np.zeros(4, dtype=np.int64) if meta is None else meta
+
+    def __len__(self) -> int:
+        return int(min(self.meta[COUNT], self.size))
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.meta[LOADED])
+
+    def append(self, ts_ns: int, value: float) -> None:
+        head = int(self.meta[HEAD])
+        self.timestamps[head] = self.timestamps[head + self.size] = ts_ns
+        self.values[head] = self.values[head + self.size] = value
+        self.meta[COUNT] += 1
+        self.meta[HEAD] = (head + 1) % self.size  # published last: readers never see a half-written slot
+
+    def append_in_order(self, ts_ns: int, value: float) -> None:
+        """Append, or on an out-of-order (late) timestamp mark the ring for a reload from the DB."""
+        if len(self) and ts_ns < self.timestamps[(int(self.meta[HEAD]) - 1) % self.size]:
+            self.meta[LOADED] = 0
+        else:
+            self.append(ts_ns, value)
+
+    def extend(self, ts_ns: np.ndarray, values: np.ndarray) -> None:
+        ts_ns, values = ts_ns[-self.size:], values[-self.size:]
+        head = int(self.meta[HEAD])
+        pos = (head + np.arange(len(values))) % self.size
+        self.timestamps[pos] = self.timestamps[pos + self.size] = ts_ns
+        self.values[pos] = self.values[pos + self.size] = values
+        self.meta[COUNT] += len(values)
+        self.meta[HEAD] = (head + len(values)) % self.size
+
+    def latest(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """Views of the last n (timestamps ns, values), oldest first."""
+        n = min(n, len(self))
+        start = (int(self.meta[HEAD]) - n) % self.size
+        return self.timestamps[start : start + n], self.values[start : start + n]
+
+
+class RingStore:
+    """Ring per sensor, readable up to `capacity` readings; DB fallback beyond that."""
+
+    def __init__(self, capacity: int = 1000, max_sensors: int = 4096, path: str | None = None, slack: int = 64):
+        self.capacity = capacity
+        self.size = capacity + slack
+        self.max_sensors = max_sensors
+        self.path = path
+        self._rings: OrderedDict[str, RingBuffer] = OrderedDict()
+        self._lock = threading.RLock()
+        self._seen = RecentIds()
+        self._subscribed = None
+        self._file = None
+
+    @classmethod
+    def from_settings(cls) -> "RingStore":
+        s = get_settings()
+        return cls(capacity=s.ring_capacity, max_sensors=s.ring_max_sensors, path=s.ring_mmap_path or None)
+
+    @property
+    def shared(self) -> bool:
+        return self.path is not None
+
+    def series(self, db: Session, sensor_id: str, limit: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """Last `limit` (timestamps as datetime64[ns], values) views, or None to use the DB."""
+        if self.capacity <= 0 or limit > self.capacity:
+            return None
+        self._subscribe()
+        with self._locked():
+            ring = self._ring(sensor_id, create=True)
+            if ring is None:
+                return None
+            if not ring.loaded:
+                self._load(db, sensor_id, ring)
+                if not len(ring):
+                    self._drop(sensor_id)  # unknown sensors must not hold a ring (or an mmap slot)
+            ts, values = ring.latest(limit)
+        return ts.view("datetime64[ns]"), values
+
+    def append(self, readings: list[SensorReading]) -> None:
+        """Ingest hook: extend the rings that are already loaded (cold ones load on first read)."""
+        if self.capacity <= 0:
+            return
+        with self._locked():
+            for r in readings:
+                ring = self._ring(r.sensor_id, create=False)
+                # Rows up to the max id seen at load time are already in the ring.
+                if ring is not None and ring.loaded and r.id > ring.meta[LOADED_MAX_ID] and self._seen.add(r.id):
+                    ring.append_in_order(_ns(r.timestamp), r.value)
+
+    def apply(self, message: str) -> None:
+        """Readings fan-out subscriber (per-process rings only)."""
+        with self._locked():
+            for reading_id, sensor_id, value, ts in json.loads(message):
+                ring = self._rings.get(sensor_id)
+                if ring is not None and ring.loaded and reading_id > ring.meta[LOADED_MAX_ID] and self._seen.add(reading_id):
+                    ring.append_in_order(int(ts * 1e9), value)
+
+    def reset(self) -> None:
+        with self._locked():
+            self._seen.clear()
+            if self.shared:
+                self._open()
+                self._file["meta"][:] = 0
+                self._file["names"][:] = b""
+            self._rings.clear()
+
+    def _load(self, db: Session, sensor_id: str, ring: RingBuffer) -> None:
+        rows = (
+            db.query(SensorReading.timestamp, SensorReading.value, SensorReading.id)
+            .filter(SensorReading.sensor_id == sensor_id)
+            .order_by(SensorReading.timestamp.desc())
+            .limit(self.capacity)
+            .all()
+        )[::-1]
+        ring.meta[:] = 0
+        if rows:
+            ring.extend(
+                np.fromiter((_ns(r[0]) for r in rows), dtype=np.int64, count=len(rows)),
+                np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows)),
+            )
+            ring.meta[LOADED_MAX_ID] = max(r[2] for r in rows)
+        ring.meta[LOADED] = 1
+
+    def _ring(self, sensor_id: str, create: bool) -> RingBuffer | None:
+        ring = self._rings.get(sensor_id)
+        if ring is not None:
+            if not self.shared:
+                self._rings.move_to_end(sensor_id)
+            return ring
+        if self.shared:
+            return self._mmap_ring(sensor_id, create)
+        if not create:
+            return None
+        ring = self._rings[sensor_id] = RingBuffer(self.size)
+        while len(self._rings) > self.max_sensors:
+            self._rings.popitem(last=False)
+        return ring
+
+    def _drop(self, sensor_id: str) -> None:
+        ring = self._rings.pop(sensor_id, None)
+        if ring is not None and self.shared:
+            slots = np.flatnonzero(self._file["names"] == sensor_id.encode()[:_NAME_BYTES])
+            self._file["names"][slots] = b""
+
+    def _mmap_ring(self, sensor_id: str, create: bool) -> RingBuffer | None:
+        self._open()
+        f = self._file
+        key = sensor_id.encode()[:_NAME_BYTES]
+        slots = np.flatnonzero(f["names"] == key)
+        if len(slots):
+            slot = int(slots[0])
+        elif create:
+            free = np.flatnonzero(f["names"] == b"")
+            if not len(free):
+                return None  # table full: this sensor is served from the DB
+            slot = int(free[0])
+            f["meta"][slot] = 0
+            f["names"][slot] = key
+        else:
+            return None
+        ring = RingBuffer(self.size, f["ts"][slot], f["values"][slot], f["meta"][slot])
+        self._rings[sensor_id] = ring
+        return ring
+
+    def _open(self) -> None:
+        if self._file is not None:
+            return
+        n, size = self.max_sensors, self.size
+        layout = [
+            ("header", np.int64, (4,)),
+            ("names", f"S{_NAME_BYTES}", (n,)),
+            ("meta", np.int64, (n, 4)),
+            ("ts", np.int64, (n, 2 * size)),
+            ("values", np.float64, (n, 2 * size)),
+        ]
+        total = sum(np.dtype(dt).itemsize * int(np.prod(shape)) for _, dt, shape in layout)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        with self._flock():
+            fresh = os.fstat(fd).st_size != total
+            if fresh:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, total)  # sparse: untouched rings cost no disk
+        os.close(fd)
+        arrays, offset = {}, 0
+        for name, dt, shape in layout:
+            arrays[name] = np.memmap(self.path, dtype=dt, mode="r+", offset=offset, shape=shape)
+            offset += np.dtype(dt).itemsize * int(np.prod(shape))
+        header = arrays["header"]
+        if tuple(header) != (_MAGIC, size, n, 1):
+            with self._flock():
+                arrays["meta"][:] = 0
+                arrays["names"][:] = b""
+                header[:] = (_MAGIC, size, n, 1)
+        self._file = arrays
+
+    @contextmanager
+    def _flock(self):
+        import fcntl
+
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self.shared:
+                self._open()
+                with self._flock():
+                    yield
+            else:
+                yield
+
+    def _subscribe(self) -> None:
+        if self.shared:
+            return  # one mmap file: every worker already appends to the same rings
+        backend = get_state_backend()
+        if self._subscribed is not backend:
+            with self._lock:
+                if self._subscribed is not backend:
+                    if backend.shared:
+                        backend.subscribe(READINGS_CHANNEL, self.apply)
+                    self._subscribed = backend
+
+
+ring_store = RingStore.from_settings()
@@ -0,0 +1,315 @@
+"""
+Per-sensor, per-time-bucket sketches persisted in `sensor_sketches`.
+
+Ingest buffers values in memory and folds them into the bucket rows every `flush_every`
+readings or `flush_interval` seconds (rows are merged, not overwritten, so several workers
+can flush into the same bucket). Range queries merge the bucket rows: percentiles, IQR
+bounds and distinct-value counts over any range read a few KB per sensor-bucket instead of
+raw readings. Ranges are resolved to whole buckets. `build_sketches` rebuilds buckets from
+raw rows (backfill, or after retention changes).
+"""
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal, dialect_insert
+from app.models.sensor import SensorReading
+from app.models.sketch import SensorSketch
+from app.services.sketches import HyperLogLog, TDigest
+
+HLL_PRECISION = 10  # 1 KiB per bucket row, ~3% error on distinct counts
+KEY = ["sensor_id", "bucket_start"]
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch_seconds(timestamps) -> np.ndarray:
+    """UTC epoch seconds; naive datetimes (SQLite) are taken as UTC."""
+    return np.fromiter(
+        (math.floor((ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp()) for ts in timestamps),
+        dtype=np.int64,
+    )
+
+
+def bucket_start(ts: datetime, bucket_seconds: int | None = None) -> datetime:
+    size = bucket_seconds or get_settings().sketch_bucket_seconds
+    return datetime.fromtimestamp(int(_epoch_seconds([ts])[0]) // size * size, timezone.utc)
+
+
+class BucketSketch:
+    """Moments, t-digest and distinct-value HLL for a set of readings; mergeable."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.digest = TDigest()
+        self.distinct = HyperLogLog(HLL_PRECISION)
+
+    @classmethod
+    def from_row(cls, row: SensorSketch) -> "BucketSketch":
+        s = cls()
+        s.count, s.total, s.total_sq = row.count, row.total, row.total_sq
+        s.minimum, s.maximum = row.minimum, row.maximum
+        s.digest = TDigest.from_bytes(row.digest)
+        s.distinct = HyperLogLog.from_bytes(row.distinct_values)
+        return s
+
+    def add_many(self, values: np.ndarray) -> "BucketSketch":
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            self.count += len(values)
+            self.total += float(values.sum())
+            self.total_sq += float(np.dot(values, values))
+            self.minimum = min(self.minimum, float(values.min()))
+            self.maximum = max(self.maximum, float(values.max()))
+            self.digest.add_many(values)
+            self.distinct.add_many(values)
+        return self
+
+    def merge(self, other: "BucketSketch") -> "BucketSketch":
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.digest.merge(other.digest)
+        self.distinct.merge(other.distinct)
+        return self
+
+    def write_to(self, row: SensorSketch) -> None:
+        row.count, row.total, row.total_sq = self.count, self.total, self.total_sq
+        row.minimum, row.maximum = self.minimum, self.maximum
+        row.digest = self.digest.to_bytes()
+        row.distinct_values = self.distinct.to_bytes()
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return float(np.sqrt(max(self.total_sq / self.count - self.mean ** 2, 0.0)))
+
+    def percentiles(self, ps) -> np.ndarray:
+        return np.asarray(self.digest.percentile(np.asarray(ps, dtype=float)))
+
+    def iqr_bounds(self, k: float = 1.5) -> tuple[float, float]:
+        q1, q3 = self.percentiles([25, 75])
+        return float(q1 - k * (q3 - q1)), float(q3 + k * (q3 - q1))
+
+    def distinct_count(self) -> int:
+        return int(round(min(self.distinct.count(), self.count)))
+
+
+class SketchRecorder:
+    """Buffers ingested values per (sensor, bucket) and merges them into `sensor_sketches`.
+
+    `add` and `flush` run from the request threads, the WAL consumer and the lateness and
+    retention jobs, so the buffer is swapped out under a lock. A failed flush puts its values
+    back for the next one.
+    """
+
+    def __init__(self, flush_every: int = 1000, flush_interval: float = 10.0, bucket_seconds: int | None = None):
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.bucket_seconds = bucket_seconds
+        self._pending: dict[tuple[str, int], tuple[str, list[float]]] = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self.bucket_seconds or get_settings().sketch_bucket_seconds
+
+    def add(self, readings: list[SensorReading]) -> None:
+        if not readings:
+            return
+        buckets = _epoch_seconds([r.timestamp or datetime.now(timezone.utc) for r in readings]) // self.size
+        with self._lock:
+            for r, b in zip(readings, buckets):
+                entry = self._pending.setdefault((r.sensor_id, int(b)), (r.sensor_type, []))
+                entry[1].append(r.value)
+            self._pending_count += len(readings)
+
+    def maybe_flush(self, db: Session) -> int:
+        """Flush when due; a failure is logged and retried on the next call, the readings are already stored."""
+        if self._pending_count >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                return self.flush(db)
+            except Exception:
+                logger.exception("sketch flush failed, %d values kept for the next one", self._pending_count)
+        return 0
+
+    def flush(self, db: Session) -> int:
+        """Merge pending values into their bucket rows; returns the number of rows written."""
+        with self._lock:
+            pending, self._pending, self._pending_count = self._pending, {}, 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            self._merge(db, pending)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._restore(pending)
+            raise
+        return len(pending)
+
+    def _merge(self, db: Session, pending: dict[tuple[str, int], tuple[str, list[float]]]) -> None:
+        starts = {b: datetime.fromtimestamp(b * self.size, timezone.utc) for _, b in pending}
+        # Create missing buckets as empty rows first (a concurrent flush may create the same
+        # one: the loser skips it), then lock every row and merge into it.
+        empty = BucketSketch()
+        blank = {
+            "count": 0, "total": 0.0, "total_sq": 0.0, "minimum": empty.minimum, "maximum": empty.maximum,
+            "digest": empty.digest.to_bytes(), "distinct_values": empty.distinct.to_bytes(),
+        }
+        rows = [
+            dict(blank, sensor_id=sensor_id, sensor_type=sensor_type, bucket_start=starts[b])
+            for (sensor_id, b), (sensor_type, _) in pending.items()
+        ]
+        insert = dialect_insert(db)
+        if insert is not None:
+            db.execute(insert(SensorSketch.__table__).values(rows).on_conflict_do_nothing(index_elements=KEY))
+        else:
+            for row in rows:  # portable fallback: one savepoint per row
+                try:
+                    with db.begin_nested():
+                        db.add(SensorSketch(**row))
+                except IntegrityError:
+                    continue
+        locked = (
+            db.query(SensorSketch)
+            .filter(
+                SensorSketch.sensor_id.in_({sid for sid, _ in pending}),
+                SensorSketch.bucket_start.in_(list(starts.values())),
+            )
+            .with_for_update()
+            .populate_existing()
+            .all()
+        )
+        existing = {(r.sensor_id, int(_epoch_seconds([r.bucket_start])[0]) // self.size): r for r in locked}
+        for key, (_, values) in pending.items():
+            row = existing[key]
+            BucketSketch.from_row(row).add_many(np.asarray(values)).write_to(row)
+
+    def _restore(self, pending: dict[tuple[str, int], tuple[str, list[float]]]) -> None:
+        with self._lock:
+            for key, (sensor_type, values) in pending.items():
+                self._pending.setdefault(key, (sensor_type, []))[1].extend(values)
+                self._pending_count += len(values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._pending_count = 0
+
+
+def build_sketches(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    sensor_ids: list[str] | None = None,
+    bucket_seconds: int | None = None,
+) -> int:
+    """Rebuild the bucket rows overlapping [start, end) from raw readings; returns rows written."""
+    size = bucket_seconds or get_settings().sketch_bucket_seconds
+    first, last = bucket_start(start, size), end
+    q = db.query(SensorReading.sensor_id, SensorReading.sensor_type, SensorReading.timestamp, SensorReading.value).filter(
+        SensorReading.timestamp >= first, SensorReading.timestamp < last
+    )
+    rs = db.query(SensorSketch).filter(SensorSketch.bucket_start >= first, SensorSketch.bucket_start < last)
+    if sensor_ids:
+        q = q.filter(SensorReading.sensor_id.in_(sensor_ids))
+        rs = rs.filter(SensorSketch.sensor_id.in_(sensor_ids))
+    rows = q.all()
+    rs.delete(synchronize_session=False)
+    if not rows:
+        db.commit()
+        return 0
+
+    import pandas as pd
+
+    ids = np.array([r[0] for r in rows], dtype=object)
+    buckets = _epoch_seconds(r[2] for r in rows) // size
+    values = np.fromiter((r[3] for r in rows), dtype=float, count=len(rows))
+    types = dict(zip(ids, (r[1] for r in rows)))
+    keys = pd.MultiIndex.from_arrays([ids, buckets])
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind="stable")
+    splits = np.flatnonzero(np.diff(codes[order])) + 1
+    for (sensor_id, b), idx in zip(uniques, np.split(order, splits)):
+        row = SensorSketch(
+            sensor_id=sensor_id,
+            sensor_type=types[sensor_id],
+            bucket_start=datetime.fromtimestamp(int(b) * size, timezone.utc),
+        )
+        BucketSketch().add_many(values[idx]).write_to(row)
+        db.add(row)
+    db.commit()
+    return len(uniques)
+
+
+def _sketch_query(db: Session, sensor_id, sensor_type, start, end, bucket_seconds=None):
+    q = db.query(SensorSketch)
+    if sensor_id:
+        q = q.filter(SensorSketch.sensor_id == sensor_id)
+    if sensor_type:
+        q = q.filter(SensorSketch.sensor_type == sensor_type)
+    if start is not None:
+        q = q.filter(SensorSketch.bucket_start >= bucket_start(start, bucket_seconds))
+    if end is not None:
+        q = q.filter(SensorSketch.bucket_start < end)
+    return q
+
+
+def load_sketch(
+    db: Session,
+    sensor_id: str | None = None,
+    sensor_type: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> tuple[BucketSketch, int]:
+    """Merged sketch over the matching buckets, and how many buckets were merged."""
+    merged = BucketSketch()
+    rows = _sketch_query(db, sensor_id, sensor_type, start, end).all()
+    for row in rows:
+        merged.merge(BucketSketch.from_row(row))
+    return merged, len(rows)
+
+
+def load_sketches_by_sensor(
+    db: Session,
+    sensor_type: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> dict[tuple[str, str], BucketSketch]:
+    """Merged sketch per (sensor_type, sensor_id) over the matching buckets."""
+    merged: dict[tuple[str, str], BucketSketch] = defaultdict(BucketSketch)
+    for row in _sketch_query(db, None, sensor_type, start, end).all():
+        merged[(row.sensor_type, row.sensor_id)].merge(BucketSketch.from_row(row))
+    return dict(merged)
+
+
+sketch_recorder = SketchRecorder(flush_interval=get_settings().sketch_flush_interval)
+
+
+def flush_sketches() -> int:
+    """Write buffered sketch values on the primary; the read session may be on a replica."""
+    with SessionLocal() as db:
+        return sketch_recorder.flush(db)
@@ -0,0 +1,121 @@
+"""
+Dashboard snapshot: every dashboard panel from one read of the most recent readings.
+
+The page used to call six endpoints, each re-querying overlapping recent rows. Here the
+newest `window` readings are fetched once into arrays (oldest first) and each panel works
+on a tail slice of them: SPC stats, X-bar and CUSUM series, the sensor heatmap. The
+Pareto of readings per sensor type is an aggregate over all readings, read from the small
+`sensor_latest` table rather than by scanning `sensor_readings`. Panels are returned as
+plain arrays; the page draws them, so no Plotly figure JSON is built or shipped.
+"""
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.metrics import span, timed
+from app.models.latest import SensorLatest
+from app.models.sensor import SensorReading
+from app.services.spc import (
+    ControlLimits,
+    cusum,
+    detect_anomalies_zscore,
+    simple_limits,
+    xbar_r_limits,
+)
+
+
+class Window(NamedTuple):
+    sensor_ids: np.ndarray  # str, oldest first
+    sensor_types: np.ndarray
+    values: np.ndarray  # float64
+
+
+def load_window(db: Session, limit: int) -> Window:
+    rows = (
+        db.query(SensorReading.sensor_id, SensorReading.sensor_type, SensorReading.value)
+        .order_by(SensorReading.timestamp.desc())
+        .limit(limit)
+        .all()[::-1]
+    )
+    return Window(
+        np.array([r[0] for r in rows], dtype=str),
+        np.array([r[1] for r in rows], dtype=str),
+        np.fromiter((r[2] for r in rows), dtype=float, count=len(rows)),
+    )
+
+
+def _limits(limits: ControlLimits) -> dict[str, float]:
+    return {"center": float(limits.center), "ucl": float(limits.ucl), "lcl": float(limits.lcl), "sigma": float(limits.sigma)}
+
+
+def _stats(values: np.ndarray) -> dict[str, Any]:
+    if not len(values):
+        return {"count": 0, "mean": 0.0, "std": 0.0, "min": 0.0, "max": 0.0, "control_limits": None, "anomaly_indices": []}
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "std": float(values.std()) if len(values) > 1 else 0.0,
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "control_limits": _limits(simple_limits(values)),
+        "anomaly_indices": detect_anomalies_zscore(values),
+    }
+
+
+def _heatmap(w: Window) -> dict[str, Any]:
+    """Mean value per (sensor_type, sensor_id), as a types x sensors grid (None where absent)."""
+    sensors, s_codes = np.unique(w.sensor_ids, return_inverse=True)
+    types, t_codes = np.unique(w.sensor_types, return_inverse=True)
+    cells = t_codes * len(sensors) + s_codes
+    count = np.bincount(cells, minlength=len(types) * len(sensors))
+    total = np.bincount(cells, weights=w.values, minlength=len(types) * len(sensors))
+    z = np.full(count.shape, np.nan)
+    np.divide(total, count, out=z, where=count > 0)
+    grid = np.round(z, 4).reshape(len(types), len(sensors)).astype(object)
+    grid[np.isnan(z.reshape(grid.shape))] = None
+    return {"x": sensors.tolist(), "y": types.tolist(), "z": grid.tolist()}
+
+
+def _pareto(db: Session, w: Window) -> dict[str, Any]:
+    rows = db.query(SensorLatest.sensor_type, func.sum(SensorLatest.count)).group_by(SensorLatest.sensor_type).all()
+    if rows:
+        labels, counts = [r[0] for r in rows], [int(r[1]) for r in rows]
+        source = "all"
+    else:  # sensor_latest not built yet (e.g. bulk-loaded data): count the window instead
+        types, counts_arr = np.unique(w.sensor_types, return_counts=True)
+        labels, counts = types.tolist(), counts_arr.tolist()
+        source = "window"
+    order = sorted(range(len(labels)), key=lambda i: -counts[i])[:20]
+    return {"labels": [labels[i] for i in order], "values": [counts[i] for i in order], "source": source}
+
+
+@timed("snapshot.build")
+def build_snapshot(
+    db: Session,
+    window: int = 500,
+    stats_limit: int = 200,
+    chart_limit: int = 100,
+    subgroup_size: int = 5,
+) -> dict[str, Any]:
+    """All dashboard panels; each takes the newest `*_limit` readings of one shared window."""
+    with span("snapshot.read"):
+        w = load_window(db, max(window, stats_limit, chart_limit))
+    chart = w.values[-chart_limit:]
+    heat = Window(*(a[-window:] for a in w))
+    xbar = xbar_r_limits(chart, subgroup_size)[0] if len(chart) else None
+    return {
+        "generated_at": datetime.now(timezone.utc),
+        "window": len(w.values),
+        "stats": _stats(w.values[-stats_limit:]),
+        "series": {
+            "labels": w.sensor_ids[-chart_limit:].tolist(),
+            "values": chart.tolist(),
+            "xbar_limits": _limits(xbar) if xbar is not None else None,
+            "cusum": cusum(chart) if len(chart) else [],
+        },
+        "pareto": _pareto(db, w),
+        "heatmap": _heatmap(heat),
+    }
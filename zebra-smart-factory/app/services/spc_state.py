@@ -0,0 +1,301 @@
+"""
+Live per-sensor SPC state (EWMA, I-MR, rolling window), updated incrementally on ingest.
+
+With several workers each process keeps its own registry; readings ingested by one worker
+are fanned out to the others on the state backend's `readings` channel and applied to the
+sensors they already track. Reading ids de-duplicate echoes and rows already seeded.
+
+Readings are applied in event-time order: a reading up to `lateness` seconds behind the
+newest one rewinds the sensor's state to a checkpoint and replays the recent readings in
+order; anything later is ignored here and the sensor is reseeded from the DB instead
+(`invalidate`, see app.services.lateness).
+"""
+import bisect
+import copy
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.state import RecentIds, get_state_backend
+from app.models.sensor import SensorReading
+from app.services.baselines import baseline_cache
+from app.services.spc import EWMAState, MovingRangeState, RollingWindow
+
+
+def _epoch(ts: datetime | None) -> float:
+    if ts is None:
+        return datetime.now(timezone.utc).timestamp()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class StreamingSPC:
+    """
+    EWMA, I-MR and rolling-window state for one sensor.
+    Without a baseline, the EWMA center/sigma are provisional until `warmup` samples have
+    been seen: each of those updates re-derives them from the samples so far (bounded work).
+    """
+
+    def __init__(
+        self,
+        center: float,
+        sigma: float,
+        lam: float = 0.2,
+        window: int = 50,
+        baseline_version: int | None = None,
+        warmup: int = 20,
+        lateness: float = 0.0,
+    ):
+        self.ewma = EWMAState(center, sigma, lam)
+        self.mr = MovingRangeState()
+        self.rolling = RollingWindow(size=window)
+        self.baseline_version = baseline_version
+        self.last_value: float | None = None
+        self.last_ts: float | None = None
+        self._warmup: list[float] | None = [] if baseline_version is None and warmup > 0 else None
+        self._warmup_size = warmup
+        self.lateness = lateness
+        # State as of `lateness` behind the newest reading, plus the (ts, value)s applied since.
+        self._checkpoint: StreamingSPC | None = None
+        self._recent: list[tuple[float, float]] = []
+        if lateness > 0:
+            self._checkpoint = copy.deepcopy(self)
+
+    _CORE = ("ewma", "mr", "rolling", "last_value", "last_ts", "_warmup")
+
+    def update(self, value: float, ts: float) -> bool:
+        """Apply one reading; False when it is more than `lateness` behind and was ignored."""
+        if self.last_ts is not None and ts < self.last_ts:
+            if ts < self.last_ts - self.lateness:
+                return False
+            self._correct(value, ts)
+            return True
+        self._apply(value, ts)
+        if self._checkpoint is not None:
+            self._recent.append((ts, value))
+            self._advance()
+        return True
+
+    def _correct(self, value: float, ts: float) -> None:
+        """Late reading inside the window: replay the checkpoint with it in event-time order."""
+        bisect.insort(self._recent, (ts, value))
+        replay = copy.deepcopy(self._checkpoint)
+        for t, v in self._recent:
+            replay._apply(v, t)
+        for name in self._CORE:
+            setattr(self, name, getattr(replay, name))
+
+    def _advance(self) -> None:
+        horizon = self.last_ts - self.lateness
+        i = 0
+        while i < len(self._recent) and self._recent[i][0] < horizon:
+            self._checkpoint._apply(self._recent[i][1], self._recent[i][0])
+            i += 1
+        if i:
+            del self._recent[:i]
+
+    def _apply(self, value: float, ts: float) -> None:
+        self.ewma.update(value)
+        self.mr.update(value)
+        self.rolling.update(value, ts)
+        self.last_value = value
+        self.last_ts = ts
+        if self._warmup is not None:
+            self._warmup.append(value)
+            arr = np.asarray(self._warmup)
+            self.ewma = EWMAState(float(arr.mean()), float(arr.std()), self.ewma.lam, self.ewma.width)
+            for v in self._warmup:
+                self.ewma.update(v)
+            if len(self._warmup) >= self._warmup_size:
+                self._warmup = None
+
+    @property
+    def warming_up(self) -> bool:
+        return self._warmup is not None
+
+    def snapshot(self) -> dict[str, Any]:
+        ewma_lim = self.ewma.limits
+        i_lim, mr_lim = self.mr.limits()
+        return {
+            "count": self.mr.n,
+            "last_value": self.last_value,
+            "last_timestamp": datetime.fromtimestamp(self.last_ts, timezone.utc).isoformat() if self.last_ts else None,
+            "limits_source": "baseline" if self.baseline_version is not None else "window",
+            "baseline_version": self.baseline_version,
+            "ewma": {
+                "value": self.ewma.z,
+                "center": ewma_lim.center,
+                "ucl": ewma_lim.ucl,
+                "lcl": ewma_lim.lcl,
+                "lambda": self.ewma.lam,
+                "out_of_control": self.ewma.out_of_control,
+            },
+            "imr": {
+                "moving_range": self.mr.mr,
+                "mr_bar": self.mr.mr_bar,
+                "individuals": i_lim._asdict(),
+                "moving_range_limits": mr_lim._asdict(),
+            },
+            "rolling": {
+                "window": self.rolling.size,
+                "n": self.rolling.n,
+                "mean": self.rolling.mean,
+                "std": self.rolling.std,
+                "p5": self.rolling.percentile(5),
+                "p50": self.rolling.percentile(50),
+                "p95": self.rolling.percentile(95),
+            },
+        }
+
+
+READINGS_CHANNEL = "readings"
+RESEED_CHANNEL = "spc.reseed"
+PUBLISH_CHUNK = 100
+
+
+class SPCStateRegistry:
+    """
+    StreamingSPC per sensor, seeded from the last `seed_size` readings on first use (cold
+    start) and then updated in O(1) per ingested reading. EWMA center/sigma come from the
+    active baseline when there is one; a new baseline version triggers a reseed.
+    """
+
+    def __init__(
+        self,
+        seed_size: int = 500,
+        window: int = 50,
+        lam: float = 0.2,
+        warmup: int = 20,
+        max_sensors: int = 10_000,
+        max_seen: int = 100_000,
+        lateness: float | None = None,
+    ):
+        self.seed_size = seed_size
+        self.lateness = get_settings().late_allowed_seconds if lateness is None else lateness
+        self.warmup = warmup
+        self.window = window
+        self.lam = lam
+        self.max_sensors = max_sensors
+        self._states: OrderedDict[str, StreamingSPC] = OrderedDict()
+        self._seen = RecentIds(max_seen)
+        self._lock = threading.RLock()
+        self._subscribed = None
+
+    def observe(
+        self,
+        db: Session,
+        sensor_id: str,
+        value: float,
+        ts: datetime | None,
+        reading_id: int | None = None,
+    ) -> StreamingSPC:
+        """Ingest hook, called after the reading is committed."""
+        self._subscribe()
+        with self._lock:
+            state = self._states.get(sensor_id)
+            if state is None or self._stale(db, sensor_id, state):
+                return self._seed(db, sensor_id)  # the seed query already includes this reading
+            if reading_id is not None and not self._seen.add(reading_id):
+                return state
+            state.update(value, _epoch(ts))
+            self._states.move_to_end(sensor_id)
+            return state
+
+    def publish(self, readings: list[SensorReading]) -> None:
+        """Fan committed readings out to the other workers (no-op on a single-process backend)."""
+        backend = get_state_backend()
+        if not backend.shared:
+            return
+        rows = [[r.id, r.sensor_id, r.value, _epoch(r.timestamp)] for r in readings]
+        for i in range(0, len(rows), PUBLISH_CHUNK):  # keeps payloads under NOTIFY's 8 kB limit
+            backend.publish(READINGS_CHANNEL, json.dumps(rows[i : i + PUBLISH_CHUNK]))
+
+    def apply(self, message: str) -> None:
+        """Subscriber: update tracked sensors with readings ingested elsewhere."""
+        with self._lock:
+            for reading_id, sensor_id, value, ts in json.loads(message):
+                state = self._states.get(sensor_id)
+                if state is not None and self._seen.add(reading_id):
+                    state.update(value, ts)
+
+    def invalidate(self, sensor_ids: set[str]) -> None:
+        """Drop these sensors' state here and in every worker; the next use reseeds from the DB."""
+        with self._lock:
+            for sensor_id in sensor_ids:
+                self._states.pop(sensor_id, None)
+        backend = get_state_backend()
+        if backend.shared and sensor_ids:
+            backend.publish(RESEED_CHANNEL, json.dumps(sorted(sensor_ids)))
+
+    def _apply_reseed(self, message: str) -> None:
+        with self._lock:
+            for sensor_id in json.loads(message):
+                self._states.pop(sensor_id, None)
+
+    def get(self, db: Session, sensor_id: str) -> StreamingSPC | None:
+        self._subscribe()
+        with self._lock:
+            state = self._states.get(sensor_id)
+            if state is None or self._stale(db, sensor_id, state):
+                state = self._seed(db, sensor_id)
+            return state if state.mr.n else None
+
+    def reset(self, sensor_id: str | None = None) -> None:
+        with self._lock:
+            if sensor_id is None:
+                self._states.clear()
+                self._seen.clear()
+            else:
+                self._states.pop(sensor_id, None)
+
+    def _subscribe(self) -> None:
+        backend = get_state_backend()
+        if self._subscribed is not backend:
+            with self._lock:
+                if self._subscribed is not backend:
+                    if backend.shared:
+                        backend.subscribe(READINGS_CHANNEL, self.apply)
+                        backend.subscribe(RESEED_CHANNEL, self._apply_reseed)
+                    self._subscribed = backend
+
+    def _stale(self, db: Session, sensor_id: str, state: StreamingSPC) -> bool:
+        baseline = baseline_cache.get(db, sensor_id)
+        return (baseline.version if baseline else None) != state.baseline_version
+
+    def _seed(self, db: Session, sensor_id: str) -> StreamingSPC:
+        rows = (
+            db.query(SensorReading.value, SensorReading.timestamp, SensorReading.id)
+            .filter(SensorReading.sensor_id == sensor_id)
+            .order_by(SensorReading.timestamp.desc())
+            .limit(self.seed_size)
+            .all()
+        )[::-1]
+        values = np.array([r[0] for r in rows], dtype=float)
+        baseline = baseline_cache.get(db, sensor_id)
+        if baseline is not None:
+            center, sigma, version = baseline.limits.center, baseline.limits.sigma, baseline.version
+        else:
+            center = float(values.mean()) if len(values) else 0.0
+            sigma = float(values.std()) if len(values) > 1 else 0.0
+            version = None
+        # A long enough history already gives stable center/sigma: no warm-up needed.
+        warmup = self.warmup if len(rows) < self.warmup else 0
+        state = StreamingSPC(center, sigma, self.lam, self.window, version, warmup, self.lateness)
+        for value, ts, reading_id in rows:
+            self._seen.add(reading_id)
+            state.update(value, _epoch(ts))
+        self._states[sensor_id] = state
+        self._states.move_to_end(sensor_id)
+        while len(self._states) > self.max_sensors:
+            self._states.popitem(last=False)
+        return state
+
+
+spc_state = SPCStateRegistry()
@@ -0,0 +1,357 @@
+"""
+Maintenance summary service: stale-while-revalidate per scope, fingerprint cache,
+single-flight generation, background refresh.
+
+A request gets the last summary computed for its scope (sensor, limit, window) without
+touching the database or the LLM. When that summary is older than `stale_after`, the scope is
+revalidated in a background task: its context is rebuilt and, if the anomaly picture
+changed, a new summary is generated for the next request. A scope's first request builds the
+context, but it does not wait for the LLM either: it gets the rule-based summary, marked
+`pending`, while the LLM summary is generated in the background. `refresh` computes inline.
+
+Summaries are cached by MaintenanceContext.fingerprint() (which sensors are present and how
+many anomalies each has), so the LLM is only called again when the anomaly picture changes
+or the entry expires. Concurrent requests for the same fingerprint share one completion.
+A background task re-computes the recently requested summaries on a schedule, and early
+when ingest reports a reading outside the last known limits for its sensor.
+
+Cached results, the latest result per scope, generation locks, requested scopes and learned limits live in the state
+backend (app.core.state), so with a shared backend every worker reuses one completion per
+fingerprint and only the elected leader runs the refresher.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.state import WORKER_ID, StateBackend, get_state_backend
+from app.services.llm import LLMClient, get_llm_client
+from app.services.maintenance_agent import MaintenanceContext, build_context, summarize
+
+logger = logging.getLogger(__name__)
+
+SummaryKey = tuple[str | None, int, int | None]  # (sensor_id, limit, window_minutes)
+DEFAULT_KEY: SummaryKey = (None, 100, None)  # what the dashboard asks for
+
+CACHE_PREFIX = "summary:"
+LATEST_PREFIX = "summary-latest:"
+LOCK_PREFIX = "summary-lock:"
+KEYS_KEY = "summary-keys"
+LIMITS_KEY = "summary-limits"
+LEADER_KEY = "summary-refresh-leader"
+WAKE_CHANNEL = "summary.wake"
+
+
+class SummaryService:
+    def __init__(
+        self,
+        llm: LLMClient | None = None,
+        ttl: float = 600.0,
+        refresh_interval: float = 60.0,
+        max_keys: int = 32,
+        key_ttl: float = 3600.0,
+        lock_ttl: float = 120.0,
+        stale_after: float = 30.0,
+        backend: StateBackend | None = None,
+        session_factory: Callable[[], Session] | None = None,
+    ):
+        self._llm = llm
+        self._llm_resolved = llm is not None
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.max_keys = max_keys
+        self.key_ttl = key_ttl
+        self.lock_ttl = lock_ttl
+        self.stale_after = stale_after
+        self._backend = backend
+        self._session_factory = session_factory
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._revalidating: dict[SummaryKey, asyncio.Task] = {}
+        self._building: set[asyncio.Future] = set()
+        self._keys: OrderedDict[SummaryKey, float] = OrderedDict({DEFAULT_KEY: time.time()})
+        self._keys_shared_at: dict[SummaryKey, float] = {}
+        self._limits: dict[str, tuple[float, float]] = {}
+        self._limits_loaded_at = 0.0
+        self._last_wake = 0.0
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_settings(cls) -> "SummaryService":
+        s = get_settings()
+        return cls(ttl=s.summary_cache_ttl, refresh_interval=s.summary_refresh_interval, stale_after=s.summary_stale_after)
+
+    @property
+    def llm(self) -> LLMClient | None:
+        if not self._llm_resolved:
+            self._llm = get_llm_client()
+            self._llm_resolved = True
+        return self._llm
+
+    @llm.setter
+    def llm(self, client: LLMClient | None) -> None:
+        self._llm = client
+        self._llm_resolved = True
+
+    @property
+    def backend(self) -> StateBackend:
+        return self._backend or get_state_backend()
+
+    async def get(
+        self,
+        sensor_id: str | None = None,
+        limit: int = 100,
+        window_minutes: int | None = None,
+        refresh: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Summary for the given scope: the last one computed, revalidated in the background when stale.
+
+        The context is built on a session of its own (as the refresher does), never on the
+        caller's request session, so a client disconnect cannot close it under the worker thread.
+        """
+        key = (sensor_id, limit, window_minutes)
+        self._touch(key)
+        if not refresh:
+            latest = self._latest(key)
+            if latest is not None:
+                if time.time() - latest["checked_at"] >= self.stale_after:
+                    self._revalidate(key)
+                return latest["result"] | {"cached": True}
+        ctx = await self._context(key)
+        if not refresh and self.llm is not None and self._lookup(ctx.fingerprint()) is None:
+            self._revalidate(key, ctx)
+            return await summarize(ctx, None) | {"fingerprint": ctx.fingerprint(), "cached": False, "pending": True}
+        result = await self._summary_for(ctx, force=refresh)
+        self._store_latest(key, result)
+        return result
+
+    def observe(self, sensor_id: str, value: float) -> None:
+        """Ingest hook: wake the refresher when a reading breaks its sensor's last known limits."""
+        if self.backend.shared and time.monotonic() - self._limits_loaded_at > 30.0:
+            self._limits_loaded_at = time.monotonic()
+            raw = self.backend.get(LIMITS_KEY)
+            if raw:
+                self._limits.update({k: tuple(v) for k, v in json.loads(raw).items()})
+        limits = self._limits.get(sensor_id)
+        if limits is None or limits[0] <= value <= limits[1]:
+            return
+        now = time.monotonic()
+        if now - self._last_wake >= 1.0:  # a drifting sensor should not flood the channel
+            self._last_wake = now
+            self.backend.publish(WAKE_CHANNEL, sensor_id)
+
+    def clear(self) -> None:
+        """Forget process-local state (cached results expire in the backend on their own)."""
+        self._limits.clear()
+        self._keys_shared_at.clear()
+        self._keys = OrderedDict({DEFAULT_KEY: time.time()})
+        for task in self._revalidating.values():
+            task.cancel()
+        self._revalidating.clear()
+
+    async def refresh_once(self, session_factory: Callable[[], Session] | None = None) -> int:
+        """Recompute every recently requested summary; returns how many were regenerated."""
+        keys = self._requested_keys()
+        regenerated = 0
+        for key in keys:
+            ctx = await self._context(key, session_factory)
+            if self._lookup(ctx.fingerprint()) is None:
+                regenerated += 1
+            await self._refresh_key(key, ctx)
+        return regenerated
+
+    async def wait_revalidated(self) -> None:
+        """Wait for the background revalidations started so far (tests, shutdown)."""
+        tasks = list(self._revalidating.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        self._session_factory = session_factory
+        if self._task is not None or self.refresh_interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        wake = self._wake
+        # Subscriber callbacks may arrive on a backend thread.
+        self.backend.subscribe(WAKE_CHANNEL, lambda _msg: loop.call_soon_threadsafe(wake.set))
+        self._task = loop.create_task(self._run(session_factory))
+
+    async def stop(self) -> None:
+        for pending in list(self._revalidating.values()):
+            pending.cancel()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # Cancelling does not stop a context build already on a worker thread: let it release its session.
+        await asyncio.gather(*self._building, return_exceptions=True)
+
+    async def _run(self, session_factory: Callable[[], Session]) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if self._is_leader():
+                    await self.refresh_once(session_factory)
+            except Exception:
+                logger.exception("maintenance summary refresh failed")
+
+    def _revalidate(self, key: SummaryKey, ctx: MaintenanceContext | None = None) -> None:
+        """Recompute a scope in the background, once at a time per scope."""
+        if key in self._revalidating:
+            return
+        task = asyncio.ensure_future(self._refresh_key(key, ctx, log_errors=True))
+        self._revalidating[key] = task
+        task.add_done_callback(lambda _t, key=key: self._revalidating.pop(key, None))
+
+    async def _refresh_key(
+        self, key: SummaryKey, ctx: MaintenanceContext | None = None, log_errors: bool = False
+    ) -> None:
+        try:
+            if ctx is None:
+                ctx = await self._context(key)
+            self._store_latest(key, await self._summary_for(ctx, force=False))
+        except Exception:
+            if not log_errors:
+                raise
+            logger.exception("maintenance summary revalidation failed for %s", key)
+
+    async def _context(self, key: SummaryKey, session_factory: Callable[[], Session] | None = None) -> MaintenanceContext:
+        build = asyncio.ensure_future(asyncio.to_thread(self._build_context, key, session_factory))
+        self._building.add(build)
+        build.add_done_callback(self._building.discard)
+        return await asyncio.shield(build)
+
+    def _build_context(self, key: SummaryKey, session_factory: Callable[[], Session] | None = None) -> MaintenanceContext:
+        if session_factory is None:
+            session_factory = self._session_factory
+        if session_factory is None:
+            from app.core.database import AnalyticsSession
+
+            session_factory = AnalyticsSession
+        db = session_factory()
+        try:
+            return build_context(db, *key)
+        finally:
+            db.close()
+
+    def _latest(self, key: SummaryKey) -> dict[str, Any] | None:
+        raw = self.backend.get(LATEST_PREFIX + json.dumps(list(key)))
+        return json.loads(raw) if raw is not None else None
+
+    def _store_latest(self, key: SummaryKey, result: dict[str, Any]) -> None:
+        entry = {"result": {k: v for k, v in result.items() if k != "cached"}, "checked_at": time.time()}
+        self.backend.set(LATEST_PREFIX + json.dumps(list(key)), json.dumps(entry).encode(), ttl=self.key_ttl)
+
+    async def _summary_for(self, ctx: MaintenanceContext, force: bool) -> dict[str, Any]:
+        self._remember_limits(ctx)
+        fp = ctx.fingerprint()
+        if not force:
+            hit = self._lookup(fp)
+            if hit is not None:
+                return hit | {"cached": True}
+        task = self._inflight.get(fp)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(ctx, fp, force))
+            self._inflight[fp] = task
+            task.add_done_callback(lambda _t, fp=fp: self._inflight.pop(fp, None))
+        result = await asyncio.shield(task)
+        return result | {"cached": False}
+
+    async def _generate(self, ctx: MaintenanceContext, fp: str, force: bool = False) -> dict[str, Any]:
+        backend = self.backend
+        # A forced refresh only accepts results generated after it was requested.
+        since = datetime.now(timezone.utc).isoformat() if force else ""
+        lock = LOCK_PREFIX + fp
+        deadline = time.monotonic() + self.lock_ttl
+        # Another worker holds the lock: wait for its result instead of calling the LLM again.
+        while not backend.set_if_absent(lock, WORKER_ID.encode(), ttl=self.lock_ttl):
+            hit = self._lookup(fp)
+            if hit is not None and hit["generated_at"] >= since:
+                return hit
+            if time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.05)
+        try:
+            hit = self._lookup(fp)  # the previous holder may have just finished
+            if hit is not None and hit["generated_at"] >= since:
+                return hit
+            result = await summarize(ctx, self.llm)
+            result = result | {"fingerprint": fp, "generated_at": datetime.now(timezone.utc).isoformat()}
+            backend.set(CACHE_PREFIX + fp, json.dumps(result).encode(), ttl=self.ttl)
+        finally:
+            backend.delete(lock)
+        return result
+
+    def _lookup(self, fp: str) -> dict[str, Any] | None:
+        raw = self.backend.get(CACHE_PREFIX + fp)
+        return json.loads(raw) if raw is not None else None
+
+    def _touch(self, key: SummaryKey) -> None:
+        now = time.time()
+        self._keys[key] = now
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+        # Share the scope with the refresh leader, at most once a minute per scope.
+        if self.backend.shared and now - self._keys_shared_at.get(key, 0.0) > 60.0:
+            self._keys_shared_at[key] = now
+            shared = self._shared_keys()
+            shared[key] = now
+            self.backend.set(KEYS_KEY, json.dumps([[list(k), t] for k, t in shared.items()]).encode())
+
+    def _shared_keys(self) -> dict[SummaryKey, float]:
+        raw = self.backend.get(KEYS_KEY)
+        return {tuple(k): t for k, t in json.loads(raw)} if raw else {}
+
+    def _requested_keys(self) -> list[SummaryKey]:
+        now = time.time()
+        seen = dict(self._keys)
+        if self.backend.shared:
+            for key, t in self._shared_keys().items():
+                seen[key] = max(t, seen.get(key, 0.0))
+        recent = sorted(
+            (key for key, t in seen.items() if key == DEFAULT_KEY or now - t <= self.key_ttl),
+            key=lambda k: seen[k],
+            reverse=True,
+        )
+        return recent[: self.max_keys]
+
+    def _is_leader(self) -> bool:
+        """Only one worker refreshes; the lease is renewed every cycle and expires with it."""
+        backend = self.backend
+        if not backend.shared:
+            return True
+        lease = self.refresh_interval * 3
+        me = WORKER_ID.encode()
+        if backend.set_if_absent(LEADER_KEY, me, ttl=lease) or backend.get(LEADER_KEY) == me:
+            backend.set(LEADER_KEY, me, ttl=lease)
+            return True
+        return False
+
+    def _remember_limits(self, ctx: MaintenanceContext) -> None:
+        changed = False
+        for s in ctx.sensors:
+            if s["ucl"] > s["lcl"]:
+                limits = (s["lcl"], s["ucl"])
+                changed |= self._limits.get(s["sensor_id"]) != limits
+                self._limits[s["sensor_id"]] = limits
+        if changed and self.backend.shared:
+            self.backend.set(LIMITS_KEY, json.dumps(self._limits).encode())
+
+
+summary_service = SummaryService.from_settings()
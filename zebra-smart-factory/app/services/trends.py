@@ -0,0 +1,180 @@
+"""
+Predictive maintenance: per-sensor drift trends and time to a control limit.
+
+Hourly means over the last `window_hours` (rollups or raw rows, see
+app.services.retention.bucket_rows) are pivoted into an S x H matrix. Every sensor's trend is
+then fitted at once, using closed-form weighted least squares over the rows of that matrix:
+
+- weights are the readings per hour (an hourly mean's variance is σ²/n), and empty hours weigh 0;
+- robust fits use iteratively reweighted least squares with Tukey's bisquare on residuals
+  scaled by their MAD, so a few outlier hours do not tilt the line;
+- two models are fitted, linear `y = a + b·t` and exponential `y = exp(a + b·t)` (the same
+  linear fit on log y, for sensors whose hourly means are all positive). Each sensor keeps
+  the one with the lower weighted squared error in the original units.
+
+The time to limit is where the fitted curve crosses the sensor's UCL (rising) or LCL (falling).
+Limits are the active Phase I baseline, else the sensor's lifetime mean ± 3σ from
+`sensor_latest`. A breach is only predicted when the slope is significant (|t| ≥ `min_t`) and
+the crossing falls within `horizon_hours`.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.metrics import timed
+from app.models.latest import SensorLatest
+from app.services.baselines import baseline_cache
+from app.services.retention import HOUR, _floor, _utc, bucket_rows
+
+BISQUARE = 4.685
+
+
+class TrendFit(NamedTuple):
+    intercept: np.ndarray  # value at t = 0 (now), in model space
+    slope: np.ndarray  # per hour, in model space
+    t_stat: np.ndarray
+    r2: np.ndarray
+    sse: np.ndarray  # weighted squared error in model space
+    points: np.ndarray  # hours with data
+
+
+def fit_trends(t: np.ndarray, y: np.ndarray, w: np.ndarray, robust_iterations: int = 3) -> TrendFit:
+    """Weighted (and optionally robust) line fits of every row of `y` (S x H) against `t` (H)."""
+    w = np.where(np.isfinite(y), w, 0.0)
+    y = np.where(w > 0, y, 0.0)
+    base = w.copy()
+    for iteration in range(robust_iterations + 1):
+        sw = w.sum(axis=1)
+        safe = np.where(sw > 0, sw, 1.0)
+        t_bar = (w * t).sum(axis=1) / safe
+        y_bar = (w * y).sum(axis=1) / safe
+        dt = t - t_bar[:, None]
+        sxx = (w * dt * dt).sum(axis=1)
+        slope = np.divide((w * dt * (y - y_bar[:, None])).sum(axis=1), sxx, out=np.zeros_like(sxx), where=sxx > 0)
+        intercept = y_bar - slope * t_bar
+        resid = y - intercept[:, None] - slope[:, None] * t
+        if iteration == robust_iterations:
+            break
+        abs_r = np.where(base > 0, np.abs(resid), np.nan)
+        scale = 1.4826 * np.nanmedian(np.where(np.isnan(abs_r).all(axis=1, keepdims=True), 0.0, abs_r), axis=1)
+        u = resid / (BISQUARE * np.where(scale > 0, scale, np.inf))[:, None]
+        w = base * np.where(np.abs(u) < 1, (1 - u * u) ** 2, 0.0)
+
+    points = (base > 0).sum(axis=1)
+    sse = (w * resid * resid).sum(axis=1)
+    sst = (w * (y - y_bar[:, None]) ** 2).sum(axis=1)
+    dof = np.maximum(points - 2, 1)
+    se = np.sqrt(np.divide(sse / dof, sxx, out=np.full_like(sxx, np.inf), where=sxx > 0))
+    t_stat = np.divide(slope, se, out=np.zeros_like(slope), where=se > 0)
+    t_stat = np.where((se == 0) & (slope != 0), np.copysign(np.inf, slope), t_stat)
+    r2 = np.divide(sst - sse, sst, out=np.zeros_like(sst), where=sst > 0)
+    return TrendFit(intercept, slope, t_stat, r2, sse, points)
+
+
+def hours_to_limit(
+    model: np.ndarray, intercept: np.ndarray, slope: np.ndarray, ucl: np.ndarray, lcl: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Hours from now until each fitted curve crosses the limit it is heading for (inf = never), and which one."""
+    exp = model == "exponential"
+    rising = slope > 0
+    limit = np.where(rising, ucl, lcl)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        target = np.where(exp, np.log(np.where(limit > 0, limit, np.nan)), limit)
+        hours = (target - intercept) / slope
+    now = np.where(exp, np.exp(intercept), intercept)
+    beyond = np.where(rising, now >= ucl, now <= lcl)
+    hours = np.where(beyond, 0.0, hours)
+    hours = np.where(np.isfinite(hours) & (hours >= 0) & (slope != 0), hours, np.inf)
+    return hours, np.where(rising, "ucl", "lcl")
+
+
+def _limits(db: Session, sensor_ids: list[str]) -> dict[str, tuple[str | None, float | None, float | None, str]]:
+    """sensor_id -> (sensor_type, ucl, lcl, source)."""
+    baselines = baseline_cache.all(db)
+    out = {}
+    for row in db.query(SensorLatest).filter(SensorLatest.sensor_id.in_(sensor_ids)).all():
+        b = baselines.get(row.sensor_id)
+        if b is not None:
+            out[row.sensor_id] = (row.sensor_type, b.limits.ucl, b.limits.lcl, "baseline")
+        elif row.count > 1:
+            sigma = float(np.sqrt(row.m2 / (row.count - 1)))
+            out[row.sensor_id] = (row.sensor_type, row.mean + 3 * sigma, row.mean - 3 * sigma, "lifetime")
+    for sensor_id in sensor_ids:
+        if sensor_id not in out and sensor_id in baselines:
+            b = baselines[sensor_id]
+            out[sensor_id] = (None, b.limits.ucl, b.limits.lcl, "baseline")
+    return out
+
+
+@timed("trends.forecast")
+def forecast_breaches(
+    db: Session,
+    sensor_id: str | None = None,
+    window_hours: int = 48,
+    horizon_hours: float = 168.0,
+    min_points: int = 6,
+    min_t: float = 3.0,
+    now: datetime | None = None,
+) -> list[dict[str, Any]]:
+    """Per-sensor trend and predicted time to breach, soonest first (no predicted breach last)."""
+    now = _utc(now or datetime.now(timezone.utc))
+    start = _floor(now - timedelta(hours=window_hours), HOUR)
+    rows = bucket_rows(db, HOUR, start, now, sensor_id=sensor_id)
+    if not rows:
+        return []
+    sensors, codes = np.unique([r["sensor_id"] for r in rows], return_inverse=True)
+    hours = int((now - start).total_seconds() // HOUR) + 1
+    cols = np.array([int((_utc(r["bucket_start"]) - start).total_seconds() // HOUR) for r in rows])
+    y = np.full((len(sensors), hours), np.nan)
+    w = np.zeros((len(sensors), hours))
+    counts = np.array([r["count"] for r in rows], dtype=float)
+    y[codes, cols] = np.array([r["total"] for r in rows], dtype=float) / counts
+    w[codes, cols] = counts
+    t = (np.arange(hours) * HOUR + HOUR / 2 - (now - start).total_seconds()) / HOUR  # bucket midpoints, hours before now
+
+    linear = fit_trends(t, y, w)
+    positive = np.where(w > 0, y > 0, True).all(axis=1)
+    log = fit_trends(t, np.log(np.where(w > 0, np.where(y > 0, y, 1.0), 1.0)), np.where(positive[:, None], w, 0.0))
+    # Compare both models by weighted squared error in the original units.
+    mask = w > 0
+    fitted_exp = np.exp(log.intercept[:, None] + log.slope[:, None] * t)
+    sse_exp = (w * np.where(mask, y - fitted_exp, 0.0) ** 2).sum(axis=1)
+    use_exp = positive & (log.points >= min_points) & (sse_exp < linear.sse * 0.9)
+    model = np.where(use_exp, "exponential", "linear")
+    pick = lambda a, b: np.where(use_exp, b, a)  # noqa: E731
+    intercept, slope = pick(linear.intercept, log.intercept), pick(linear.slope, log.slope)
+    t_stat, r2 = pick(linear.t_stat, log.t_stat), pick(linear.r2, log.r2)
+
+    limits = _limits(db, list(sensors))
+    ucl = np.array([limits.get(s, (None, np.nan, np.nan, ""))[1] for s in sensors], dtype=float)
+    lcl = np.array([limits.get(s, (None, np.nan, np.nan, ""))[2] for s in sensors], dtype=float)
+    eta, side = hours_to_limit(model, intercept, slope, ucl, lcl)
+    current = np.where(use_exp, np.exp(intercept), intercept)
+    slope_units = np.where(use_exp, current * slope, slope)  # d/dt of the fit at t = 0
+    predicted = (np.abs(t_stat) >= min_t) & (linear.points >= min_points) & (eta <= horizon_hours)
+
+    out = []
+    for i, s in enumerate(sensors):
+        if linear.points[i] < min_points:
+            continue
+        stype, hi, lo, source = limits.get(s, (None, None, None, None))
+        out.append({
+            "sensor_id": str(s),
+            "sensor_type": stype,
+            "model": str(model[i]),
+            "current": float(current[i]),
+            "slope_per_hour": float(slope_units[i]),
+            "t_stat": float(np.clip(t_stat[i], -1e9, 1e9)),
+            "r2": float(r2[i]),
+            "points": int(linear.points[i]),
+            "ucl": hi,
+            "lcl": lo,
+            "limits_source": source,
+            "limit": str(side[i]) if predicted[i] else None,
+            "hours_to_breach": float(eta[i]) if predicted[i] else None,
+            "breach_at": now + timedelta(hours=float(eta[i])) if predicted[i] else None,
+        })
+    out.sort(key=lambda f: (f["hours_to_breach"] is None, f["hours_to_breach"] or 0.0, -abs(f["t_stat"])))
+    return out
@@ -0,0 +1,459 @@
+"""
+Write-ahead ingest log: readings are acknowledged once they are on local disk and loaded into
+the database in the background.
+
+With INGEST_WAL_DIR set, the ingest endpoints append each request's readings as one record and
+answer 202 once that record is fsync'd. fsyncs are batched (group commit): appends arriving
+within `fsync_interval` share one fsync, so ingest latency is bounded by the local disk rather
+than by database commits. `WalConsumer` drains the log into the database in bulk through the
+normal ingest path (dedup, SPC fan-out) and checkpoints its position after each commit. After
+a restart it replays from the checkpoint; a database outage only makes the log grow, up to
+`max_bytes` (beyond that ingest answers 503).
+
+Layout: one `slot-N/` directory per worker process, claimed with an exclusive file lock, so a
+restarted worker takes over an orphaned slot and replays it. Slots that no worker opens again
+(after a scale-down, or a rolling restart where old and new workers overlapped) are found by
+the consumer at startup and every `orphan_interval`: it locks each one it can, drains it and
+deletes it. A slot holds segments
+`000000000001.wal`, ... rotated at `segment_bytes`, plus `checkpoint.json`. A record is
+`<length u32><crc32 u32><JSON list of readings>`; a torn record at the tail (crash mid-write)
+fails its check and is truncated on open.
+
+Replays are idempotent. A reading without a device timestamp is stamped with its receive time,
+and one without a message id and timestamp gets a message id derived from its log position,
+so every replayed reading carries a stable dedup key.
+"""
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.metrics import registry, timed
+from app.schemas.telemetry import TelemetryCreate
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<II")
+CHECKPOINT = "checkpoint.json"
+
+WAL_BACKLOG = registry.gauge("ingest_wal_backlog_bytes", "Bytes in write-ahead log segments not yet checkpointed")
+WAL_FSYNCS = registry.counter("ingest_wal_fsyncs_total", "fsyncs of the write-ahead log (one per group commit)")
+
+
+class WalFullError(Exception):
+    """The log reached `max_bytes`: the database has been unreachable for too long."""
+
+
+class Position(NamedTuple):
+    segment: int
+    offset: int
+
+
+class IngestLog:
+    def __init__(
+        self,
+        directory: str | Path,
+        segment_bytes: int = 64 << 20,
+        fsync_interval: float = 0.002,
+        max_bytes: int = 1 << 30,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self._lock_fd: int | None = None
+        self._cond = threading.Condition()
+        self._checkpoint = self._load_checkpoint()
+        segments = self.segments()
+        self._segment = segments[-1] if segments else max(self._checkpoint.segment, 1)
+        self._recover(self._path(self._segment))
+        self._file = open(self._path(self._segment), "ab")
+        self._bytes = sum(self._path(s).stat().st_size for s in self.segments())
+        self._drop_consumed()  # a crash between checkpoint and cleanup leaves some behind
+        self._written = self._synced = 0  # record sequence numbers
+        self._synced_pos = Position(self._segment, self._file.tell())
+        self._waiters: list[tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="ingest-wal-fsync", daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def open_slot(cls, root: str | Path, **kwargs) -> "IngestLog":
+        """Open the first slot under `root` no other process holds (one per worker)."""
+        for i in itertools.count():
+            log = cls.try_open(Path(root) / f"slot-{i}", create=True, **kwargs)
+            if log is not None:
+                return log
+
+    @classmethod
+    def try_open(cls, directory: str | Path, create: bool = False, **kwargs) -> "IngestLog | None":
+        """Open `directory` if no other process holds its lock, else None.
+
+        Without `create`, a slot that does not exist (or is removed while we wait) is also None.
+        """
+        directory = Path(directory)
+        lock = directory / "LOCK"
+        while True:
+            if create:
+                directory.mkdir(parents=True, exist_ok=True)
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_RDWR)
+            except FileNotFoundError:
+                return None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            try:
+                if os.stat(lock).st_ino == os.fstat(fd).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)  # the slot was removed while we waited for its lock
+            if not create:
+                return None
+        log = cls(directory, **kwargs)
+        log._lock_fd = fd
+        return log
+
+    # -- segments ---------------------------------------------------------------------------
+
+    def _path(self, segment: int) -> Path:
+        return self.directory / f"{segment:012d}.wal"
+
+    def segments(self) -> list[int]:
+        return sorted(int(p.stem) for p in self.directory.glob("*.wal"))
+
+    def _recover(self, path: Path) -> None:
+        """Truncate a torn or corrupt tail left by a crash mid-write."""
+        if not path.exists():
+            return
+        good = 0
+        with open(path, "rb") as f:
+            data = f.read()
+        while good + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, good)
+            end = good + HEADER.size + length
+            if end > len(data) or zlib.crc32(data[good + HEADER.size:end]) != crc:
+                break
+            good = end
+        if good < len(data):
+            logger.warning("ingest WAL %s: truncating %d torn bytes", path.name, len(data) - good)
+            with open(path, "r+b") as f:
+                f.truncate(good)
+
+    def _rotate(self) -> None:
+        """Close the full segment (fsync'd) and start the next one. Caller holds the lock."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        WAL_FSYNCS.inc()
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._path(self._segment), "ab")
+        self._synced = self._written
+        self._synced_pos = Position(self._segment, 0)
+        self._wake(self._synced)
+
+    # -- writing ----------------------------------------------------------------------------
+
+    def append(self, readings: list[dict]) -> int:
+        """Write one record (not yet durable); returns its sequence number for `durable`/`wait`."""
+        received = datetime.now(timezone.utc).isoformat()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ingest WAL is closed")
+            if self._bytes - self._checkpoint.offset > self.max_bytes:
+                raise WalFullError(f"ingest WAL backlog exceeds {self.max_bytes} bytes")
+            offset = self._file.tell()
+            for i, r in enumerate(readings):
+                if not r.get("message_id") and not r.get("timestamp"):
+                    r["message_id"] = f"wal:{self.directory.name}:{self._segment}:{offset}:{i}"
+                if not r.get("timestamp"):
+                    r["timestamp"] = received
+            data = json.dumps(readings, separators=(",", ":")).encode()
+            self._file.write(HEADER.pack(len(data), zlib.crc32(data)) + data)
+            self._bytes += HEADER.size + len(data)
+            self._written += 1
+            seq = self._written
+            if self._file.tell() >= self.segment_bytes:
+                self._rotate()
+            self._cond.notify_all()
+        WAL_BACKLOG.set(self._bytes - self._checkpoint.offset)
+        return seq
+
+    async def durable(self, seq: int) -> None:
+        """Wait until record `seq` is fsync'd."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._synced >= seq:
+                return
+            future = loop.create_future()
+            self._waiters.append((seq, loop, future))
+        await future
+
+    def wait(self, seq: int, timeout: float | None = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._synced >= seq, timeout)
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._written > self._synced or self._closed)
+                if self._closed and self._written == self._synced:
+                    return
+            time.sleep(self.fsync_interval)  # let concurrent appends join this fsync
+            with self._cond:
+                target, position = self._written, Position(self._segment, self._file.tell())
+                self._file.flush()
+                fd = os.dup(self._file.fileno())  # survives a rotation closing the file meanwhile
+            try:
+                os.fsync(fd)  # outside the lock: appends keep writing to the page cache
+            finally:
+                os.close(fd)
+            WAL_FSYNCS.inc()
+            with self._cond:
+                if target > self._synced:
+                    self._synced, self._synced_pos = target, position
+                self._wake(target)
+                self._cond.notify_all()
+
+    def _wake(self, upto: int) -> None:
+        ready = [w for w in self._waiters if w[0] <= upto]
+        self._waiters = [w for w in self._waiters if w[0] > upto]
+        for _, loop, future in ready:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def remove(self) -> None:
+        """Close and delete this slot (fully consumed); its lock is released only once it is gone."""
+        fd, self._lock_fd = self._lock_fd, None
+        try:
+            self.close()
+            for path in self.directory.iterdir():
+                path.unlink()
+            self.directory.rmdir()
+        except OSError:
+            logger.warning("ingest WAL: could not remove %s", self.directory, exc_info=True)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        with self._cond:
+            self._file.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the slot lock
+            self._lock_fd = None
+
+    # -- reading and checkpoints ------------------------------------------------------------
+
+    def read(self, start: Position, max_readings: int) -> tuple[list[list[dict]], Position]:
+        """Durable records from `start`, whole records up to ~`max_readings` readings; and the next position."""
+        records, count, pos = [], 0, start
+        with self._cond:
+            synced = self._synced_pos
+        while count < max_readings and pos < synced:
+            path = self._path(pos.segment)
+            if not path.exists():
+                pos = Position(pos.segment + 1, 0)
+                continue
+            stop = synced.offset if pos.segment == synced.segment else None
+            with open(path, "rb") as f:
+                f.seek(pos.offset)
+                data = f.read() if stop is None else f.read(stop - pos.offset)
+            off = 0
+            while count < max_readings and off + HEADER.size <= len(data):
+                length, _ = HEADER.unpack_from(data, off)
+                record = json.loads(data[off + HEADER.size:off + HEADER.size + length])
+                records.append(record)
+                count += len(record)
+                off += HEADER.size + length
+            pos = Position(pos.segment, pos.offset + off)
+            if off == len(data) and pos.segment < synced.segment:
+                pos = Position(pos.segment + 1, 0)
+        return records, pos
+
+    def checkpoint(self) -> Position:
+        return self._checkpoint
+
+    def commit(self, position: Position) -> None:
+        """Record that everything before `position` is in the database; drop finished segments."""
+        tmp = self.directory / (CHECKPOINT + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(position._asdict(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.directory / CHECKPOINT)
+        with self._cond:
+            self._checkpoint = position
+            self._drop_consumed()
+            backlog = self._bytes - position.offset
+        WAL_BACKLOG.set(backlog)
+
+    def _drop_consumed(self) -> None:
+        """Delete segments wholly before the checkpoint (its own segment is the oldest kept)."""
+        for segment in self.segments():
+            if segment < self._checkpoint.segment and segment != self._segment:
+                path = self._path(segment)
+                self._bytes -= path.stat().st_size
+                path.unlink()
+
+    def _load_checkpoint(self) -> Position:
+        path = self.directory / CHECKPOINT
+        if not path.exists():
+            return Position(0, 0)
+        return Position(**json.loads(path.read_text()))
+
+
+class WalConsumer:
+    """Background task draining the ingest log into the database; backs off while the DB is down."""
+
+    def __init__(
+        self,
+        batch: int = 5000,
+        interval: float = 0.05,
+        max_backoff: float = 30.0,
+        orphan_interval: float = 60.0,
+    ):
+        self.batch = batch
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.orphan_interval = orphan_interval
+        self._task: asyncio.Task | None = None
+
+    @timed("wal.drain")
+    def drain(self, db: Session, log: "IngestLog | None" = None) -> int:
+        """Load one batch from the checkpoint on and advance the checkpoint. Returns readings loaded."""
+        from app.services.ingest import ingest_readings
+
+        log = log or get_ingest_log()
+        if log is None:
+            return 0
+        records, nxt = log.read(log.checkpoint(), self.batch)
+        if not records:
+            return 0
+        payloads = [TelemetryCreate(**r) for record in records for r in record]
+        for i in range(0, len(payloads), self.batch):
+            ingest_readings(db, payloads[i:i + self.batch])
+        log.commit(nxt)
+        return len(payloads)
+
+    def drain_orphans(self, db: Session, log: "IngestLog | None" = None) -> int:
+        """Drain and delete the other slots under the log's root that no process holds. Returns readings loaded."""
+        log = log or get_ingest_log()
+        if log is None:
+            return 0
+        loaded = 0
+        for directory in sorted(log.directory.parent.glob("slot-*")):
+            if directory == log.directory:
+                continue
+            orphan = IngestLog.try_open(directory)
+            if orphan is None:
+                continue  # a live worker's slot
+            try:
+                while n := self.drain(db, orphan):
+                    loaded += n
+                done = not orphan.read(orphan.checkpoint(), 1)[0]
+            except BaseException:
+                orphan.close()
+                raise
+            if done:
+                logger.info("ingest WAL: drained orphaned %s", directory.name)
+                orphan.remove()
+            else:
+                orphan.close()
+        return loaded
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop(session_factory))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self, session_factory: Callable[[], Session]) -> None:
+        backoff = 0.0
+        orphans_due = 0.0
+        while True:
+            if self.orphan_interval > 0 and time.monotonic() >= orphans_due:
+                orphans_due = time.monotonic() + self.orphan_interval
+                try:
+                    await asyncio.to_thread(self._drain_orphans_in_session, session_factory)
+                except Exception:
+                    logger.exception("ingest WAL: draining orphaned slots failed")
+            try:
+                loaded = await asyncio.to_thread(self._drain_in_session, session_factory)
+                backoff = 0.0
+            except Exception:
+                backoff = min(max(backoff * 2, 0.5), self.max_backoff)
+                logger.exception("ingest WAL drain failed, retrying in %.1fs", backoff)
+                await asyncio.sleep(backoff)
+                continue
+            if loaded < self.batch:
+                await asyncio.sleep(self.interval)
+
+    def _drain_in_session(self, session_factory: Callable[[], Session]) -> int:
+        with session_factory() as db:
+            return self.drain(db)
+
+    def _drain_orphans_in_session(self, session_factory: Callable[[], Session]) -> int:
+        with session_factory() as db:
+            return self.drain_orphans(db)
+
+
+_log: IngestLog | None = None
+
+
+def get_ingest_log() -> IngestLog | None:
+    return _log
+
+
+def set_ingest_log(log: IngestLog | None) -> None:
+    global _log
+    _log = log
+
+
+def open_ingest_log() -> IngestLog | None:
+    """Open this worker's slot under INGEST_WAL_DIR (None when the WAL is disabled)."""
+    s = get_settings()
+    if not s.ingest_wal_dir:
+        return None
+    log = IngestLog.open_slot(
+        s.ingest_wal_dir,
+        segment_bytes=s.ingest_wal_segment_bytes,
+        fsync_interval=s.ingest_wal_fsync_interval,
+        max_bytes=s.ingest_wal_max_bytes,
+    )
+    set_ingest_log(log)
+    return log
+
+
+wal_consumer = WalConsumer(
+    batch=get_settings().ingest_wal_batch,
+    orphan_interval=get_settings().ingest_wal_orphan_interval,
+)
@@ -0,0 +1,114 @@
+"""
+Cold-start latency: what a new worker pays before it serves traffic.
+
+    python -m benchmarks.bench_startup                       # temp SQLite file, 5 cold starts
+    python -m benchmarks.bench_startup --repeat 10 --fail-on-regression
+
+Each repetition is a fresh interpreter that times `import app.main`, the startup hooks, the
+first /health request and the first chart request (which pays for the lazily imported
+pandas / Plotly modules). The schema is migrated once up front, as a deploy would. Results
+are compared against benchmarks/startup_baseline.json like benchmarks.run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import (
+    BenchResult,
+    compare,
+    environment,
+    load_results,
+    print_report,
+    write_results,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+heavy = sorted(m for m in ("pandas", "plotly.graph_objs._figure", "scipy", "langchain") if m in sys.modules)
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    t2 = time.perf_counter()
+    client.get("/health").raise_for_status()
+    t3 = time.perf_counter()
+    readings = [{"sensor_id": "COLD-1", "sensor_type": "temperature", "value": 20.0 + i % 5} for i in range(50)]
+    client.post("/api/v1/telemetry/batch", json={"readings": readings}).raise_for_status()
+    t3b = time.perf_counter()
+    client.get("/api/v1/analytics/charts/ewma", params={"sensor_id": "COLD-1"}).raise_for_status()
+    t4 = time.perf_counter()
+print(json.dumps({
+    "import_app": t1 - t0, "hooks": t2 - t1, "first_health": t3 - t2, "first_chart": t4 - t3b,
+    "ready": t3 - t0, "heavy_modules_at_import": heavy,
+}))
+"""
+
+STAGES = ["import_app", "hooks", "first_health", "first_chart", "ready"]
+
+
+def cold_start(env: dict[str, str]) -> dict:
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Default: a temporary SQLite file")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_startup.json")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    url = args.database_url
+    if url is None:
+        tmp = tempfile.TemporaryDirectory(prefix="zebra-startup-")
+        url = f"sqlite:///{tmp.name}/bench.db"
+    env = os.environ | {
+        "DATABASE_URL": url,
+        "OPENAI_API_KEY": "",
+        "SUMMARY_REFRESH_INTERVAL": "0",
+        "RETENTION_INTERVAL": "0",
+        "PYTHONPATH": str(ROOT),
+    }
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=ROOT, env=env, check=True, capture_output=True)
+
+    runs = [cold_start(env) for _ in range(args.repeat)]
+    results = []
+    for stage in STAGES:
+        samples = sorted(r[stage] for r in runs)
+        stats = {"min": samples[0], "p50": statistics.median(samples), "max": samples[-1], "repeat": len(samples)}
+        results.append(BenchResult(name=f"startup_{stage}", value=stats["p50"], unit="s", stats=stats))
+    heavy = runs[-1]["heavy_modules_at_import"]
+    print(f"heavy modules loaded by `import app.main`: {', '.join(heavy) or 'none'}", file=sys.stderr)
+
+    meta = environment() | {"args": {"repeat": args.repeat}, "heavy_modules_at_import": heavy}
+    write_results(args.output, results, meta)
+    comparison = compare(results, load_results(args.baseline), args.tolerance)
+    print_report(results, comparison)
+    if args.update_baseline:
+        write_results(args.baseline, results, meta)
+        print(f"baseline updated: {args.baseline}", file=sys.stderr)
+    if tmp is not None:
+        tmp.cleanup()
+    regressed = [c for c in comparison if c["regressed"]]
+    if regressed:
+        print(f"{len(regressed)} result(s) regressed beyond {args.tolerance:.0%}", file=sys.stderr)
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Ingest throughput vs. worker count.
+
+    python -m benchmarks.bench_workers --database-url postgresql+psycopg2://zebra_app:pw@localhost/zebrabench
+    python -m benchmarks.bench_workers --workers 1,2,4 --clients 16 --requests 500
+
+The schema is migrated once up front. For each N, starts `python -m app.serve --workers N` with the shared SQL state backend, drives
+it with --clients concurrent client processes posting single readings over keep-alive
+connections, and reports readings/s plus scaling efficiency (rate_N / (N * rate_1)).
+A SQLite file (the default) serializes writes, so it shows the coordination overhead but not
+the scaling; use Postgres for the real curve.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import BenchResult, environment, print_report, throughput, write_results
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not become ready")
+
+
+def _client(args: tuple[str, int, int, mp.Barrier]) -> int:
+    url, client_id, n, barrier = args
+    ok = 0
+    with httpx.Client(base_url=url, timeout=30.0) as http:
+        barrier.wait()
+        for i in range(n):
+            r = http.post(
+                "/api/v1/telemetry/",
+                json={"sensor_id": f"BENCH-{client_id:02d}", "sensor_type": "temperature", "value": 20.0 + i % 7},
+            )
+            ok += r.status_code == 200
+    return ok
+
+
+def run_one(workers: int, clients: int, requests: int, env: dict[str, str]) -> BenchResult:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        _wait_ready(url)
+        ctx = mp.get_context("spawn")
+        barrier = ctx.Manager().Barrier(clients + 1)
+        with ctx.Pool(clients) as pool:
+            pending = pool.map_async(_client, [(url, c, requests, barrier) for c in range(clients)])
+            barrier.wait()
+            t0 = time.perf_counter()
+            ok = sum(pending.get())
+            elapsed = time.perf_counter() - t0
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return throughput("ingest_workers", ok, elapsed, workers=workers, clients=clients)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=300, help="per client")
+    parser.add_argument("--state-backend", default="sql", choices=["sql", "redis"])
+    parser.add_argument("--state-backend-url", default="")
+    parser.add_argument("--output", default="bench_workers.json")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    db_url = args.database_url
+    if not db_url:
+        tmp = tempfile.TemporaryDirectory()
+        db_url = f"sqlite:///{Path(tmp.name) / 'bench.db'}"
+        print("No --database-url: using a SQLite file; writes serialize, expect flat scaling.")
+    env = os.environ | {
+        "DATABASE_URL": db_url,
+        "STATE_BACKEND": args.state_backend,
+        "STATE_BACKEND_URL": args.state_backend_url,
+        "SUMMARY_REFRESH_INTERVAL": "0",
+        "PYTHONPATH": str(ROOT),
+    }
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=ROOT, env=env, check=True, capture_output=True)
+
+    results = []
+    for n in [int(w) for w in args.workers.split(",")]:
+        results.append(run_one(n, args.clients, args.requests, env))
+        print(f"workers={n}: {results[-1].value:,.0f} readings/s")
+    if not results[0].value:
+        print("no reading was accepted; check the server log above", file=sys.stderr)
+        return 1
+    base = results[0].value / results[0].params["workers"]
+    for r in results:
+        r.stats["efficiency"] = r.value / (r.params["workers"] * base)
+    print_report(results, [])
+    for r in results:
+        print(f"  workers={r.params['workers']}: scaling efficiency {r.stats['efficiency']:.0%}")
+    write_results(args.output, results, {"env": environment(), "args": {"clients": args.clients, "requests": args.requests}})
+    if tmp is not None:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
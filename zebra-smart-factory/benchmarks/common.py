@@ -0,0 +1,136 @@
+"""Shared benchmark helpers: timing, result records, baseline comparison."""
+import json
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+
+@dataclass
+class BenchResult:
+    """One measured quantity. `value` is compared against the baseline."""
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = False
+    params: dict[str, Any] = field(default_factory=dict)
+    stats: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return "|".join([self.name] + [f"{k}={v}" for k, v in sorted(self.params.items())])
+
+
+def time_calls(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> dict[str, float]:
+    """Call fn repeatedly; return latency stats in seconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "min": samples[0],
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "mean": statistics.fmean(samples),
+        "repeat": repeat,
+    }
+
+
+def latency(name: str, fn: Callable[[], Any], repeat: int = 5, warmup: int = 1, **params) -> BenchResult:
+    """Median latency of fn as a BenchResult."""
+    stats = time_calls(fn, repeat=repeat, warmup=warmup)
+    return BenchResult(name=name, value=stats["p50"], unit="s", params=params, stats=stats)
+
+
+def throughput(name: str, count: int, elapsed: float, unit: str = "readings/s", **params) -> BenchResult:
+    """Items per second as a BenchResult."""
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    return BenchResult(
+        name=name,
+        value=rate,
+        unit=unit,
+        higher_is_better=True,
+        params=params,
+        stats={"count": count, "elapsed": elapsed},
+    )
+
+
+def environment() -> dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def write_results(path: str | Path, results: list[BenchResult], meta: dict[str, Any]) -> None:
+    payload = {"meta": meta, "results": [asdict(r) | {"key": r.key} for r in results]}
+    Path(path).write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n")
+
+
+def load_results(path: str | Path) -> dict[str, dict[str, Any]]:
+    """Load a results/baseline file keyed by result key."""
+    p = Path(path)
+    if not p.exists():
+        return {}
+    data = json.loads(p.read_text())
+    return {r["key"]: r for r in data.get("results", [])}
+
+
+def compare(
+    results: list[BenchResult],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float = 0.5,
+) -> list[dict[str, Any]]:
+    """
+    Compare results against a baseline.
+    A result regresses when it is worse than baseline by more than `tolerance`
+    (0.5 = 50% slower, or 1/1.5 of the baseline throughput).
+    """
+    rows = []
+    for r in results:
+        base = baseline.get(r.key)
+        if base is None or not base.get("value"):
+            rows.append({"key": r.key, "value": r.value, "baseline": None, "ratio": None, "regressed": False})
+            continue
+        if r.higher_is_better:
+            ratio = base["value"] / r.value if r.value else float("inf")
+        else:
+            ratio = r.value / base["value"]
+        rows.append({
+            "key": r.key,
+            "value": r.value,
+            "baseline": base["value"],
+            "ratio": ratio,
+            "regressed": ratio > 1 + tolerance,
+        })
+    return rows
+
+
+def print_report(results: list[BenchResult], comparison: list[dict[str, Any]]) -> None:
+    by_key = {c["key"]: c for c in comparison}
+    width = max((len(r.key) for r in results), default=10)
+    for r in results:
+        c = by_key.get(r.key, {})
+        ratio = c.get("ratio")
+        flag = "  REGRESSED" if c.get("regressed") else ""
+        vs = f"  x{ratio:.2f} vs baseline" if ratio is not None else ""
+        print(f"{r.key:<{width}}  {_fmt(r.value, r.unit)}{vs}{flag}")
+
+
+def _fmt(value: float, unit: str) -> str:
+    if unit == "s":
+        if value < 1e-3:
+            return f"{value * 1e6:10.1f} us"
+        if value < 1:
+            return f"{value * 1e3:10.2f} ms"
+        return f"{value:10.3f} s "
+    return f"{value:10.1f} {unit}"
@@ -0,0 +1,392 @@
+"""
+Benchmark suite: ingest throughput, read/analytics latency, response serialization, SPC and chart builders.
+
+    python -m benchmarks.run                                   # temp SQLite file, quick sizes
+    python -m benchmarks.run --rows 1e3,1e4,1e5,1e6,1e7
+    python -m benchmarks.run --database-url postgresql+psycopg2://zebra_app:pw@localhost/zebrabench --allow-reset
+    python -m benchmarks.run --update-baseline                 # store results as the new baseline
+
+Results are written as JSON (--output) and compared against --baseline; with
+--fail-on-regression the exit code is 1 when any result regresses beyond --tolerance.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import (
+    BenchResult,
+    compare,
+    environment,
+    latency,
+    load_results,
+    print_report,
+    throughput,
+    time_calls,
+    write_results,
+)
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+SENSOR_TYPES = [
+    ("temperature", "celsius", 23.0, 1.5),
+    ("vibration", "mm/s", 7.5, 2.0),
+    ("pressure", "psi", 100.0, 5.0),
+    ("humidity", "%", 50.0, 6.0),
+]
+SENSORS_PER_TYPE = 10
+SEED_CHUNK = 20_000
+
+ENDPOINTS = [
+    ("spc_stats", "/api/v1/analytics/spc/stats?limit=1000"),
+    ("spc_stats_sensor", "/api/v1/analytics/spc/stats?sensor_id=TEMP-00&limit=1000"),
+    ("spc_anomalies_zscore", "/api/v1/analytics/spc/anomalies?limit=1000"),
+    ("spc_anomalies_iqr", "/api/v1/analytics/spc/anomalies?limit=1000&method=iqr"),
+    ("chart_spc_xbar", "/api/v1/analytics/charts/spc-xbar?limit=500"),
+    ("chart_spc_cusum", "/api/v1/analytics/charts/spc-cusum?limit=500"),
+    ("chart_ewma", "/api/v1/analytics/charts/ewma?sensor_id=TEMP-00&limit=5000"),
+    ("chart_imr", "/api/v1/analytics/charts/imr?sensor_id=TEMP-00&limit=5000"),
+    ("chart_rolling", "/api/v1/analytics/charts/rolling?sensor_id=TEMP-00&limit=5000"),
+    ("spc_streaming", "/api/v1/analytics/spc/streaming?sensor_id=TEMP-00"),
+    ("chart_heatmap", "/api/v1/analytics/charts/heatmap?limit=2000"),
+    ("chart_pareto", "/api/v1/analytics/charts/pareto"),
+    ("dashboard_snapshot", "/api/v1/analytics/dashboard/snapshot"),
+    ("resample", "/api/v1/analytics/resample?sensor_type=temperature&hours=24&bucket_seconds=60"),
+    ("maintenance_summary", "/api/v1/analytics/maintenance-summary?limit=500"),
+    ("maintenance_forecast", "/api/v1/analytics/maintenance/forecast?window_hours=48"),
+]
+
+
+def _sizes(text: str) -> list[int]:
+    return sorted({int(float(s)) for s in text.split(",") if s.strip()})
+
+
+def _sensor_table() -> list[tuple[str, str, str, float, float]]:
+    rows = []
+    for stype, unit, mean, sd in SENSOR_TYPES:
+        for i in range(SENSORS_PER_TYPE):
+            rows.append((f"{stype.upper()[:4]}-{i:02d}", stype, unit, mean, sd))
+    return rows
+
+
+def _synthetic_rows(start: int, stop: int, origin: datetime, rng: np.random.Generator) -> list[dict]:
+    """Readings start..stop-1, round-robin over sensors, 5 ms apart."""
+    sensors = _sensor_table()
+    idx = np.arange(start, stop)
+    which = idx % len(sensors)
+    means = np.array([s[3] for s in sensors])[which]
+    sds = np.array([s[4] for s in sensors])[which]
+    values = np.round(rng.normal(means, sds), 3)
+    return [
+        {
+            "sensor_id": sensors[w][0],
+            "sensor_type": sensors[w][1],
+            "unit": sensors[w][2],
+            "value": float(v),
+            "timestamp": origin + timedelta(milliseconds=5 * int(i)),
+        }
+        for i, w, v in zip(idx, which, values)
+    ]
+
+
+def seed(engine, table, current: int, target: int, origin: datetime, rng: np.random.Generator) -> int:
+    """Grow the readings table from `current` to `target` synthetic rows."""
+    from sqlalchemy import insert
+
+    stmt = insert(table)
+    for lo in range(current, target, SEED_CHUNK):
+        hi = min(target, lo + SEED_CHUNK)
+        with engine.begin() as conn:
+            conn.execute(stmt, _synthetic_rows(lo, hi, origin, rng))
+    return target
+
+
+def bench_ingest(client, engine, n_single: int, batch_sizes: list[int], rows: int) -> list[BenchResult]:
+    """Single-reading POST throughput and DAG-style bulk load throughput."""
+    import pandas as pd
+
+    results = []
+    t0 = time.perf_counter()
+    for i in range(n_single):
+        r = client.post(
+            "/api/v1/telemetry/",
+            json={"sensor_id": "BENCH-00", "sensor_type": "temperature", "value": 20.0 + i % 7, "unit": "celsius"},
+        )
+        r.raise_for_status()
+    results.append(throughput("ingest_single", n_single, time.perf_counter() - t0, rows=rows))
+
+    for size in batch_sizes:
+        batches = max(1, n_single // size)
+        frames = [
+            pd.DataFrame({
+                "sensor_id": ["BENCH-01"] * size,
+                "sensor_type": ["temperature"] * size,
+                "value": np.linspace(18, 28, size),
+                "unit": ["celsius"] * size,
+            })
+            for _ in range(batches)
+        ]
+        t0 = time.perf_counter()
+        for df in frames:
+            df.to_sql("sensor_readings", engine, if_exists="append", index=False, method="multi")
+        results.append(
+            throughput("ingest_batch", batches * size, time.perf_counter() - t0, rows=rows, batch_size=size)
+        )
+    return results
+
+
+def bench_reads(client, session_factory, rows: int, repeat: int) -> list[BenchResult]:
+    from app.api.v1.analytics import _get_readings
+
+    results = []
+    db = session_factory()
+    try:
+        for label, kwargs in [
+            ("all", {}),
+            ("sensor_id", {"sensor_id": "TEMP-00"}),
+            ("sensor_type", {"sensor_type": "pressure"}),
+        ]:
+            results.append(latency(
+                "get_readings",
+                lambda: _get_readings(db, limit=500, **kwargs),
+                repeat=repeat,
+                rows=rows,
+                filter=label,
+            ))
+    finally:
+        db.close()
+
+    for name, path in ENDPOINTS:
+        def call(path=path):
+            r = client.get(path)
+            r.raise_for_status()
+
+        results.append(latency(f"endpoint_{name}", call, repeat=repeat, rows=rows))
+    return results
+
+
+def bench_serialization(session_factory, rows: int, repeat: int) -> list[BenchResult]:
+    """`GET /telemetry/?limit=rows` bodies: ORM + response_model (the old path) vs column tuples in each layout."""
+    import json
+    import tracemalloc
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+
+    from app.api.v1.telemetry import READING_FIELDS
+    from app.core.serialization import dumps, tabulate
+    from app.models.sensor import SensorReading
+    from app.schemas.telemetry import TelemetryResponse
+
+    adapter = TypeAdapter(list[TelemetryResponse])
+    newest = SensorReading.timestamp.desc()
+
+    def orm_models(db):  # what FastAPI does with a response_model: validate, dump to JSON types, json.dumps
+        objs = db.query(SensorReading).order_by(newest).limit(rows).all()
+        content = adapter.dump_python(adapter.validate_python(objs, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def tuples(layout):
+        def body(db):
+            columns = [getattr(SensorReading, f) for f in READING_FIELDS]
+            result = db.execute(select(*columns).order_by(newest).limit(rows)).all()
+            return dumps(tabulate(READING_FIELDS, result, layout, duplicate=False))
+        return body
+
+    results = []
+    for path, fn in [("orm_models", orm_models), ("tuples_rows", tuples("rows")), ("tuples_columns", tuples("columns"))]:
+        def call(fn=fn):
+            db = session_factory()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+
+        stats = time_calls(call, repeat=repeat)
+        tracemalloc.start()
+        size = len(call())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        r = throughput("serialize_readings", rows, stats["p50"], unit="rows/s", rows=rows, path=path)
+        r.stats |= {"bytes": size, "peak_bytes": peak}
+        results.append(r)
+        results.append(BenchResult(name="serialize_peak_memory", value=peak / rows, unit="B/row", params={"rows": rows, "path": path}))
+    return results
+
+
+def bench_spc(sizes: list[int], repeat: int) -> list[BenchResult]:
+    from app.services import spc
+    from app.services.resample import Points, resample_points
+
+    rng = np.random.default_rng(7)
+    results = []
+    for n in sizes:
+        values = list(rng.normal(100.0, 5.0, n))
+        # 200 sensors at irregular rates over one day, binned to minutes.
+        points = Points(
+            [f"S-{i}" for i in range(200)], rng.integers(0, 200, n), np.sort(rng.uniform(0, 86_400, n)), rng.normal(0, 1, n)
+        )
+        grid = np.arange(0, 86_400, 60)
+        for name, fn in [
+            ("simple_limits", lambda: spc.simple_limits(values)),
+            ("xbar_r_limits", lambda: spc.xbar_r_limits(values, 5)),
+            ("cusum", lambda: spc.cusum(values)),
+            ("detect_anomalies_zscore", lambda: spc.detect_anomalies_zscore(values)),
+            ("detect_anomalies_iqr", lambda: spc.detect_anomalies_iqr(values)),
+            ("ewma", lambda: spc.ewma(values)),
+            ("imr", lambda: spc.imr(values)),
+            ("rolling_stats", lambda: spc.rolling_stats(values, window=50)),
+            ("resample_mean", lambda: resample_points(points, grid, 60, "mean")),
+            ("resample_last", lambda: resample_points(points, grid, 60, "last")),
+            ("resample_interpolate", lambda: resample_points(points, grid, 60, "interpolate")),
+        ]:
+            results.append(latency(f"spc_{name}", fn, repeat=repeat, n=n))
+    return results
+
+
+def bench_charts(sizes: list[int], repeat: int) -> list[BenchResult]:
+    import pandas as pd
+
+    from app.services import charts
+
+    rng = np.random.default_rng(11)
+    sensors = _sensor_table()
+    results = []
+    for n in sizes:
+        values = list(rng.normal(100.0, 5.0, n))
+        labels = [sensors[i % len(sensors)][0] for i in range(n)]
+        df = pd.DataFrame({
+            "sensor_id": labels,
+            "sensor_type": [sensors[i % len(sensors)][1] for i in range(n)],
+            "value": values,
+        })
+        # Pareto categories grow with n but are capped: the builder is quadratic in categories.
+        n_cat = min(n, 1000)
+        cat_labels = [f"cat-{i}" for i in range(n_cat)]
+        cat_values = list(rng.integers(1, 1000, n_cat))
+        for name, fn in [
+            ("spc_xbar_chart", lambda: charts.spc_xbar_chart(values, labels, 5)),
+            ("spc_cusum_chart", lambda: charts.spc_cusum_chart(values, labels)),
+            ("heatmap_chart", lambda: charts.heatmap_chart(df, "sensor_id", "sensor_type", "value")),
+            ("pareto_chart", lambda: charts.pareto_chart(cat_labels, cat_values)),
+        ]:
+            results.append(latency(f"chart_{name}", fn, repeat=repeat, n=n))
+    return results
+
+
+def bench_compression(sizes: list[int], repeat: int) -> list[BenchResult]:
+    """Bytes on the wire and CPU per reading for JSON batch and NDJSON bodies, per encoding."""
+    import json
+
+    from app.core.compression import available_encodings, decode, encode
+
+    rng = np.random.default_rng(5)
+    origin = datetime.now(timezone.utc)
+    results = []
+    for n in sizes:
+        rows = [dict(r, timestamp=r["timestamp"].isoformat()) for r in _synthetic_rows(0, n, origin, rng)]
+        bodies = {
+            "json": json.dumps({"readings": rows}).encode(),
+            "ndjson": "".join(json.dumps(r) + "\n" for r in rows).encode(),
+        }
+        for fmt, raw in bodies.items():
+            results.append(BenchResult(name="wire_bytes", value=len(raw) / n, unit="B/reading", params={"n": n, "format": fmt, "encoding": "identity"}))
+            for enc in available_encodings():
+                wire = encode(raw, enc)
+                results.append(BenchResult(
+                    name="wire_bytes", value=len(wire) / n, unit="B/reading",
+                    params={"n": n, "format": fmt, "encoding": enc}, stats={"ratio": len(raw) / len(wire)},
+                ))
+                for op, fn in [("encode", lambda: encode(raw, enc)), ("decode", lambda: decode(wire, enc))]:
+                    r = latency(f"compression_{op}", fn, repeat=repeat, n=n, format=fmt, encoding=enc)
+                    r.value, r.unit = r.value / n * 1e6, "us/reading"
+                    results.append(r)
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Default: a temporary SQLite file")
+    parser.add_argument("--allow-reset", action="store_true", help="Required for non-SQLite URLs: tables are dropped")
+    parser.add_argument("--rows", default="1e3,1e4,1e5", help="Stored row counts to benchmark reads at")
+    parser.add_argument("--array-sizes", default="1e3,1e4,1e5", help="Array sizes for SPC/chart builders")
+    parser.add_argument("--ingest-count", type=int, default=200, help="Readings per ingest measurement")
+    parser.add_argument("--batch-sizes", default="50,1000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="ingest,reads,serialization,spc,charts,compression", help="Comma-separated groups to run")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown before flagging (0.5 = 50%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    groups = {g.strip() for g in args.only.split(",") if g.strip()}
+    tmpdir = None
+    url = args.database_url
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="zebra-bench-")
+        url = f"sqlite:///{tmpdir.name}/bench.db"
+    if not url.startswith("sqlite") and not args.allow_reset:
+        parser.error("benchmarks drop and recreate tables; pass --allow-reset for a dedicated database")
+
+    # The engine is built at import time from DATABASE_URL, so set it before importing the app.
+    os.environ["DATABASE_URL"] = url
+    os.environ["OPENAI_API_KEY"] = ""
+    from fastapi.testclient import TestClient
+
+    from app.core.database import Base, SessionLocal, engine
+    from app.main import app
+    from app.models.sensor import SensorReading
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    results: list[BenchResult] = []
+    if groups & {"ingest", "reads", "serialization"}:
+        rng = np.random.default_rng(42)
+        origin = datetime.now(timezone.utc) - timedelta(days=1)
+        stored = 0
+        with TestClient(app) as client:
+            for rows in _sizes(args.rows):
+                stored = seed(engine, SensorReading.__table__, stored, rows, origin, rng)
+                print(f"-- {rows} stored rows", file=sys.stderr)
+                if "reads" in groups:
+                    results += bench_reads(client, SessionLocal, rows, args.repeat)
+                if "serialization" in groups:
+                    results += bench_serialization(SessionLocal, rows, args.repeat)
+                if "ingest" in groups:
+                    results += bench_ingest(client, engine, args.ingest_count, _sizes(args.batch_sizes), rows)
+    if "spc" in groups:
+        results += bench_spc(_sizes(args.array_sizes), args.repeat)
+    if "charts" in groups:
+        results += bench_charts(_sizes(args.array_sizes), args.repeat)
+    if "compression" in groups:
+        results += bench_compression(_sizes(args.array_sizes), args.repeat)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output", "baseline")}
+    meta = environment() | {"dialect": engine.dialect.name, "args": params}
+    write_results(args.output, results, meta)
+    comparison = compare(results, load_results(args.baseline), args.tolerance)
+    print_report(results, comparison)
+    if args.update_baseline:
+        write_results(args.baseline, results, meta)
+        print(f"baseline updated: {args.baseline}", file=sys.stderr)
+    engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    regressed = [c for c in comparison if c["regressed"]]
+    if regressed:
+        print(f"{len(regressed)} result(s) regressed beyond {args.tolerance:.0%}", file=sys.stderr)
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
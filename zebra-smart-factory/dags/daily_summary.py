@@ -1,29 +1,58 @@
-"""Batch DAG: Daily report generation and maintenance summary."""
+"""
+Batch DAG: incremental daily summary and report.
+
+Each run has the API fold the readings inserted since the previous run into the per-day rows
+(POST /api/v1/retention/daily/run): a high watermark on reading ids, chunked, and idempotent
+when retried. It then prints the report for the run's day. Cost follows new readings, not
+table size. Backfill runs recompute their interval from raw readings instead:
+
+    airflow dags backfill daily_summary -s 2025-03-01 -e 2025-03-07
+    airflow dags trigger daily_summary --conf '{"start": "2025-03-01T00:00:00", "end": "2025-03-08T00:00:00"}'
+"""
 from datetime import datetime
 from airflow import DAG
 from airflow.operators.python import PythonOperator
+import json
 import os
+import urllib.parse
+import urllib.request
 
+API_URL = os.environ.get("API_URL", "http://app:8000")
 
-def generate_daily_report():
-    """Generate daily summary statistics from sensor readings."""
-    import pandas as pd
-    from sqlalchemy import create_engine
 
-    conn_str = (
-        f"postgresql://{os.environ.get('POSTGRES_USER', 'zebra_app')}:"
-        f"{os.environ.get('POSTGRES_PASSWORD', '')}@"
-        f"{os.environ.get('POSTGRES_HOST', 'postgres')}:5432/"
-        f"{os.environ.get('POSTGRES_DB', 'zebrastream')}"
-    )
-    engine = create_engine(conn_str)
-    df = pd.read_sql(
-        "SELECT sensor_type, sensor_id, value, timestamp FROM sensor_readings ORDER BY timestamp DESC LIMIT 1000",
-        engine,
-    )
-    summary = df.groupby("sensor_type").agg({"value": ["mean", "std", "min", "max"], "sensor_id": "count"})
-    print(summary)
-    print(f"\nTotal readings: {len(df)}")
+def _call(method, path, **params):
+    query = urllib.parse.urlencode({k: v for k, v in params.items() if v is not None})
+    request = urllib.request.Request(f"{API_URL}{path}?{query}", method=method)
+    with urllib.request.urlopen(request, timeout=600) as response:
+        return json.load(response)
+
+
+def process_new_readings(**context):
+    """Fold new readings into the daily rows, or recompute the requested interval on backfills."""
+    run = context["dag_run"]
+    conf = run.conf or {}
+    if conf.get("start") or run.run_type == "backfill":
+        start = conf.get("start") or context["data_interval_start"].isoformat()
+        end = conf.get("end") or context["data_interval_end"].isoformat()
+        report = _call("POST", "/api/v1/retention/daily/backfill", start=start, end=end)
+        print(f"Backfilled {report['days']} days ({report['rows']} sensor-days); skipped {report['skipped']}")
+        return
+    while True:  # bounded calls, so a large backlog never holds one request open for long
+        report = _call("POST", "/api/v1/retention/daily/run", max_chunks=20)
+        print(f"Processed {report['readings']} readings up to id {report['last_id']}")
+        if report["remaining"] <= 0:
+            return
+
+
+def generate_daily_report(**context):
+    """Print the per-sensor-type summary of the run's day."""
+    summary = _call("GET", "/api/v1/retention/daily", start=context["data_interval_start"].isoformat())
+    for row in summary["days"]:
+        print(
+            f"{row['day']} {row['sensor_type']:<12} sensors={row['sensors']:<4} n={row['count']:<8} "
+            f"mean={row['mean']:.3f} std={row['std']:.3f} min={row['min']:.3f} max={row['max']:.3f}"
+        )
+    print(f"\nTotal readings: {sum(row['count'] for row in summary['days'])}")
 
 
 with DAG(
@@ -31,9 +60,15 @@ with DAG(
     start_date=datetime(2025, 1, 1),
     schedule_interval="@daily",
     catchup=False,
+    max_active_runs=1,
     tags=["report", "batch"],
 ) as dag:
-    PythonOperator(
+    process = PythonOperator(
+        task_id="process_new_readings",
+        python_callable=process_new_readings,
+    )
+    report = PythonOperator(
         task_id="generate_daily_report",
         python_callable=generate_daily_report,
     )
+    process >> report
@@ -0,0 +1,306 @@
+"""
+Edge agent: report-by-exception and windowed aggregation on the gateway, batched uploads.
+
+    python -m data_simulator.edge                                   # EDGE_SAMPLES samples, simulated clock
+    API_URL=http://localhost:8000 EDGE_RATE=20 EDGE_REALTIME=1 python -m data_simulator.edge
+
+Each sample from the simulator goes one of two ways:
+
+- forwarded as a reading when it moved more than its sensor type's deadband away from the
+  last forwarded value, or when nothing was forwarded for `max_silence` seconds (heartbeat);
+- otherwise folded into the sensor's current window (count, mean, M2, min, max, last).
+
+Every `interval` seconds closed windows go to POST /api/v1/telemetry/aggregates and forwarded
+readings to /telemetry/batch, gzip-compressed. Each sample is counted exactly once, and the
+server merges windows with readings (app.services.aggregates). An upload that fails is kept
+in a disk buffer (EDGE_BUFFER_DIR) and resent oldest first on the next flush; message ids and
+window keys make a resend idempotent.
+"""
+import gzip
+import json
+import logging
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+from data_simulator.simulator import SENSOR_TYPES, generate_heartbeat, sensor_signal
+
+log = logging.getLogger(__name__)
+
+API_URL = os.environ.get("API_URL", "http://app:8000")
+DEADBANDS = {"temperature": 0.5, "vibration": 1.0, "pressure": 2.0, "humidity": 2.0}
+PATHS = {"batch": "/api/v1/telemetry/batch", "aggregates": "/api/v1/telemetry/aggregates"}
+
+
+def _parse(ts: str | datetime) -> datetime:
+    ts = ts if isinstance(ts, datetime) else datetime.fromisoformat(ts)
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+@dataclass
+class Window:
+    """Running moments (Welford) of one sensor's unforwarded samples over one interval."""
+
+    sensor_id: str
+    sensor_type: str
+    unit: str | None
+    start: datetime
+    seconds: int
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    minimum: float = math.inf
+    maximum: float = -math.inf
+    last: float | None = None
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(seconds=self.seconds)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum, self.maximum = min(self.minimum, value), max(self.maximum, value)
+        self.last = value
+
+    def payload(self) -> dict:
+        return {
+            "sensor_id": self.sensor_id,
+            "sensor_type": self.sensor_type,
+            "unit": self.unit,
+            "window_start": self.start.isoformat(),
+            "window_seconds": self.seconds,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.minimum,
+            "max": self.maximum,
+            "last": self.last,
+        }
+
+
+class Deadband:
+    """Report-by-exception: pass a sample when it moved past the deadband or the sensor went quiet."""
+
+    def __init__(self, deadbands: dict[str, float], default: float = 0.0, max_silence: float = 300.0):
+        self.deadbands = deadbands
+        self.default = default
+        self.max_silence = max_silence
+        self._last: dict[str, tuple[float, float]] = {}  # sensor -> (value, epoch) last forwarded
+
+    def passes(self, sensor_id: str, sensor_type: str, value: float, epoch: float) -> bool:
+        last = self._last.get(sensor_id)
+        band = self.deadbands.get(sensor_type, self.default)
+        if last is None or abs(value - last[0]) > band or epoch - last[1] >= self.max_silence:
+            self._last[sensor_id] = (value, epoch)
+            return True
+        return False
+
+
+class WindowAggregator:
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self._open: dict[tuple[str, datetime], Window] = {}
+        self.closed_until: datetime | None = None  # windows ending by then have been uploaded
+
+    def start_of(self, ts: datetime) -> datetime:
+        return datetime.fromtimestamp(int(ts.timestamp()) // self.seconds * self.seconds, timezone.utc)
+
+    def uploaded(self, ts: datetime) -> bool:
+        """Whether the window `ts` falls in has already been closed and sent."""
+        return self.closed_until is not None and self.start_of(ts) + timedelta(seconds=self.seconds) <= self.closed_until
+
+    def add(self, sample: dict, ts: datetime) -> None:
+        start = self.start_of(ts)
+        key = (sample["sensor_id"], start)
+        window = self._open.get(key)
+        if window is None:
+            window = self._open[key] = Window(sample["sensor_id"], sample["sensor_type"], sample.get("unit"), start, self.seconds)
+        window.add(sample["value"])
+
+    def close(self, now: datetime | None = None) -> list[Window]:
+        """Windows that ended by `now` (all of them when None)."""
+        done = [k for k, w in self._open.items() if now is None or w.end <= now]
+        if now is not None:
+            self.closed_until = max(self.closed_until or now, now)
+        return [self._open.pop(k) for k in sorted(done, key=lambda k: k[1])]
+
+
+class DiskBuffer:
+    """Failed uploads as gzip files, oldest first; beyond `max_files` the oldest are dropped."""
+
+    def __init__(self, directory: str | Path, max_files: int = 10_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_files = max_files
+
+    def put(self, kind: str, body: bytes) -> None:
+        path = self.directory / f"{time.time_ns():020d}-{kind}.json.gz"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(body)
+        tmp.replace(path)  # atomic: a crash never leaves a half-written batch behind
+        pending = self.pending()
+        for old in pending[: max(0, len(pending) - self.max_files)]:
+            log.warning("edge buffer full, dropping %s", old.name)
+            old.unlink(missing_ok=True)
+
+    def pending(self) -> list[Path]:
+        return sorted(self.directory.glob("*.json.gz"))
+
+    @staticmethod
+    def kind(path: Path) -> str:
+        return path.name.split("-", 1)[1].removesuffix(".json.gz")
+
+
+@dataclass
+class EdgeStats:
+    samples: int = 0
+    forwarded: int = 0
+    windows: int = 0
+    uploads: int = 0
+    buffered: int = 0
+    bytes_sent: int = 0
+    raw_bytes: int = 0
+    by_kind: dict[str, int] = field(default_factory=dict)
+
+
+class EdgeAgent:
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        *,
+        client: httpx.Client | None = None,
+        interval: int = 60,
+        deadbands: dict[str, float] | None = None,
+        max_silence: float = 300.0,
+        buffer_dir: str | Path = ".edge-buffer",
+        gateway_id: str | None = None,
+        max_batch: int = 5000,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.client = client or httpx.Client(timeout=10)
+        self.deadband = Deadband(DEADBANDS if deadbands is None else deadbands, max_silence=max_silence)
+        self.windows = WindowAggregator(interval)
+        self.buffer = DiskBuffer(buffer_dir)
+        self.gateway_id = gateway_id
+        self.max_batch = max_batch
+        self.readings: list[dict] = []
+        self.stats = EdgeStats()
+
+    def observe(self, sample: dict) -> None:
+        ts = _parse(sample["timestamp"])
+        self.stats.samples += 1
+        # A sample for an already uploaded window can no longer be merged into it: forward it as is.
+        if self.windows.uploaded(ts) or self.deadband.passes(sample["sensor_id"], sample["sensor_type"], sample["value"], ts.timestamp()):
+            self.readings.append(sample)
+            self.stats.forwarded += 1
+        else:
+            self.windows.add(sample, ts)
+
+    def flush(self, now: datetime | None = None, final: bool = False) -> None:
+        """Upload closed windows (all on `final`) and pending readings; buffer what fails."""
+        self.drain()
+        closed = self.windows.close(None if final else now or datetime.now(timezone.utc))
+        self.stats.windows += len(closed)
+        batches = [("aggregates", {"gateway_id": self.gateway_id, "windows": [w.payload() for w in closed[i:i + self.max_batch]]})
+                   for i in range(0, len(closed), self.max_batch)]
+        batches += [("batch", {"readings": self.readings[i:i + self.max_batch]})
+                    for i in range(0, len(self.readings), self.max_batch)]
+        self.readings = []
+        for kind, payload in batches:
+            raw = json.dumps(payload).encode()
+            body = gzip.compress(raw)
+            self.stats.raw_bytes += len(raw)
+            # Keep order: while older batches wait in the buffer, new ones queue behind them.
+            if self.buffer.pending() or not self._send(kind, body):
+                self.buffer.put(kind, body)
+                self.stats.buffered += 1
+
+    def drain(self) -> int:
+        """Resend buffered batches oldest first; stops at the first failure. Returns batches sent."""
+        sent = 0
+        for path in self.buffer.pending():
+            if not self._send(DiskBuffer.kind(path), path.read_bytes()):
+                break
+            path.unlink(missing_ok=True)
+            sent += 1
+        return sent
+
+    def _send(self, kind: str, body: bytes) -> bool:
+        try:
+            r = self.client.post(
+                self.api_url + PATHS[kind],
+                content=body,
+                headers={"content-type": "application/json", "content-encoding": "gzip"},
+            )
+        except httpx.TransportError as e:
+            log.warning("edge upload failed (%s), buffering", e)
+            return False
+        if r.status_code >= 500 or r.status_code in (408, 429):
+            return False
+        if not r.is_success:  # rejected as invalid: resending would never succeed
+            log.error("edge upload rejected: %s %s", r.status_code, r.text[:200])
+        self.stats.uploads += 1
+        self.stats.bytes_sent += len(body)
+        self.stats.by_kind[kind] = self.stats.by_kind.get(kind, 0) + 1
+        return True
+
+
+def simulate(samples: int, rate: float, sensors_per_type: int = 10, start: datetime | None = None, realtime: bool = False):
+    """Samples from every simulated sensor in turn at `rate` samples/s per sensor."""
+    clock = (start or datetime.now(timezone.utc)).replace(tzinfo=None)  # naive UTC, as generate_heartbeat expects
+    signals = [
+        (f"{stype.upper()[:4]}-{i:02d}", stype, unit, low, high, sensor_signal(low, high))
+        for stype, unit, low, high in SENSOR_TYPES
+        for i in range(sensors_per_type)
+    ]
+    step = timedelta(seconds=1 / rate)
+    for n in range(samples):
+        sensor_id, stype, unit, low, high, signal = signals[n % len(signals)]
+        if n and n % len(signals) == 0:
+            clock += step
+            if realtime:
+                time.sleep(step.total_seconds())
+        yield generate_heartbeat(sensor_id, stype, unit, low, high, value=next(signal), timestamp=clock)
+
+
+def run(samples: int = 20_000, rate: float = 10.0, interval: int = 60, realtime: bool = False) -> EdgeStats:
+    agent = EdgeAgent(
+        interval=interval,
+        buffer_dir=os.environ.get("EDGE_BUFFER_DIR", ".edge-buffer"),
+        gateway_id=os.environ.get("EDGE_GATEWAY_ID") or f"edge-{random.randrange(1 << 16):04x}",
+    )
+    last_flush = None
+    for sample in simulate(samples, rate, realtime=realtime):
+        agent.observe(sample)
+        ts = _parse(sample["timestamp"])
+        if last_flush is None or (ts - last_flush).total_seconds() >= interval:
+            agent.flush(now=ts)
+            last_flush = ts
+    agent.flush(final=True)
+    s = agent.stats
+    stored = s.forwarded + s.windows
+    print(
+        f"{s.samples} samples -> {s.forwarded} readings + {s.windows} windows "
+        f"({stored / max(s.samples, 1):.1%} of raw rows); {s.uploads} uploads, {s.bytes_sent} bytes "
+        f"(gzip of {s.raw_bytes}); {len(agent.buffer.pending())} batches still buffered"
+    )
+    return s
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run(
+        samples=int(os.environ.get("EDGE_SAMPLES", "20000")),
+        rate=float(os.environ.get("EDGE_RATE", "10")),
+        interval=int(os.environ.get("EDGE_INTERVAL", "60")),
+        realtime=os.environ.get("EDGE_REALTIME", "") == "1",
+    )
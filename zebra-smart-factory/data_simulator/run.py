@@ -9,8 +9,19 @@ from data_simulator.simulator import SENSOR_TYPES, generate_heartbeat
 API_URL = os.environ.get("API_URL", "http://app:8000")
 
 
+def post_with_retry(url: str, payload: dict, attempts: int = 3) -> httpx.Response:
+    """POST, retrying on transport errors; the message_id makes a retried reading count once."""
+    for attempt in range(attempts):
+        try:
+            return httpx.post(url, json=payload, timeout=5)
+        except httpx.TransportError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
 def run(count: int = 50, interval_sec: float = 0.5) -> None:
-    """Generate and POST sensor readings to the API."""
+    """Generate and POST sensor readings to the API (device timestamp and message id included)."""
     url = f"{API_URL}/api/v1/telemetry/"
     posted = 0
     errors = 0
@@ -21,9 +32,8 @@ def run(count: int = 50, interval_sec: float = 0.5) -> None:
         if random.random() < 0.05:
             high, low = high + 5, low - 5
         payload = generate_heartbeat(sensor_id, stype, unit, low, high)
-        payload.pop("timestamp", None)
         try:
-            r = httpx.post(url, json=payload, timeout=5)
+            r = post_with_retry(url, payload)
             if r.is_success:
                 posted += 1
             else:
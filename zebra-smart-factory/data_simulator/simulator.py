@@ -2,8 +2,9 @@
 import json
 import random
 import time
+import uuid
 from datetime import datetime
-from typing import Generator
+from typing import Generator, Iterator
 
 SENSOR_TYPES = [
     ("temperature", "celsius", 18, 28),
@@ -13,16 +14,30 @@ SENSOR_TYPES = [
 ]
 
 
-def generate_heartbeat(sensor_id: str, sensor_type: str, unit: str, low: float, high: float) -> dict:
+def generate_heartbeat(
+    sensor_id: str, sensor_type: str, unit: str, low: float, high: float,
+    value: float | None = None, timestamp: datetime | None = None,
+) -> dict:
     return {
         "sensor_id": sensor_id,
         "sensor_type": sensor_type,
-        "value": round(random.uniform(low, high), 2),
+        "value": round(random.uniform(low, high) if value is None else value, 2),
         "unit": unit,
-        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "timestamp": (timestamp or datetime.utcnow()).isoformat() + "Z",
+        "message_id": uuid.uuid4().hex,
     }
 
 
+def sensor_signal(low: float, high: float, step: float = 0.01) -> Iterator[float]:
+    """A slowly wandering value inside [low, high]: a mean-reverting random walk, as real process values move."""
+    mid, span = (low + high) / 2, high - low
+    value = mid
+    while True:
+        value += random.gauss(0, step * span) + 0.01 * (mid - value)
+        value = min(max(value, low), high)
+        yield value
+
+
 def stream_heartbeats(interval_sec: float = 2) -> Generator[dict, None, None]:
     """Yield mock sensor heartbeats as JSON-serializable dicts."""
     idx = 0
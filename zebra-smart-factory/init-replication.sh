@@ -0,0 +1,3 @@
+#!/bin/sh
+# Lets the `postgres-replica` compose service stream WAL from this server (fresh volumes only).
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
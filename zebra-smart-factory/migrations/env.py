@@ -0,0 +1,31 @@
+"""Alembic environment: migrates the app database, or a connection passed by app.migrate."""
+from alembic import context
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.core.database import Base, engine
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",  # SQLite ALTER goes through table copies
+        compare_type=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    context.configure(url=str(engine.url), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+elif config.attributes.get("connection") is not None:
+    run_migrations(config.attributes["connection"])
+else:
+    with engine.connect() as connection:
+        run_migrations(connection)
+        connection.commit()
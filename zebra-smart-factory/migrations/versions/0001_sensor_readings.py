@@ -0,0 +1,38 @@
+"""sensor_readings
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_readings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('sensor_type', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('unit', sa.String(length=20), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_sensor_readings_id', 'sensor_readings', ['id'])
+    op.create_index('ix_sensor_readings_sensor_id', 'sensor_readings', ['sensor_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sensor_readings_sensor_id', table_name='sensor_readings')
+    op.drop_index('ix_sensor_readings_id', table_name='sensor_readings')
+    op.drop_table('sensor_readings')
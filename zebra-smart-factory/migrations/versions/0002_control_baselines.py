@@ -0,0 +1,44 @@
+"""control_baselines
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:00:01
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'control_baselines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=False),
+        sa.Column('center', sa.Float(), nullable=False),
+        sa.Column('sigma', sa.Float(), nullable=False),
+        sa.Column('ucl', sa.Float(), nullable=False),
+        sa.Column('lcl', sa.Float(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('reference_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('reference_end', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sensor_id', 'version', name='uq_control_baselines_sensor_version'),
+    )
+    op.create_index('ix_control_baselines_id', 'control_baselines', ['id'])
+    op.create_index('ix_control_baselines_sensor_id', 'control_baselines', ['sensor_id'])
+    op.create_index('ix_control_baselines_active', 'control_baselines', ['active'])
+
+
+def downgrade() -> None:
+    op.drop_table('control_baselines')
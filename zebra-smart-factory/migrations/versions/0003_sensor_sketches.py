@@ -0,0 +1,45 @@
+"""sensor_sketches
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 12:00:02
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_sketches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('sensor_type', sa.String(length=50), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('total_sq', sa.Float(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=False),
+        sa.Column('maximum', sa.Float(), nullable=False),
+        sa.Column('digest', sa.LargeBinary(), nullable=False),
+        sa.Column('distinct_values', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sensor_id', 'bucket_start', name='uq_sensor_sketches_sensor_bucket'),
+    )
+    op.create_index('ix_sensor_sketches_id', 'sensor_sketches', ['id'])
+    op.create_index('ix_sensor_sketches_sensor_id', 'sensor_sketches', ['sensor_id'])
+    op.create_index('ix_sensor_sketches_sensor_type', 'sensor_sketches', ['sensor_type'])
+    op.create_index('ix_sensor_sketches_bucket_start', 'sensor_sketches', ['bucket_start'])
+
+
+def downgrade() -> None:
+    op.drop_table('sensor_sketches')
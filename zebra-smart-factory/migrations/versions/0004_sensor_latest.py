@@ -0,0 +1,47 @@
+"""sensor_latest
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:03
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_latest',
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('sensor_type', sa.String(length=50), nullable=False),
+        sa.Column('unit', sa.String(length=20), nullable=True),
+        sa.Column('last_value', sa.Float(), nullable=False),
+        sa.Column('last_timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_reading_id', sa.Integer(), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('mean', sa.Float(), nullable=False),
+        sa.Column('m2', sa.Float(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=False),
+        sa.Column('maximum', sa.Float(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('center', sa.Float(), nullable=True),
+        sa.Column('ucl', sa.Float(), nullable=True),
+        sa.Column('lcl', sa.Float(), nullable=True),
+        sa.Column('limits_source', sa.String(length=20), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('sensor_id'),
+    )
+    op.create_index('ix_sensor_latest_sensor_type', 'sensor_latest', ['sensor_type'])
+    op.create_index('ix_sensor_latest_status', 'sensor_latest', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_table('sensor_latest')
@@ -0,0 +1,51 @@
+"""sensor_rollups and pipeline_watermarks
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 12:00:04
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('sensor_type', sa.String(length=50), nullable=False),
+        sa.Column('resolution', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('total_sq', sa.Float(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=False),
+        sa.Column('maximum', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sensor_id', 'resolution', 'bucket_start', name='uq_sensor_rollups_sensor_res_bucket'),
+    )
+    op.create_index('ix_sensor_rollups_id', 'sensor_rollups', ['id'])
+    op.create_index('ix_sensor_rollups_sensor_type', 'sensor_rollups', ['sensor_type'])
+    op.create_index('ix_sensor_rollups_res_bucket', 'sensor_rollups', ['resolution', 'bucket_start'])
+    op.create_table(
+        'pipeline_watermarks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('position', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('pipeline_watermarks')
+    op.drop_table('sensor_rollups')
@@ -0,0 +1,30 @@
+"""sensor_readings.dedup_key
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 12:00:05
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Same constraint name Postgres gives `unique=True`, so databases created either way match.
+    with op.batch_alter_table('sensor_readings') as batch:
+        batch.add_column(sa.Column('dedup_key', sa.String(length=200), nullable=True))
+        batch.create_unique_constraint('sensor_readings_dedup_key_key', ['dedup_key'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('sensor_readings') as batch:
+        batch.drop_constraint('sensor_readings_dedup_key_key', type_='unique')
+        batch.drop_column('dedup_key')
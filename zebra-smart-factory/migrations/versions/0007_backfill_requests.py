@@ -0,0 +1,34 @@
+"""backfill_requests
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 12:00:06
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'backfill_requests',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sensor_id', 'bucket_start', name='uq_backfill_requests_sensor_bucket'),
+    )
+    op.create_index('ix_backfill_requests_id', 'backfill_requests', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_table('backfill_requests')
@@ -0,0 +1,46 @@
+"""sensor_windows
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 12:00:07
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_windows',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.String(length=50), nullable=False),
+        sa.Column('sensor_type', sa.String(length=50), nullable=False),
+        sa.Column('unit', sa.String(length=20), nullable=True),
+        sa.Column('gateway_id', sa.String(length=100), nullable=True),
+        sa.Column('window_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('window_seconds', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('mean', sa.Float(), nullable=False),
+        sa.Column('m2', sa.Float(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=False),
+        sa.Column('maximum', sa.Float(), nullable=False),
+        sa.Column('last_value', sa.Float(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sensor_id', 'window_start', 'window_seconds', name='uq_sensor_windows_sensor_window'),
+    )
+    op.create_index('ix_sensor_windows_id', 'sensor_windows', ['id'])
+    op.create_index('ix_sensor_windows_sensor_type', 'sensor_windows', ['sensor_type'])
+    op.create_index('ix_sensor_windows_sensor_start', 'sensor_windows', ['sensor_id', 'window_start'])
+
+
+def downgrade() -> None:
+    op.drop_table('sensor_windows')
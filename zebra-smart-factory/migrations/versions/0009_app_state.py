@@ -0,0 +1,45 @@
+"""app_state, app_events
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 12:00:08
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The sql state backend used to create these at runtime: keep databases that already have them.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'app_state' not in existing:
+        op.create_table(
+            'app_state',
+            sa.Column('key', sa.String(length=255), nullable=False),
+            sa.Column('value', sa.LargeBinary(), nullable=False),
+            sa.Column('expires_at', sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint('key'),
+        )
+    if 'app_events' not in existing:
+        op.create_table(
+            'app_events',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('channel', sa.String(length=100), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_app_events_channel', 'app_events', ['channel'])
+
+
+def downgrade() -> None:
+    op.drop_table('app_events')
+    op.drop_table('app_state')
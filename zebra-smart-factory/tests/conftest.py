@@ -1,19 +1,46 @@
 """Pytest fixtures."""
 import os
+
 import pytest
 from fastapi.testclient import TestClient
 
 # Use SQLite for tests
 os.environ["TESTING"] = "1"
 
+from app.core.database import Base, engine, get_db
 from app.main import app
-from app.core.database import Base, get_db, engine
+
+
+@pytest.fixture(autouse=True)
+def state_backend():
+    """Fresh in-memory state backend per test, so cached summaries don't leak across tests."""
+    from app.core.state import MemoryBackend, set_state_backend
+    backend = MemoryBackend()
+    set_state_backend(backend)
+    yield backend
+    set_state_backend(None)
 
 
 @pytest.fixture
 def client():
     from app.core.database import SessionLocal
+    from app.services.baselines import baseline_cache
+    from app.services.ingest import recent_keys
+    from app.services.lateness import lateness_tracker
+    from app.services.ring_buffer import ring_store
+    from app.services.sketch_store import sketch_recorder
+    from app.services.spc_state import spc_state
+    from app.services.summary_service import summary_service
+    # One :memory: database shared by every thread (StaticPool): start each test from empty tables.
+    Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    baseline_cache.invalidate()
+    spc_state.reset()
+    summary_service.clear()
+    sketch_recorder.clear()
+    ring_store.reset()
+    recent_keys.clear()
+    lateness_tracker.clear()
 
     def override_get_db():
         db = SessionLocal()
@@ -31,6 +58,7 @@ def client():
 @pytest.fixture
 def db_session():
     from app.core.database import SessionLocal
+    Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
     db = SessionLocal()
     try:
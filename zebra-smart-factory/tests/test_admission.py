@@ -0,0 +1,126 @@
+"""Admission control: bulkheads, priority shedding, statement timeouts."""
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.admission import QUEUE_WAIT, SHED, AdmissionMiddleware, Bulkhead
+from app.core.database import analytics_engine, engine, is_statement_timeout
+
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) SELECT count(*) FROM n"
+
+
+def _app(ingest, analytics):
+    app = FastAPI()
+
+    @app.post("/api/v1/telemetry/batch")
+    async def write():
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    @app.get("/api/v1/analytics/charts/heatmap")
+    async def heavy():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, bulkheads={"ingest": ingest, "analytics": analytics})
+    return app
+
+
+def test_dashboard_burst_is_shed_before_ingest():
+    ingest = Bulkhead("t-ingest", limit=4, queue=100, queue_timeout=5)
+    analytics = Bulkhead("t-analytics", limit=2, queue=3, queue_timeout=0.1, retry_after=7, yields_to=ingest)
+
+    async def main():
+        transport = httpx.ASGITransport(app=_app(ingest, analytics))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            heavy = [c.get("/api/v1/analytics/charts/heatmap") for _ in range(30)]
+            writes = [c.post("/api/v1/telemetry/batch") for _ in range(40)]
+            return await asyncio.gather(*heavy), await asyncio.gather(*writes)
+
+    heavy, writes = asyncio.run(main())
+    assert all(r.status_code == 200 for r in writes)
+    shed = [r for r in heavy if r.status_code == 503]
+    assert 0 < len(shed) < len(heavy) and all(r.headers["retry-after"] == "7" for r in shed)
+
+    assert SHED.value(bulkhead="t-ingest", reason="queue_full") == 0
+    reasons = {reason: SHED.value(bulkhead="t-analytics", reason=reason) for reason in ("priority", "queue_full", "queue_timeout")}
+    assert sum(reasons.values()) == len(shed)
+    assert QUEUE_WAIT.count(bulkhead="t-ingest") > 0  # writes queued behind each other, none were rejected
+    assert ingest.active == analytics.active == 0 and not ingest.queued and not analytics.queued
+
+
+def test_bulkhead_hands_slots_to_waiters_in_order():
+    async def main():
+        b = Bulkhead("t-fifo", limit=1, queue=2, queue_timeout=1)
+        order = []
+
+        async def worker(i):
+            await b.acquire()
+            order.append(i)
+            await asyncio.sleep(0.01)
+            b.release()
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(Exception, match="queue_full"):
+            await b.acquire()
+        await asyncio.gather(*tasks)
+        return order, b.active
+
+    assert asyncio.run(main()) == ([0, 1, 2], 0)
+
+
+def test_analytics_statement_timeout():
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError) as e:
+            conn.execution_options(statement_timeout=0.05).execute(text(SLOW_QUERY))
+        assert is_statement_timeout(e.value)
+        assert conn.execute(text("SELECT 1")).scalar() == 1  # the ingest side has no timeout
+
+
+def test_timed_out_analytics_request_is_503(client):
+    client.post("/api/v1/telemetry/batch", json={"readings": [
+        {"sensor_id": f"TO-{i % 5}", "sensor_type": "temp", "value": float(i), "message_id": str(i)} for i in range(500)
+    ]})
+    previous = analytics_engine.get_execution_options().get("statement_timeout")
+    analytics_engine.update_execution_options(statement_timeout=1e-9)
+    try:
+        r = client.get("/api/v1/analytics/charts/heatmap?limit=2000")
+    finally:
+        analytics_engine.update_execution_options(statement_timeout=previous)
+    assert r.status_code == 503 and r.headers["retry-after"]
+    assert client.get("/api/v1/analytics/charts/heatmap?limit=2000").status_code == 200
+
+
+def test_blocking_analytics_handler_does_not_stall_ingest(client, monkeypatch):
+    from app.api.v1 import analytics
+    from app.main import app
+
+    build = analytics.build_snapshot
+
+    def slow_snapshot(*args):
+        time.sleep(0.6)  # a heavy query or numpy pass: blocks its thread, not the event loop
+        return build(*args)
+
+    monkeypatch.setattr(analytics, "build_snapshot", slow_snapshot)
+    reading = {"sensor_id": "ISO-1", "sensor_type": "temp", "value": 1.0}
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            heavy = asyncio.create_task(c.get("/api/v1/analytics/dashboard/snapshot"))
+            await asyncio.sleep(0.1)
+            t0 = time.perf_counter()
+            write = await c.post("/api/v1/telemetry/batch", json={"readings": [reading]})
+            elapsed = time.perf_counter() - t0
+            return write, elapsed, heavy.done(), await heavy
+
+    write, elapsed, heavy_done, heavy = asyncio.run(main())
+    assert write.status_code == 200 and write.json()["accepted"] == 1
+    assert elapsed < 0.3 and not heavy_done  # the write finished while the snapshot was still running
+    assert heavy.status_code == 200
@@ -0,0 +1,81 @@
+"""Edge agent (deadband, windows, disk buffer) and server-side merging of aggregated windows."""
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+from data_simulator.edge import EdgeAgent, simulate
+
+START = datetime(2026, 1, 5, 8, 0, 0)
+
+
+def _feed(agent, n=12_000, rate=5):
+    samples = list(simulate(n, rate, sensors_per_type=2, start=START))
+    for s in samples:
+        agent.observe(s)
+    return samples
+
+
+def _expected(samples, sensor_id):
+    values = np.array([s["value"] for s in samples if s["sensor_id"] == sensor_id])
+    return len(values), values.mean(), values.std()
+
+
+def test_edge_agent_windows_merge_exactly_with_forwarded_readings(client, tmp_path):
+    agent = EdgeAgent("http://testserver", client=client, interval=60, buffer_dir=tmp_path)
+    samples = _feed(agent)
+    agent.flush(final=True)
+    assert 0 < agent.stats.forwarded < len(samples) / 5  # the deadband suppresses most samples
+    assert agent.stats.windows > 0 and not agent.buffer.pending()
+
+    overview = {s["sensor_id"]: s for s in client.get("/api/v1/analytics/overview").json()["sensors"]}
+    for sensor_id in ("TEMP-00", "PRES-01"):
+        n, mean, std = _expected(samples, sensor_id)
+        assert overview[sensor_id]["count"] == n  # every sample exactly once: as a reading or in a window
+        assert np.isclose(overview[sensor_id]["mean"], mean) and np.isclose(overview[sensor_id]["std"], std)
+
+    chart = client.get("/api/v1/analytics/windows/xbar?sensor_id=TEMP-00").json()
+    assert chart["limits_source"] == "windows"
+    assert sum(p["count"] for p in chart["points"]) == _expected(samples, "TEMP-00")[0]
+    assert all(p["lcl"] < chart["center"] < p["ucl"] for p in chart["points"])
+    assert client.get("/api/v1/analytics/windows/xbar?sensor_id=NOPE").status_code == 404
+
+    # Rebuilding from readings and windows reproduces the incrementally merged stats.
+    assert client.post("/api/v1/analytics/overview/rebuild").status_code == 200
+    rebuilt = {s["sensor_id"]: s for s in client.get("/api/v1/analytics/overview").json()["sensors"]}
+    assert len(rebuilt) == len(overview) == 8
+    for sensor_id, row in overview.items():
+        assert rebuilt[sensor_id]["count"] == row["count"]
+        assert np.isclose(rebuilt[sensor_id]["mean"], row["mean"]) and np.isclose(rebuilt[sensor_id]["std"], row["std"])
+
+
+class _Offline(httpx.Client):
+    def post(self, *args, **kwargs):
+        raise httpx.ConnectError("gateway uplink down")
+
+
+def test_edge_agent_buffers_on_disk_and_resends_idempotently(client, tmp_path):
+    agent = EdgeAgent("http://testserver", client=_Offline(), interval=60, buffer_dir=tmp_path)
+    samples = _feed(agent, n=4000)
+    agent.flush(final=True)
+    buffered = agent.buffer.pending()
+    assert {p.name.split("-", 1)[1] for p in buffered} == {"aggregates.json.gz", "batch.json.gz"}
+
+    copies = [(p.name, p.read_bytes()) for p in buffered]
+    agent.client = client
+    assert agent.drain() == len(buffered) and not agent.buffer.pending()
+    for name, body in copies:  # a batch resent after a lost acknowledgement
+        (tmp_path / name).write_bytes(body)
+    agent.drain()
+
+    overview = {s["sensor_id"]: s for s in client.get("/api/v1/analytics/overview").json()["sensors"]}
+    assert overview["HUMI-01"]["count"] == _expected(samples, "HUMI-01")[0]
+
+
+def test_aggregate_windows_are_validated(client):
+    window = {"sensor_id": "W-1", "sensor_type": "temp", "window_start": "2026-01-05T08:00:00Z", "window_seconds": 60,
+              "count": 10, "mean": 5.0, "m2": 2.0, "min": 4.0, "max": 6.0}
+    assert client.post("/api/v1/telemetry/aggregates", json={"windows": [window]}).json() == {"accepted": 1, "duplicates": 0}
+    assert client.post("/api/v1/telemetry/aggregates", json={"windows": [window]}).json() == {"accepted": 0, "duplicates": 1}
+    bad = dict(window, mean=7.0)
+    assert client.post("/api/v1/telemetry/aggregates", json={"windows": [bad]}).status_code == 422
@@ -21,6 +21,46 @@ def test_telemetry_post(client):
     assert "id" in data
 
 
+def test_telemetry_replay_is_deduplicated(client):
+    payload = {
+        "sensor_id": "DUP-1", "sensor_type": "temp", "value": 21.0,
+        "timestamp": "2024-03-01T10:00:00Z", "message_id": "m-1",
+    }
+    first = client.post("/api/v1/telemetry/", json=payload).json()
+    assert first["timestamp"].startswith("2024-03-01T10:00:00") and first["duplicate"] is False
+    replay = client.post("/api/v1/telemetry/", json=payload).json()
+    assert replay["id"] == first["id"] and replay["duplicate"] is True
+
+    batch = [payload, {**payload, "message_id": "m-2", "value": 22.0}, {**payload, "message_id": "m-2"}]
+    batch.append({"sensor_id": "DUP-1", "sensor_type": "temp", "value": 23.0, "timestamp": "2024-03-01T10:00:05Z"})
+    batch.append(batch[-1])  # no message id: the device timestamp is the key
+    r = client.post("/api/v1/telemetry/batch", json={"readings": batch})
+    assert r.json() == {"accepted": 2, "duplicates": 3}
+
+    from app.services.ingest import recent_keys
+    recent_keys.clear()  # as after a restart: the unique index still rejects the replay
+    r = client.post("/api/v1/telemetry/batch", json={"readings": batch})
+    assert r.json() == {"accepted": 0, "duplicates": 5}
+    stats = client.get("/api/v1/analytics/spc/stats", params={"sensor_id": "DUP-1"}).json()
+    assert stats["count"] == 3
+
+
+def test_replay_of_a_deleted_reading_is_stored_again(client):
+    from app.core.database import SessionLocal
+
+    payload = {"sensor_id": "DUP-2", "sensor_type": "temp", "value": 21.0, "message_id": "m-1"}
+    first = client.post("/api/v1/telemetry/", json=payload).json()
+    with SessionLocal() as db:  # e.g. dropped by retention while the key is still remembered
+        db.query(SensorReading).filter(SensorReading.id == first["id"]).delete()
+        db.commit()
+    r = client.post("/api/v1/telemetry/", json=payload)
+    assert r.status_code == 200
+    assert r.json()["duplicate"] is False
+    with SessionLocal() as db:
+        assert db.query(SensorReading).filter(SensorReading.sensor_id == "DUP-2").count() == 1
+    assert client.post("/api/v1/telemetry/", json=payload).json()["duplicate"] is True
+
+
 def test_telemetry_list(client):
     client.post("/api/v1/telemetry/", json={"sensor_id": "T-1", "sensor_type": "temp", "value": 22.0})
     r = client.get("/api/v1/telemetry/")
@@ -29,6 +69,26 @@ def test_telemetry_list(client):
     assert len(r.json()) >= 1
 
 
+def test_telemetry_list_layouts_match_the_response_model(client):
+    from app.schemas.telemetry import TelemetryResponse
+
+    readings = [
+        {"sensor_id": f"L-{i % 2}", "sensor_type": "temp", "value": 20.0 + i, "unit": "C" if i % 2 else None,
+         "timestamp": f"2024-03-01T10:00:0{i}.25Z"}
+        for i in range(5)
+    ]
+    client.post("/api/v1/telemetry/batch", json={"readings": readings})
+    rows = client.get("/api/v1/telemetry/", params={"limit": 3}).json()
+    assert [r["value"] for r in rows] == [24.0, 23.0, 22.0]
+    assert rows == [TelemetryResponse.model_validate(r).model_dump(mode="json") for r in rows]
+
+    columns = client.get("/api/v1/telemetry/", params={"limit": 3, "layout": "columns"}).json()
+    assert set(columns) == {"id", "sensor_id", "sensor_type", "value", "unit", "timestamp"}
+    assert columns["value"] == [24.0, 23.0, 22.0] and columns["unit"] == [None, "C", None]
+    assert columns["timestamp"] == [r["timestamp"] for r in rows]
+    assert client.get("/api/v1/telemetry/", params={"layout": "csv"}).status_code == 422
+
+
 def test_analytics_health(client):
     r = client.get("/api/v1/analytics/health")
     assert r.status_code == 200
@@ -55,3 +115,45 @@ def test_spc_stats_with_data(client):
     assert data["count"] >= 10
     assert data["mean"] > 0
     assert "control_limits" in data
+
+
+def test_ewma_imr_rolling_charts_and_streaming_state(client):
+    for i in range(40):
+        client.post(
+            "/api/v1/telemetry/",
+            json={"sensor_id": "EW-1", "sensor_type": "temp", "value": 20.0 + (i % 5) * 0.2},
+        )
+    for path in ["/charts/ewma", "/charts/imr", "/charts/rolling", "/charts/rolling?seconds=30"]:
+        sep = "&" if "?" in path else "?"
+        r = client.get(f"/api/v1/analytics{path}{sep}sensor_id=EW-1")
+        assert r.status_code == 200
+        assert len(r.json()["data"]) > 0
+    r = client.get("/api/v1/analytics/spc/streaming?sensor_id=EW-1")
+    assert r.status_code == 200
+    state = r.json()
+    assert state["count"] == 40
+    assert state["ewma"]["lcl"] < state["ewma"]["value"] < state["ewma"]["ucl"]
+    assert client.get("/api/v1/analytics/spc/streaming?sensor_id=NOPE").status_code == 404
+
+
+def test_dashboard_snapshot_serves_every_panel_from_one_read(client):
+    readings = [
+        {"sensor_id": f"SN-{i % 3}", "sensor_type": "temp" if i % 3 else "pressure", "value": 20.0 + (i % 7) * 0.5}
+        for i in range(60)
+    ]
+    client.post("/api/v1/telemetry/batch", json={"readings": readings})
+    r = client.get("/api/v1/analytics/dashboard/snapshot?stats_limit=50&chart_limit=30")
+    assert r.status_code == 200
+    snap = r.json()
+    assert snap["window"] == 60
+    assert snap["stats"]["count"] == 50
+    assert snap["stats"]["control_limits"]["lcl"] < snap["stats"]["mean"] < snap["stats"]["control_limits"]["ucl"]
+    assert len(snap["series"]["values"]) == len(snap["series"]["cusum"]) == len(snap["series"]["labels"]) == 30
+    assert snap["series"]["xbar_limits"] is not None
+    assert dict(zip(snap["pareto"]["labels"], snap["pareto"]["values"])) == {"temp": 40, "pressure": 20}
+    heat = snap["heatmap"]
+    assert heat["y"] == ["pressure", "temp"] and heat["x"] == ["SN-0", "SN-1", "SN-2"]
+    assert heat["z"][0][1] is None and heat["z"][1][1] is not None
+
+    empty = client.get("/api/v1/analytics/dashboard/snapshot?window=1&stats_limit=1&chart_limit=1")
+    assert empty.status_code == 200
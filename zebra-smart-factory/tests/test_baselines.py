@@ -0,0 +1,80 @@
+"""Phase I / Phase II baseline tests."""
+from datetime import datetime, timedelta, timezone
+
+from app.models.sensor import SensorReading
+from app.services.baselines import compute_baselines
+from app.services.spc import ControlLimits, phase2_violations, subgroup_limits
+
+
+def test_phase2_violations():
+    limits = ControlLimits(center=10.0, ucl=13.0, lcl=7.0, sigma=1.0)
+    assert phase2_violations([10.0, 13.5, 6.0, 12.9], limits) == [1, 2]
+
+
+def test_subgroup_limits():
+    x = subgroup_limits(ControlLimits(10.0, 13.0, 7.0, 1.0), subgroup_size=4)
+    assert x.ucl == 11.5
+    assert x.lcl == 8.5
+
+
+def test_compute_baselines_versions(db_session):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    db_session.add_all([
+        SensorReading(sensor_id="BL-1", sensor_type="temp", value=10.0 + (i % 2), timestamp=t0 + timedelta(seconds=i))
+        for i in range(40)
+    ])
+    db_session.commit()
+    first = compute_baselines(db_session, t0, t0 + timedelta(hours=1), sensor_ids=["BL-1"])
+    assert len(first) == 1
+    assert first[0].version == 1
+    assert abs(first[0].center - 10.5) < 1e-9
+    assert abs(first[0].sigma - 0.5) < 1e-9
+    second = compute_baselines(db_session, t0, t0 + timedelta(hours=1), sensor_ids=["BL-1"])
+    assert second[0].version == 2
+    db_session.refresh(first[0])
+    assert first[0].active is False
+
+
+def test_compute_baselines_sigma_with_large_offset(db_session):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    db_session.add_all([
+        SensorReading(sensor_id="BL-BIG", sensor_type="counter", value=1e8 + (i % 2), timestamp=t0 + timedelta(seconds=i))
+        for i in range(40)
+    ])
+    db_session.commit()
+    (baseline,) = compute_baselines(db_session, t0, t0 + timedelta(hours=1))
+    assert abs(baseline.sigma - 0.5) < 1e-6  # avg(x^2) - avg(x)^2 loses this entirely
+
+
+def test_phase2_endpoints_use_baseline(client):
+    for i in range(30):
+        client.post("/api/v1/telemetry/", json={"sensor_id": "P2-1", "sensor_type": "temp", "value": 20.0 + (i % 3) * 0.1})
+    now = datetime.now(timezone.utc)
+    r = client.post(
+        "/api/v1/analytics/baselines/recompute",
+        json={"reference_start": (now - timedelta(hours=1)).isoformat(), "reference_end": (now + timedelta(minutes=1)).isoformat()},
+    )
+    assert r.status_code == 200
+    assert [b["sensor_id"] for b in r.json()] == ["P2-1"]
+
+    # A sustained shift inflates window sigma; the stored baseline still flags it.
+    for _ in range(10):
+        client.post("/api/v1/telemetry/", json={"sensor_id": "P2-1", "sensor_type": "temp", "value": 25.0})
+    stats = client.get("/api/v1/analytics/spc/stats?sensor_id=P2-1").json()
+    assert stats["limits_source"] == "baseline"
+    assert stats["baseline_version"] == 1
+    assert len(stats["anomaly_indices"]) == 10
+    window = client.get("/api/v1/analytics/spc/stats?sensor_id=P2-1&limits=window").json()
+    assert window["limits_source"] == "window"
+    assert len(window["anomaly_indices"]) < 10
+
+    anomalies = client.get("/api/v1/analytics/spc/anomalies?sensor_id=P2-1&method=baseline").json()
+    assert anomalies["method"] == "baseline"
+    assert anomalies["count"] == 10
+    assert client.get("/api/v1/analytics/spc/anomalies?sensor_id=P2-1&limits=baseline").json()["count"] == 10
+    zscore = client.get("/api/v1/analytics/spc/anomalies?sensor_id=P2-1&threshold=1").json()
+    assert zscore["method"] == "zscore"  # an explicit method is not overridden by the baseline
+    assert client.get("/api/v1/analytics/charts/spc-cusum?sensor_id=P2-1").status_code == 200
+    assert client.get("/api/v1/analytics/charts/spc-xbar?sensor_id=P2-1").status_code == 200
+    assert client.get("/api/v1/analytics/spc/stats?sensor_id=NOPE&limits=baseline").status_code == 404
+    assert len(client.get("/api/v1/analytics/baselines/").json()) == 1
@@ -0,0 +1,133 @@
+"""Compressed transport: inflating request bodies, negotiated and streamed response compression."""
+import asyncio
+import json
+import zlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.responses import StreamingResponse
+
+from app.core.compression import (
+    CompressionMiddleware,
+    available_encodings,
+    decode,
+    encode,
+    negotiate,
+)
+
+
+def _readings(n, sensor="GZ-1"):
+    return [{"sensor_id": sensor, "sensor_type": "temp", "value": 20.0 + i % 7, "message_id": f"m{i}"} for i in range(n)]
+
+
+def test_negotiate_prefers_allowed_encodings():
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, deflate") is None
+    assert negotiate("*") in ("zstd", "gzip")
+    assert negotiate("") is None
+
+
+def test_gzip_json_and_ndjson_ingest(client):
+    body = json.dumps({"readings": _readings(50)}).encode()
+    r = client.post(
+        "/api/v1/telemetry/batch",
+        content=encode(body, "gzip"),
+        headers={"content-encoding": "gzip", "content-type": "application/json"},
+    )
+    assert r.status_code == 200
+    assert r.json() == {"accepted": 50, "duplicates": 0}
+
+    lines = "\n".join(json.dumps(x) for x in _readings(60)) + "\n"
+    r = client.post(
+        "/api/v1/telemetry/ndjson",
+        content=encode(lines.encode(), "gzip"),
+        headers={"content-encoding": "gzip", "content-type": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    assert r.json() == {"accepted": 10, "duplicates": 50}
+
+    r = client.post("/api/v1/telemetry/ndjson", content=b'{"sensor_id": "X"}\n')
+    assert r.status_code == 422 and r.json()["detail"]["line"] == 1
+    assert client.post("/api/v1/telemetry/batch", content=b"x", headers={"content-encoding": "br"}).status_code == 415
+    assert client.post("/api/v1/telemetry/batch", content=b"not gzip", headers={"content-encoding": "gzip"}).status_code == 400
+
+
+def test_decompressed_size_is_capped():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(CompressionMiddleware, max_request_bytes=10_000)
+    client = TestClient(app)
+    ok = client.post("/echo", content=encode(b"a" * 10_000, "gzip"), headers={"content-encoding": "gzip"})
+    assert ok.json() == {"size": 10_000}
+    bomb = client.post("/echo", content=encode(b"a" * 1_000_000, "gzip"), headers={"content-encoding": "gzip"})
+    assert bomb.status_code == 413
+    truncated = encode(b"a" * 5_000, "gzip")[:-8]  # the stream ends before its trailer
+    assert client.post("/echo", content=truncated, headers={"content-encoding": "gzip"}).status_code == 400
+
+
+def test_zstd_decompressed_size_is_capped():
+    pytest.importorskip("zstandard")
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(CompressionMiddleware, max_request_bytes=10_000)
+    client = TestClient(app)
+    ok = client.post("/echo", content=encode(b"a" * 10_000, "zstd"), headers={"content-encoding": "zstd"})
+    assert ok.json() == {"size": 10_000}
+    bomb = client.post("/echo", content=encode(b"a" * 50_000_000, "zstd"), headers={"content-encoding": "zstd"})
+    assert bomb.status_code == 413
+
+
+def test_large_responses_are_compressed_small_ones_are_not(client):
+    client.post("/api/v1/telemetry/batch", json={"readings": _readings(300)})
+    big = client.get("/api/v1/telemetry/?limit=300", headers={"accept-encoding": "gzip"})
+    assert big.headers["content-encoding"] == "gzip" and "accept-encoding" in big.headers["vary"].lower()
+    assert len(big.json()) == 300
+    assert "content-encoding" not in client.get("/health", headers={"accept-encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/api/v1/telemetry/?limit=300", headers={"accept-encoding": "identity"}).headers
+
+
+def test_streaming_export_is_compressed_chunk_by_chunk(client):
+    client.post("/api/v1/telemetry/batch", json={"readings": _readings(120)})
+    r = client.get("/api/v1/telemetry/export?start=2000-01-01T00:00:00&format=csv", headers={"accept-encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    lines = r.text.splitlines()
+    assert lines[0] == "sensor_id,sensor_type,value,unit,timestamp" and len(lines) == 121
+    r = client.get("/api/v1/telemetry/export?start=2000-01-01T00:00:00&sensor_id=NOPE")
+    assert r.status_code == 200 and r.text == ""
+
+    async def rows():
+        for i in range(3):
+            yield f'{{"chunk": {i}}}\n'.encode() * 50
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():  # the client never disconnects
+        await asyncio.sleep(3600)
+
+    middleware = CompressionMiddleware(StreamingResponse(rows(), media_type="application/x-ndjson"))
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(middleware(scope, receive, send))
+    bodies = [m["body"] for m in sent if m["type"] == "http.response.body"]
+    decoder = zlib.decompressobj(31)
+    # Every chunk is flushed: it decodes completely without waiting for the next one.
+    assert [decoder.decompress(b) for b in bodies[:3]] == [f'{{"chunk": {i}}}\n'.encode() * 50 for i in range(3)]
+
+
+@pytest.mark.parametrize("encoding", available_encodings())
+def test_encode_round_trip(encoding):
+    data = b"".join(json.dumps(r).encode() + b"\n" for r in _readings(1000))
+    wire = encode(data, encoding)
+    assert len(wire) < len(data) / 5
+    assert decode(wire, encoding) == data
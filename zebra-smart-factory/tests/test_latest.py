@@ -0,0 +1,73 @@
+"""Latest-state table tests: batched Welford upserts, rebuild, plant overview endpoint."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.models.latest import SensorLatest
+from app.models.sensor import SensorReading
+from app.services.latest import rebuild_latest, record_latest
+
+T0 = datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+
+def _readings(db, sensor_id: str, values, start: int) -> list[SensorReading]:
+    rows = [
+        SensorReading(sensor_id=sensor_id, sensor_type="pressure", value=float(v), timestamp=T0 + timedelta(seconds=start + i))
+        for i, v in enumerate(values)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+def test_record_latest_merges_batches(db_session):
+    rng = np.random.default_rng(3)
+    values = rng.normal(100, 4, 90)
+    late = _readings(db_session, "LT-1", values[30:], start=30)
+    early = _readings(db_session, "LT-1", values[:30], start=0)
+    record_latest(db_session, late[:40], {})
+    record_latest(db_session, early, {})  # out-of-order batch: stats merge, last value stays
+    record_latest(db_session, late[40:], {})
+
+    row = db_session.get(SensorLatest, "LT-1")
+    assert row.count == 90
+    assert np.isclose(row.mean, values.mean())
+    assert np.isclose(row.m2 / row.count, values.var())
+    assert row.minimum == values.min() and row.maximum == values.max()
+    assert row.last_value == values[-1]
+
+    assert rebuild_latest(db_session) >= 1
+    rebuilt = db_session.get(SensorLatest, "LT-1")
+    db_session.refresh(rebuilt)
+    assert rebuilt.count == 90 and np.isclose(rebuilt.mean, values.mean())
+    assert rebuilt.last_value == values[-1]
+
+
+def test_plant_overview(client):
+    for i in range(30):
+        client.post("/api/v1/telemetry/", json={"sensor_id": "OV-1", "sensor_type": "temp", "value": 20.0 + (i % 3) * 0.1})
+        client.post("/api/v1/telemetry/", json={"sensor_id": "OV-2", "sensor_type": "temp", "value": 50.0 + (i % 3) * 0.1})
+    client.post("/api/v1/telemetry/", json={"sensor_id": "OV-2", "sensor_type": "temp", "value": 90.0})
+
+    r = client.get("/api/v1/analytics/overview")
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total"] == 2
+    assert data["by_status"] == {"in_control": 1, "out_of_control": 1}
+    first = data["sensors"][0]
+    assert first["sensor_id"] == "OV-2" and first["status"] == "out_of_control"
+    assert first["last_value"] == 90.0 and first["count"] == 31
+
+    only = client.get("/api/v1/analytics/overview", params={"status": "in_control"}).json()
+    assert [s["sensor_id"] for s in only["sensors"]] == ["OV-1"]
+
+    columns = client.get("/api/v1/analytics/overview", params={"layout": "columns"}).json()["sensors"]
+    assert columns["sensor_id"] == ["OV-2", "OV-1"] and columns["std"] == [s["std"] for s in data["sensors"]]
+
+
+def test_rebuild_variance_is_stable_for_large_tight_values(db_session):
+    values = 1e8 + np.random.default_rng(4).normal(0, 0.01, 200)
+    _readings(db_session, "LT-2", values, start=0)
+    assert rebuild_latest(db_session) == 1
+    row = db_session.get(SensorLatest, "LT-2")
+    assert np.isclose(row.m2 / row.count, values.var(), rtol=1e-3)  # avg(x²) - mean² loses it all
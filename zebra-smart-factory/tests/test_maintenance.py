@@ -0,0 +1,105 @@
+"""Maintenance summary tests, including trend-based breach forecasts."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import event
+
+from app.core.database import engine
+from app.models.sensor import SensorReading
+from app.services.maintenance_agent import _fallback_summary, load_context
+from app.services.spc import detect_anomalies_zscore, detect_anomalies_zscore_grouped
+from app.services.trends import fit_trends
+
+
+def test_grouped_zscore_matches_per_group():
+    rng = np.random.default_rng(0)
+    a = list(rng.normal(10, 1, 50)) + [30.0]
+    b = list(rng.normal(100, 5, 40)) + [10.0]
+    values = np.array(a + b)
+    codes = np.array([0] * len(a) + [1] * len(b))
+    flagged = detect_anomalies_zscore_grouped(values, codes)
+    expected = detect_anomalies_zscore(a) + [len(a) + i for i in detect_anomalies_zscore(b)]
+    assert list(flagged) == expected
+
+
+def test_load_context_single_query(db_session):
+    db_session.add_all(
+        [SensorReading(sensor_id="M-1", sensor_type="temp", value=20.0 + (i % 3) * 0.1) for i in range(30)]
+        + [SensorReading(sensor_id="M-1", sensor_type="temp", value=90.0)]
+        + [SensorReading(sensor_id="M-2", sensor_type="vib", value=5.0) for _ in range(5)]
+    )
+    db_session.commit()
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        ctx = load_context(db_session, sensor_id="M-1", limit=500)
+        summary = _fallback_summary(ctx)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+    assert ctx.total == 31
+    assert [s["sensor_id"] for s in ctx.sensors] == ["M-1"]
+    assert [a["value"] for a in ctx.anomalies] == [90.0]
+    assert "Anomalies detected: 1." in summary["summary"]
+
+
+def test_maintenance_summary_endpoint(client):
+    client.post("/api/v1/telemetry/", json={"sensor_id": "T-1", "sensor_type": "temp", "value": 22.0})
+    r = client.get("/api/v1/analytics/maintenance-summary?window_minutes=60")
+    assert r.status_code == 200
+    assert "Total readings: 1" in r.json()["summary"]
+
+
+def test_fit_trends_batches_weighted_and_robust_fits():
+    rng = np.random.default_rng(1)
+    t = np.arange(-24, 0) + 0.5
+    y = np.vstack([2.0 + 0.5 * t, 10.0 - 0.1 * t, 3.0 + 0 * t]) + rng.normal(0, 0.01, (3, len(t)))
+    w = rng.integers(1, 20, y.shape).astype(float)
+    w[2, :5] = 0  # hours without data
+    fit = fit_trends(t, y, w, robust_iterations=0)
+    for i in range(3):
+        m = w[i] > 0
+        slope, intercept = np.polyfit(t[m], y[i, m], 1, w=np.sqrt(w[i, m]))
+        assert np.isclose(fit.slope[i], slope) and np.isclose(fit.intercept[i], intercept)
+    assert list(fit.points) == [24, 24, 19]
+
+    y[0, 3] = 500.0  # one bad hour
+    assert abs(fit_trends(t, y, w, robust_iterations=0).slope[0] - 0.5) > 0.1
+    assert np.isclose(fit_trends(t, y, w).slope[0], 0.5, atol=0.01)
+
+
+def test_forecast_ranks_sensors_by_time_to_breach(client):
+    rng = np.random.default_rng(2)
+    now = datetime.now(timezone.utc)
+    hours = np.arange(0, 36, 1 / 6)  # a reading every 10 minutes for 36 hours
+    signals = {
+        "DRIFT-1": 50 + 0.2 * hours + rng.normal(0, 0.1, len(hours)),
+        "GROW-1": 5 * np.exp(0.05 * hours) * (1 + rng.normal(0, 0.002, len(hours))),
+        "FLAT-1": 50 + rng.normal(0, 0.5, len(hours)),
+    }
+    signals["DRIFT-1"][100] = 80.0  # a single spike does not bend the trend
+    start = now - timedelta(hours=36)
+    readings = [
+        {"sensor_id": s, "sensor_type": "vibration", "value": float(v), "timestamp": (start + timedelta(hours=float(h))).isoformat()}
+        for s, values in signals.items() for h, v in zip(hours, values)
+    ]
+    assert client.post("/api/v1/telemetry/batch", json={"readings": readings}).status_code == 200
+
+    r = client.get("/api/v1/analytics/maintenance/forecast")
+    assert r.status_code == 200
+    sensors = {f["sensor_id"]: f for f in r.json()["sensors"]}
+    ranked = [f["sensor_id"] for f in r.json()["sensors"]]
+    assert ranked[-1] == "FLAT-1" and sensors["FLAT-1"]["hours_to_breach"] is None
+
+    drift = sensors["DRIFT-1"]
+    assert drift["model"] == "linear" and drift["limit"] == "ucl" and drift["limits_source"] == "lifetime"
+    assert np.isclose(drift["slope_per_hour"], 0.2, atol=0.02) and np.isclose(drift["current"], 57.2, atol=0.5)
+    assert np.isclose(drift["hours_to_breach"], (drift["ucl"] - drift["current"]) / drift["slope_per_hour"], rtol=0.01)
+    grow = sensors["GROW-1"]
+    assert grow["model"] == "exponential" and grow["hours_to_breach"] is not None
+    assert np.isclose(grow["current"] * np.exp(0.05 * grow["hours_to_breach"]), grow["ucl"], rtol=0.05)
+
+    summary = client.get("/api/v1/analytics/maintenance-summary?refresh=true").json()
+    assert {f["sensor_id"] for f in summary["forecast"]} == {"DRIFT-1", "GROW-1"}
+    assert any(rec.startswith(f"Inspect {ranked[0]}") for rec in summary["recommendations"])
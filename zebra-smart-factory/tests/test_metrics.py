@@ -0,0 +1,77 @@
+"""Instrumentation tests."""
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import metrics
+from app.core.profiler import SamplingProfiler
+
+
+@pytest.fixture
+def enabled():
+    metrics.enable()
+    yield
+    metrics.disable()
+
+
+def test_histogram_render():
+    reg = metrics.Registry()
+    h = reg.histogram("demo_seconds", "demo", buckets=(0.1, 1.0))
+    h.observe(0.05, route="/a")
+    h.observe(0.5, route="/a")
+    out = reg.render()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in out
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 2' in out
+    assert 'demo_seconds_count{route="/a"} 2' in out
+
+
+def test_span_noop_when_disabled():
+    before = metrics.SPAN_LATENCY.count(span="test.disabled")
+    with metrics.span("test.disabled"):
+        pass
+    assert metrics.SPAN_LATENCY.count(span="test.disabled") == before
+
+
+def test_middleware_records_route_db_and_spans(enabled):
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        with metrics.span("test.work"):
+            pass
+        return {"id": item_id}
+
+    with TestClient(app) as c:
+        r = c.get("/items/7")
+    assert r.status_code == 200
+    assert 'db;dur=' in r.headers["server-timing"]
+    assert '"2 queries"' in r.headers["server-timing"]
+    assert "test.work;dur=" in r.headers["server-timing"]
+    assert metrics.REQUEST_LATENCY.count(method="GET", route="/items/{item_id}", status="200") == 1
+    assert 'route="/items/{item_id}"' in metrics.registry.render()
+
+
+def test_sampling_profiler_collects_stacks():
+    prof = SamplingProfiler(interval=0.001)
+    prof.start(duration=5)
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    out = prof.stop()
+    assert not prof.running
+    assert prof.status()["samples"] > 0
+    assert out.strip()
+
+
+def test_profiler_routes_disabled_without_token(client):
+    assert client.post("/debug/profiler/start").status_code == 404
+    assert client.get("/metrics").status_code == 404
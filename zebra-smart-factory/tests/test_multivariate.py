@@ -0,0 +1,113 @@
+"""Multivariate engine tests: alignment, correlation, T² limits and contributions, endpoints."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services.multivariate import (
+    _f_quantile,
+    align,
+    correlation,
+    fit_pca,
+    rolling_correlation,
+    score,
+    spectral_order,
+)
+
+
+def _machine(n: int, seed: int = 0) -> np.ndarray:
+    """temp, vibration, pressure driven by one load factor, plus an independent sensor."""
+    rng = np.random.default_rng(seed)
+    load = rng.normal(0, 1, n)
+    return np.column_stack([
+        50 + 2 * load + rng.normal(0, 0.3, n),
+        5 + 0.5 * load + rng.normal(0, 0.1, n),
+        100 - 3 * load + rng.normal(0, 0.5, n),
+        rng.normal(0, 1, n),
+    ])
+
+
+def test_align_fills_short_gaps_and_drops_sparse_sensors():
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(10):
+        ts = t0 + timedelta(minutes=i)
+        rows.append({"sensor_id": "A", "bucket_start": ts, "count": 2, "total": 2.0 * i})
+        if i not in (4, 5):
+            rows.append({"sensor_id": "B", "bucket_start": ts, "count": 1, "total": float(-i)})
+        if i < 3:
+            rows.append({"sensor_id": "C", "bucket_start": ts, "count": 1, "total": 1.0})
+    m = align(rows, max_gap=1, min_coverage=0.8)
+
+    assert m.sensors == ["A", "B"]  # C covers 3/10 buckets (+1 filled)
+    assert len(m.timestamps) == 9  # bucket 5 is 2 past B's last value
+    assert m.values[4].tolist() == [4.0, -3.0]  # bucket 4: B forward-filled
+    assert np.datetime64(t0.replace(tzinfo=None) + timedelta(minutes=6), "s") == m.timestamps[5]
+
+
+def test_correlation_matches_numpy_and_orders_clusters():
+    x = _machine(500)
+    corr = correlation(x)
+    assert np.allclose(corr, np.corrcoef(x, rowvar=False))
+
+    per_window = rolling_correlation(x, window=100, step=50)
+    assert per_window.shape == (9, 4, 4)
+    assert np.allclose(per_window[2], np.corrcoef(x[100:200], rowvar=False))
+
+    order = spectral_order(corr).tolist()
+    assert order[0] == 3 or order[-1] == 3  # the unrelated sensor ends up at an edge
+
+
+def test_f_quantile_approximation():
+    assert abs(_f_quantile(0.99, 2, 20) - 5.849) < 0.05
+    assert abs(_f_quantile(0.95, 5, 10) - 3.326) < 0.05
+
+
+def test_t2_and_spe_flag_broken_correlation():
+    x = _machine(600, seed=1)
+    model = fit_pca(x[:400], ["temp", "vib", "press", "other"], variance=0.9)
+    assert 1 <= len(model.eigenvalues) < 4
+
+    healthy = score(model, x[400:])
+    assert (healthy.t2 > model.t2_limit).mean() < 0.02
+    assert (healthy.spe > model.spe_limit).mean() < 0.02
+    assert np.allclose(healthy.contributions.sum(axis=1), healthy.t2)
+    assert np.allclose(healthy.spe_contributions.sum(axis=1), healthy.spe)
+
+    # Temperature and vibration rise while pressure does not fall: each value is in range.
+    faulty = x[400:].copy()
+    faulty[:, 0] += 3.0
+    faulty[:, 1] += 0.75
+    s = score(model, faulty)
+    assert ((s.t2 > model.t2_limit) | (s.spe > model.spe_limit)).mean() > 0.9
+
+
+def test_multivariate_endpoints(client):
+    t0 = (datetime.now(timezone.utc) - timedelta(hours=2)).replace(second=0, microsecond=0)
+    x = _machine(60, seed=2)
+    x[40:, 0] += 4.0  # temperature drifts on its own
+    names = ["MV-T", "MV-V", "MV-P", "MV-x"]
+    readings = [
+        {"sensor_id": name, "sensor_type": "mv", "value": float(x[i, j]), "timestamp": (t0 + timedelta(minutes=i, seconds=10)).isoformat()}
+        for i in range(60)
+        for j, name in enumerate(names)
+    ]
+    assert client.post("/api/v1/telemetry/batch", json={"readings": readings}).json()["accepted"] == 240
+    params = {"sensor_type": "mv", "hours": 3}
+
+    corr = client.get("/api/v1/analytics/multivariate/correlation", params=params | {"window": 20, "step": 10}).json()
+    assert corr["sensors"] == sorted(names) and corr["buckets"] == 60
+    assert {corr["top_pairs"][0]["a"], corr["top_pairs"][0]["b"]} <= {"MV-T", "MV-V", "MV-P"}
+    assert len(corr["rolling"]) == len(corr["windows"]) == 5
+
+    t2 = client.get(
+        "/api/v1/analytics/multivariate/t2", params=params | {"reference_end": (t0 + timedelta(minutes=30)).isoformat()}
+    ).json()
+    assert t2["reference_buckets"] == 30 and len(t2["points"]) == 60
+    flagged = [p for p in t2["points"][40:] if p["out_of_control"]]
+    assert len(flagged) > 15
+    assert all(next(iter(p["contributors"])) == "MV-T" for p in flagged)
+
+    chart = client.get("/api/v1/analytics/charts/correlation", params=params).json()
+    assert chart["data"][0]["type"] == "heatmap"
+    assert client.get("/api/v1/analytics/multivariate/t2", params={"hours": 3}).status_code == 422
+    assert client.get("/api/v1/analytics/multivariate/correlation", params={"sensor_type": "none"}).status_code == 404
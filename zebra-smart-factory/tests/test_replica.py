@@ -0,0 +1,84 @@
+"""Read-replica routing: analytics reads go to a fresh replica, writes and lagging replicas to the primary."""
+import pytest
+from sqlalchemy import create_engine
+
+from app.core.database import REPLICA_FALLBACKS, AnalyticsSession, Base, ReadRouter, read_router
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=replica)
+    yield replica
+    replica.dispose()
+
+
+def test_router_checks_lag_once_per_interval(tmp_path, replica):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    lag = {"seconds": 0.0, "probes": 0}
+
+    def measure(conn):
+        lag["probes"] += 1
+        return lag["seconds"]
+
+    router = ReadRouter(primary, replica, max_lag=5, check_interval=60, lag=measure)
+    assert router.bind() is replica and router.bind() is replica and lag["probes"] == 1
+
+    lag["seconds"] = 30.0
+    assert router.bind() is replica  # still within the check interval
+    router.reset()
+    before = REPLICA_FALLBACKS.value(reason="lag")
+    assert router.bind() is primary and REPLICA_FALLBACKS.value(reason="lag") == before + 1
+
+    down = ReadRouter(primary, create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"), lag=measure)
+    assert down.bind() is primary and REPLICA_FALLBACKS.value(reason="unreachable") >= 1
+    assert ReadRouter(primary).bind() is primary
+
+
+def test_analytics_reads_follow_the_router(client, replica, monkeypatch):
+    client.post("/api/v1/telemetry/", json={"sensor_id": "PRIMARY-1", "sensor_type": "temp", "value": 1.0})
+    with replica.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO sensor_readings (sensor_id, sensor_type, value, timestamp) "
+            "VALUES ('REPLICA-1', 'temp', 2.0, '2024-01-01 00:00:00')"
+        )
+    lag = {"seconds": 0.0}
+    monkeypatch.setattr(read_router, "replica", replica)
+    monkeypatch.setattr(read_router, "lag", lambda conn: lag["seconds"])
+    monkeypatch.setattr(read_router, "max_lag", 10.0)
+    read_router.reset()
+    try:
+        assert [r["sensor_id"] for r in client.get("/api/v1/telemetry/").json()] == ["REPLICA-1"]
+        with AnalyticsSession() as db:
+            assert db.get_bind() is replica
+
+        client.post("/api/v1/telemetry/", json={"sensor_id": "PRIMARY-2", "sensor_type": "temp", "value": 3.0})
+        with replica.connect() as conn:  # writes stay on the primary
+            assert conn.exec_driver_sql("SELECT count(*) FROM sensor_readings").scalar() == 1
+
+        lag["seconds"] = 60.0
+        read_router.reset()
+        ids = {r["sensor_id"] for r in client.get("/api/v1/telemetry/").json()}
+        assert ids == {"PRIMARY-1", "PRIMARY-2"}
+    finally:
+        read_router.reset()
+
+
+def test_sketch_stats_read_the_replica_and_flush_on_the_primary(client, replica, monkeypatch):
+    client.post("/api/v1/telemetry/batch", json={"readings": [
+        {"sensor_id": "SK-R", "sensor_type": "temp", "value": float(i)} for i in range(20)
+    ]})
+    monkeypatch.setattr(read_router, "replica", replica)
+    monkeypatch.setattr(read_router, "lag", lambda conn: 0.0)
+    monkeypatch.setattr(read_router, "max_lag", 10.0)
+    read_router.reset()
+    try:
+        # The buffered values are flushed to the primary; the fresh replica does not have them yet.
+        assert client.get("/api/v1/analytics/sketches/stats?sensor_id=SK-R").status_code == 404
+        with replica.connect() as conn:
+            assert conn.exec_driver_sql("SELECT count(*) FROM sensor_sketches").scalar() == 0
+        monkeypatch.setattr(read_router, "lag", lambda conn: 60.0)
+        read_router.reset()
+        assert client.get("/api/v1/analytics/sketches/stats?sensor_id=SK-R").json()["count"] == 20
+    finally:
+        read_router.reset()
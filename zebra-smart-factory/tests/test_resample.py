@@ -0,0 +1,75 @@
+"""Resampling tests: vectorized binning against pandas, interpolation, the analytics endpoint."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from app.services.resample import Points, resample_points
+
+
+def _irregular(seed: int = 3) -> tuple[Points, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    sensors = ["A", "B", "C"]
+    epochs = np.concatenate([np.sort(rng.uniform(0, 600, n)) for n in (400, 37, 5)])  # different rates
+    codes = np.repeat(np.arange(3), (400, 37, 5))
+    shuffle = rng.permutation(len(epochs))  # arrival order does not matter
+    points = Points(sensors, codes[shuffle], epochs[shuffle], rng.normal(0, 1, len(epochs))[shuffle])
+    return points, np.arange(0, 600, 30)
+
+
+def test_mean_and_last_match_pandas_resample():
+    points, grid = _irregular()
+    frame = pd.DataFrame({
+        "sensor": np.array(points.sensors)[points.codes],
+        "ts": pd.to_datetime(points.epochs, unit="s"),
+        "value": points.values,
+    }).sort_values("ts")
+    for method in ("mean", "last"):
+        matrix = resample_points(points, grid, 30, method)
+        assert matrix.shape == (len(grid), 3)
+        for k, name in enumerate(points.sensors):
+            s = frame[frame.sensor == name].set_index("ts")["value"].resample("30s", origin="epoch")
+            expected = getattr(s, method)().reindex(pd.to_datetime(grid, unit="s"))
+            assert np.allclose(matrix[:, k], expected.to_numpy(), equal_nan=True)
+
+
+def test_interpolate_per_sensor_without_extrapolation():
+    points, grid = _irregular()
+    matrix = resample_points(points, grid, 30, "interpolate")
+    for k in range(3):
+        mine = points.codes == k
+        order = np.argsort(points.epochs[mine])
+        x, y = points.epochs[mine][order], points.values[mine][order]
+        inside = (grid >= x[0]) & (grid <= x[-1])
+        assert np.allclose(matrix[inside, k], np.interp(grid[inside], x, y))
+        assert np.isnan(matrix[~inside, k]).all()
+
+
+def test_weighted_mean_of_rollup_points():
+    points = Points(["A"], np.zeros(2, dtype=np.int64), np.array([30.0, 90.0]), np.array([1.0, 4.0]), np.array([3.0, 1.0]))
+    assert resample_points(points, np.array([0]), 120, "mean")[0, 0] == 1.75
+
+
+def test_resample_endpoint(client):
+    t0 = (datetime.now(timezone.utc) - timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+    readings = [
+        {"sensor_id": "RS-FAST", "sensor_type": "rs", "value": float(i), "timestamp": (t0 + timedelta(seconds=10 * i)).isoformat()}
+        for i in range(36)
+    ] + [
+        {"sensor_id": "RS-SLOW", "sensor_type": "rs", "value": 100.0 + i, "timestamp": (t0 + timedelta(seconds=90 * i + 5)).isoformat()}
+        for i in range(4)
+    ]
+    client.post("/api/v1/telemetry/batch", json={"readings": readings})
+    params = {"sensor_type": "rs", "start": t0.isoformat(), "end": (t0 + timedelta(minutes=6)).isoformat(), "bucket_seconds": 60}
+
+    body = client.get("/api/v1/analytics/resample", params=params).json()
+    assert body["source"] == "raw" and len(body["timestamps"]) == 6
+    assert body["series"]["RS-FAST"] == [2.5, 8.5, 14.5, 20.5, 26.5, 32.5]
+    assert body["series"]["RS-SLOW"] == [100.0, 101.0, None, 102.0, 103.0, None]
+
+    last = client.get("/api/v1/analytics/resample", params=params | {"method": "last", "max_gap": 1}).json()
+    assert last["series"]["RS-SLOW"] == [100.0, 101.0, 101.0, 102.0, 103.0, 103.0]
+    interp = client.get("/api/v1/analytics/resample", params=params | {"method": "interpolate"}).json()
+    assert interp["series"]["RS-SLOW"][1] == 100.0 + 55 / 90
+
+    assert client.get("/api/v1/analytics/resample", params={"hours": 1}).status_code == 422
@@ -0,0 +1,134 @@
+"""Retention tests: downsample-then-expire job, late readings, resolution-aware history reads, daily summaries."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.rollup import SensorRollup
+from app.models.sensor import SensorReading
+from app.services.daily_summary import DAY, backfill, daily_report, run_incremental
+from app.services.retention import HOUR, MINUTE, RetentionService, read_history
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=10)
+
+
+@pytest.fixture
+def db():
+    """Own database: the job expires every sensor's old rows, not just this test's."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add(db, start: datetime, values, step: int = 20, sensor_id: str = "RT-1"):
+    db.add_all(
+        SensorReading(sensor_id=sensor_id, sensor_type="temp", value=float(v), timestamp=start + timedelta(seconds=i * step))
+        for i, v in enumerate(values)
+    )
+    db.commit()
+
+
+def test_job_rolls_up_expires_raw_and_folds_late_readings(db):
+    old = np.arange(360, dtype=float)  # 2 hours at one reading / 20 s
+    _add(db, OLD, old)
+    _add(db, NOW - timedelta(hours=3), [1.0, 2.0, 3.0])
+    job = RetentionService(batch_size=100)
+
+    report = job.run_once(db, now=NOW)
+    assert report["raw_deleted"] == 360
+    assert db.query(SensorReading).count() == 3  # recent raw is kept
+
+    minute = db.query(SensorRollup).filter_by(resolution=MINUTE, bucket_start=OLD).one()
+    assert (minute.count, minute.total, minute.minimum, minute.maximum) == (3, 3.0, 0.0, 2.0)
+    hours = db.query(SensorRollup).filter_by(resolution=HOUR).order_by(SensorRollup.bucket_start).all()
+    assert [h.count for h in hours[:2]] == [180, 180]
+    assert np.isclose(sum(h.total for h in hours), old.sum() + 6.0)
+
+    _add(db, OLD + timedelta(seconds=5), [100.0])  # late arrival for an already rolled-up minute
+    report = job.run_once(db, now=NOW)
+    assert report["late"] == 1 and report["raw_deleted"] == 1
+    db.refresh(minute)
+    assert (minute.count, minute.maximum) == (4, 100.0)
+
+    job.run_once(db, now=NOW + timedelta(days=91))
+    assert db.query(SensorRollup).filter_by(resolution=MINUTE).count() == 0
+    assert db.query(SensorRollup).filter_by(resolution=HOUR).count() == len(hours)  # hourly is kept forever
+
+
+def test_read_history_picks_resolution(db):
+    _add(db, OLD, np.arange(360, dtype=float))
+    _add(db, NOW - timedelta(minutes=30), np.arange(90, dtype=float))
+    RetentionService().run_once(db, now=NOW)
+
+    recent = read_history(db, NOW - timedelta(hours=1), NOW, sensor_id="RT-1", now=NOW)
+    assert recent.tier.name == "raw" and len(recent.mean) == 90
+
+    # Raw is gone 10 days back: minute rollups, then hourly once minutes exceed max_points.
+    week = read_history(db, OLD, NOW, sensor_id="RT-1", max_points=20_000, now=NOW)
+    assert week.tier.name == "1m"
+    assert week.count.sum() == 450 and np.isclose(week.mean[0], 1.0)
+    coarse = read_history(db, OLD, NOW, sensor_id="RT-1", max_points=500, now=NOW)
+    assert coarse.tier.name == "1h"
+    assert coarse.count.tolist() == [180, 180, 90]  # last hour is not rolled up yet: aggregated from raw
+
+
+def test_history_endpoint(client):
+    for v in (1.0, 2.0, 3.0):
+        client.post("/api/v1/telemetry/", json={"sensor_id": "HI-1", "sensor_type": "temp", "value": v})
+    start = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    r = client.get("/api/v1/telemetry/history", params={"sensor_id": "HI-1", "start": start})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["resolution"] == "raw"
+    assert [p["mean"] for p in data["points"]] == [1.0, 2.0, 3.0]
+    assert client.get("/api/v1/telemetry/history", params={"start": start}).status_code == 422
+
+
+def test_daily_summary_processes_only_new_readings_and_backfills(db):
+    day = datetime(2024, 5, 30, tzinfo=timezone.utc)
+    first = np.arange(300, dtype=float)
+    _add(db, day, first, step=600)  # spans three days
+    report = run_incremental(db, chunk=64)
+    assert report == {"readings": 300, "chunks": 5, "last_id": 300, "remaining": 0}
+    assert run_incremental(db)["readings"] == 0  # nothing new: nothing reprocessed
+
+    _add(db, day + timedelta(hours=1), [1000.0, 2000.0], sensor_id="RT-2")
+    assert run_incremental(db)["readings"] == 2
+    rows = db.query(SensorRollup).filter_by(resolution=DAY).all()
+    assert sum(r.count for r in rows) == 302 and np.isclose(sum(r.total for r in rows), first.sum() + 3000.0)
+
+    report = {r["day"]: r for r in daily_report(db, day, day + timedelta(days=3))}
+    on_day = first[:144]
+    assert report["2024-05-30"]["sensors"] == 2 and report["2024-05-31"]["count"] == 144
+    assert np.isclose(report["2024-05-30"]["mean"], np.append(on_day, [1000.0, 2000.0]).mean())
+
+    # Backfill repairs a day from raw readings, repeatably; days past raw retention are left alone.
+    db.query(SensorRollup).filter_by(resolution=DAY, sensor_id="RT-1", bucket_start=day).update({"count": 0, "total": 0.0})
+    db.commit()
+    _add(db, day + timedelta(hours=2), [5.0])  # not yet processed: the next incremental run adds it
+    for _ in range(2):
+        result = backfill(db, day, day + timedelta(days=1), now=NOW)
+        assert result == {"days": 1, "rows": 2, "skipped": []}
+        assert daily_report(db, day)[0]["count"] == 146
+    assert run_incremental(db)["readings"] == 1
+    assert daily_report(db, day)[0]["count"] == 147
+    assert backfill(db, day, day + timedelta(days=1), now=NOW + timedelta(days=30))["skipped"] == ["2024-05-30"]
+
+
+def test_daily_summary_endpoints(client):
+    readings = [{"sensor_id": "DS-1", "sensor_type": "temp", "value": float(i), "timestamp": f"2024-05-30T10:{i:02d}:00Z"} for i in range(10)]
+    client.post("/api/v1/telemetry/batch", json={"readings": readings})
+    run = client.post("/api/v1/retention/daily/run?max_chunks=1&chunk=4").json()
+    assert run["readings"] == 4 and run["remaining"] == 6
+    assert client.post("/api/v1/retention/daily/run").json()["remaining"] == 0
+    summary = client.get("/api/v1/retention/daily?start=2024-05-30T00:00:00Z").json()
+    assert summary["days"][0]["count"] == 10 and summary["days"][0]["mean"] == 4.5
+    r = client.post("/api/v1/retention/daily/backfill?start=2024-05-31T00:00:00&end=2024-05-30T00:00:00")
+    assert r.status_code == 422
@@ -0,0 +1,115 @@
+"""Sketch tests: t-digest / HLL accuracy and merging, bucket persistence, API."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.models.sensor import SensorReading
+from app.services.sketch_store import SketchRecorder, build_sketches, load_sketch
+from app.services.sketches import HyperLogLog, TDigest
+
+
+def test_tdigest_quantiles_and_merge():
+    rng = np.random.default_rng(1)
+    x = rng.normal(50, 5, 50_000)
+    qs = [0.01, 0.25, 0.5, 0.75, 0.99]
+    exact = np.quantile(x, qs)
+
+    whole = TDigest()
+    whole.add_many(x)
+    assert np.allclose(whole.quantile(qs), exact, atol=0.1)
+
+    merged = TDigest()
+    for part in np.array_split(x, 24):
+        d = TDigest()
+        d.add_many(part)
+        merged.merge(TDigest.from_bytes(d.to_bytes()))
+    assert merged.count == len(x)
+    assert np.allclose(merged.quantile(qs), exact, atol=0.1)
+    assert merged.quantile(0) == x.min() and merged.quantile(1) == x.max()
+
+
+def test_hyperloglog_distinct_counts_merge():
+    a, b = HyperLogLog(), HyperLogLog()
+    a.add_many(np.arange(0, 30_000, dtype=float))
+    b.add_many(np.arange(20_000, 50_000, dtype=float))
+    assert abs(a.count() - 30_000) / 30_000 < 0.05
+    merged = HyperLogLog.from_bytes(a.to_bytes()).merge(b)
+    assert abs(merged.count() - 50_000) / 50_000 < 0.05
+    small = HyperLogLog()
+    small.add_many(np.array([1.0, 2.0, 2.0, 3.0]))
+    assert round(small.count()) == 3
+
+
+def test_build_sketches_from_raw(db_session):
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    values = np.linspace(0, 99, 300)
+    db_session.add_all([
+        SensorReading(sensor_id="SK-1", sensor_type="temp", value=float(v), timestamp=t0 + timedelta(minutes=i))
+        for i, v in enumerate(values)
+    ])
+    db_session.commit()
+
+    end = t0 + timedelta(hours=6)
+    assert build_sketches(db_session, t0, end, sensor_ids=["SK-1"]) == 5  # 300 minutes -> 5 hourly buckets
+    assert build_sketches(db_session, t0, end, sensor_ids=["SK-1"]) == 5  # idempotent rebuild
+    sketch, buckets = load_sketch(db_session, "SK-1")
+    assert buckets == 5 and sketch.count == 300
+    assert np.isclose(sketch.mean, values.mean())
+    assert np.allclose(sketch.percentiles([25, 50, 75]), np.percentile(values, [25, 50, 75]), atol=1.0)
+
+    later, _ = load_sketch(db_session, "SK-1", start=t0 + timedelta(hours=3))
+    assert later.count == 120
+
+
+def test_sketch_endpoints(client):
+    for i in range(60):
+        client.post("/api/v1/telemetry/", json={"sensor_id": "SK-2", "sensor_type": "temp", "value": 20.0 + i % 10})
+    client.post("/api/v1/telemetry/", json={"sensor_id": "SK-2", "sensor_type": "temp", "value": 500.0})
+
+    r = client.get("/api/v1/analytics/sketches/stats", params={"sensor_id": "SK-2", "percentiles": "50,95"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["count"] == 61
+    assert data["distinct_values"] == 11
+    assert set(data["percentiles"]) == {"p50", "p95"}
+    assert data["iqr_upper"] < 500.0
+
+    r = client.get(
+        "/api/v1/analytics/spc/anomalies",
+        params={"sensor_id": "SK-2", "method": "iqr", "iqr_bounds": "sketch"},
+    )
+    assert r.status_code == 200
+    assert r.json()["count"] == 1
+
+    assert client.get("/api/v1/analytics/sketches/stats", params={"sensor_id": "nope"}).status_code == 404
+
+
+def test_recorders_flushing_the_same_new_bucket_merge(db_session, monkeypatch):
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    readings = [
+        SensorReading(sensor_id="SK-3", sensor_type="temp", value=float(i), timestamp=t0 + timedelta(seconds=i))
+        for i in range(10)
+    ]
+    first, second = SketchRecorder(), SketchRecorder()
+    first.add(readings[:6])
+    second.add(readings[6:])
+    assert first.flush(db_session) == 1
+    assert second.flush(db_session) == 1  # the bucket row exists now: merged, not a unique violation
+    sketch, buckets = load_sketch(db_session, "SK-3")
+    assert buckets == 1 and sketch.count == 10 and sketch.minimum == 0 and sketch.maximum == 9
+
+    second.add(readings[:4])
+
+    def fail():
+        raise OperationalError("COMMIT", {}, Exception("connection lost"))
+
+    monkeypatch.setattr(db_session, "commit", fail)
+    with pytest.raises(OperationalError):
+        second.flush(db_session)
+    second.flush_every = 1
+    assert second.maybe_flush(db_session) == 0  # logged, not raised into the ingest request
+    monkeypatch.undo()
+    assert second.flush(db_session) == 1  # the failed flush kept its values
+    assert load_sketch(db_session, "SK-3")[0].count == 14
@@ -1,11 +1,19 @@
 """SPC service tests."""
+import numpy as np
 import pytest
+
 from app.services.spc import (
-    simple_limits,
-    xbar_r_limits,
+    EWMAState,
+    MovingRangeState,
+    RollingWindow,
     cusum,
-    detect_anomalies_zscore,
     detect_anomalies_iqr,
+    detect_anomalies_zscore,
+    ewma,
+    imr,
+    rolling_stats,
+    simple_limits,
+    xbar_r_limits,
 )
 
 
@@ -47,3 +55,59 @@ def test_xbar_r_limits():
     xbar_lim, r_lim = xbar_r_limits(values, subgroup_size=5)
     assert xbar_lim.center > 0
     assert xbar_lim.ucl > xbar_lim.lcl
+
+
+def test_ewma_incremental_matches_batch():
+    values = list(np.random.default_rng(1).normal(10, 2, 200))
+    batch = ewma(values, lam=0.2, center=10.0, sigma=2.0)
+    state = EWMAState(center=10.0, sigma=2.0, lam=0.2)
+    for i, v in enumerate(values):
+        z, ucl, lcl = state.update(v)
+        assert z == pytest.approx(batch.z[i])
+        assert ucl == pytest.approx(batch.ucl[i])
+        assert lcl == pytest.approx(batch.lcl[i])
+
+
+def test_imr_incremental_matches_batch():
+    values = list(np.random.default_rng(2).normal(5, 1, 100))
+    batch = imr(values)
+    state = MovingRangeState()
+    for v in values:
+        state.update(v)
+    individuals, moving_range = state.limits()
+    assert state.mr_bar == pytest.approx(batch.moving_range.center)
+    assert individuals.ucl == pytest.approx(batch.individuals.ucl)
+    assert moving_range.ucl == pytest.approx(batch.moving_range.ucl)
+
+
+def test_rolling_window_matches_batch():
+    values = list(np.random.default_rng(3).normal(0, 1, 300))
+    batch = rolling_stats(values, window=25)
+    window = RollingWindow(size=25)
+    for i, v in enumerate(values):
+        window.update(v, float(i))
+        assert window.mean == pytest.approx(batch["mean"][i])
+        assert window.std == pytest.approx(batch["std"][i], abs=1e-9)
+        assert window.percentile(95) == pytest.approx(batch["p95"][i])
+
+
+def test_rolling_window_percentiles_over_many_buckets():
+    values = list(np.round(np.random.default_rng(5).normal(0, 1, 6000), 1))  # with duplicates
+    window = RollingWindow(size=1500)
+    for i, v in enumerate(values):
+        window.update(v)
+        if i % 250 == 0 or i == len(values) - 1:
+            recent = values[max(0, i - 1499):i + 1]
+            for p in (5, 50, 95):
+                assert window.percentile(p) == pytest.approx(np.percentile(recent, p))
+
+
+def test_rolling_window_by_time():
+    window = RollingWindow(seconds=10)
+    for t in range(30):
+        window.update(float(t), float(t))
+    assert window.n == 11
+    assert window.mean == pytest.approx(24.0)
+    ts = np.array([np.datetime64("2025-01-01T00:00:00") + np.timedelta64(t, "s") for t in range(30)])
+    batch = rolling_stats([float(t) for t in range(30)], seconds=10, timestamps=ts)
+    assert batch["count"][-1] == 10  # pandas time windows are (t-10s, t]
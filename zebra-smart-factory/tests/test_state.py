@@ -0,0 +1,102 @@
+"""State backend tests: in-memory and SQL (two instances sharing one SQLite file)."""
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+
+from app.core.state import MemoryBackend, SQLBackend
+from app.migrate import upgrade
+from app.services.spc_state import SPCStateRegistry, StreamingSPC
+
+
+def _wait_for(cond, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return cond()
+
+
+def test_memory_backend_ttl_lock_and_pubsub():
+    b = MemoryBackend(max_entries=2)
+    b.set("a", b"1", ttl=0.05)
+    assert b.get("a") == b"1"
+    assert b.set_if_absent("a", b"2") is False
+    time.sleep(0.06)
+    assert b.get("a") is None
+    assert b.set_if_absent("a", b"2") is True
+
+    b.set("b", b"x")
+    b.set("c", b"y")
+    assert b.get("a") is None  # LRU eviction
+
+    got = []
+    b.subscribe("ch", got.append)
+    b.publish("ch", "hello")
+    assert got == ["hello"]
+
+
+def test_sql_backend_shared_between_instances(tmp_path):
+    url = f"sqlite:///{tmp_path / 'state.db'}"
+    upgrade(create_engine(url))  # a separate STATE_BACKEND_URL database is migrated like the app's
+    a = SQLBackend(create_engine(url), poll_interval=0.02)
+    b = SQLBackend(create_engine(url), poll_interval=0.02)
+    try:
+        a.set("k", b"v", ttl=30)
+        assert b.get("k") == b"v"
+        assert a.set_if_absent("lock", b"a", ttl=30) is True
+        assert b.set_if_absent("lock", b"b", ttl=30) is False
+        b.delete("lock")
+        assert b.set_if_absent("lock", b"b", ttl=0.01) is True
+        time.sleep(0.02)
+        assert a.set_if_absent("lock", b"a", ttl=30) is True  # expired lease is taken over
+
+        got = []
+        b.subscribe("news", got.append)
+        time.sleep(0.05)
+        a.publish("news", "one")
+        a.publish("other", "ignored")
+        assert _wait_for(lambda: got == ["one"])
+    finally:
+        a.close()
+        b.close()
+
+
+def test_sql_backend_relistens_after_the_connection_drops(tmp_path, caplog):
+    backend = SQLBackend(create_engine(f"sqlite:///{tmp_path / 'state.db'}"))
+    attempts = []
+
+    def listen():  # stands in for a Postgres LISTEN connection that drops twice
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError("server closed the connection unexpectedly")
+        backend._stop.wait()
+
+    backend._listen = listen
+    thread = threading.Thread(target=backend._listen_postgres)
+    thread.start()
+    try:
+        assert _wait_for(lambda: len(attempts) == 3)
+    finally:
+        backend.close()
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert attempts[2] - attempts[1] > attempts[1] - attempts[0]  # backoff grows
+    assert sum("LISTEN connection lost" in r.message for r in caplog.records) == 2
+
+
+def test_spc_registry_applies_fanned_out_readings_once():
+    registry = SPCStateRegistry()
+    registry._states["S-1"] = StreamingSPC(10.0, 1.0, warmup=0)
+    registry._seen.add(1)
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    msg = json.dumps([[1, "S-1", 10.0, ts], [2, "S-1", 11.0, ts + 1], [3, "S-9", 5.0, ts]])
+    registry.apply(msg)
+    registry.apply(msg)  # echo of the same batch
+    state = registry._states["S-1"]
+    assert state.mr.n == 1
+    assert state.last_value == 11.0
+    assert "S-9" not in registry._states
@@ -0,0 +1,88 @@
+"""Summary service tests (offline, stub LLM)."""
+import asyncio
+
+from app.core.database import SessionLocal
+from app.models.sensor import SensorReading
+from app.services.llm import StubLLMClient
+from app.services.summary_service import SummaryService
+
+
+def _seed(db, sensor_id: str, values: list[float]) -> None:
+    db.add_all([SensorReading(sensor_id=sensor_id, sensor_type="temp", value=v) for v in values])
+    db.commit()
+
+
+async def test_stale_while_revalidate_and_single_flight(db_session):
+    _seed(db_session, "S-1", [20.0 + (i % 3) * 0.1 for i in range(30)])
+    llm = StubLLMClient(delay=0.05)
+    svc = SummaryService(llm=llm, refresh_interval=0, stale_after=3600, session_factory=SessionLocal)
+
+    # First requests for a scope get the rule-based summary while one LLM call runs in the background.
+    first = [await svc.get("S-1", 500) for _ in range(5)]
+    assert first[0]["pending"] and first[0]["summary"].startswith("Total readings: 30")
+    assert len({r["fingerprint"] for r in first}) == 1
+    await svc.wait_revalidated()
+    assert llm.calls == 1
+
+    again = await svc.get("S-1", 500)
+    assert again["cached"] is True and again["summary"].startswith("[stub]")
+    assert again["fingerprint"] == first[0]["fingerprint"]
+
+    # A fresh summary is served as is, even though the anomaly picture changed...
+    _seed(db_session, "S-1", [95.0])
+    assert (await svc.get("S-1", 500))["fingerprint"] == again["fingerprint"]
+    assert llm.calls == 1
+
+    # ...and a stale one is still served right away, then revalidated in the background.
+    svc.stale_after = 0
+    stale = await svc.get("S-1", 500)
+    assert stale["fingerprint"] == again["fingerprint"] and stale["cached"] is True
+    await svc.wait_revalidated()
+    assert llm.calls == 2
+    changed = await svc.get("S-1", 500)
+    assert changed["fingerprint"] != again["fingerprint"]
+    await svc.wait_revalidated()  # still stale: revalidated again (tests share one SQLite connection)
+
+    forced = await svc.get("S-1", 500, refresh=True)
+    assert forced["cached"] is False and llm.calls == 3
+
+
+async def test_background_refresh_wakes_on_out_of_limit_reading(db_session):
+    _seed(db_session, "S-2", [50.0 + (i % 4) * 0.2 for i in range(40)])
+    llm = StubLLMClient()
+    svc = SummaryService(llm=llm, refresh_interval=3600, session_factory=SessionLocal)
+    await svc.get("S-2", 500)
+    await svc.wait_revalidated()
+    assert llm.calls == 1
+
+    svc.start(SessionLocal)
+    try:
+        _seed(db_session, "S-2", [500.0])
+        svc.observe("S-2", 500.0)
+        for _ in range(50):
+            if llm.calls >= 2:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await svc.stop()
+    assert llm.calls >= 2
+    hit = await svc.get("S-2", 500)
+    assert hit["cached"] is True
+
+
+async def test_workers_share_one_generation_through_backend(db_session):
+    from app.core.state import MemoryBackend
+
+    _seed(db_session, "S-3", [30.0 + (i % 5) * 0.1 for i in range(30)])
+    backend = MemoryBackend()
+    llm_a, llm_b = StubLLMClient(delay=0.05), StubLLMClient(delay=0.05)
+    worker_a = SummaryService(llm=llm_a, refresh_interval=0, backend=backend)
+    worker_b = SummaryService(llm=llm_b, refresh_interval=0, backend=backend)
+
+    await worker_a.get("S-3", 500)
+    await worker_b.get("S-3", 500)
+    await asyncio.gather(worker_a.wait_revalidated(), worker_b.wait_revalidated())
+    assert llm_a.calls + llm_b.calls == 1
+    a, b = await worker_a.get("S-3", 500), await worker_b.get("S-3", 500)
+    assert a["fingerprint"] == b["fingerprint"]
+    assert a["summary"] == b["summary"] and a["summary"].startswith("[stub]")
@@ -0,0 +1,155 @@
+"""Write-ahead ingest log: durable acks, rotation, crash recovery, checkpointed idempotent replay."""
+import asyncio
+
+import pytest
+
+from app.core.database import SessionLocal
+from app.services.wal import CHECKPOINT, IngestLog, Position, WalConsumer, set_ingest_log
+
+
+def _readings(n, sensor="WAL-1", **extra):
+    return [{"sensor_id": sensor, "sensor_type": "temp", "value": float(i), **extra} for i in range(n)]
+
+
+def _all(log):
+    records, _ = log.read(log.checkpoint(), 1_000_000)
+    return [r for record in records for r in record]
+
+
+def test_append_rotate_and_recover_torn_tail(tmp_path):
+    log = IngestLog(tmp_path, segment_bytes=2000, fsync_interval=0)
+    seqs = [log.append(_readings(5, message_id=f"m{i}")) for i in range(20)]
+    assert log.wait(seqs[-1], timeout=5)
+    assert len(log.segments()) > 2  # rotated
+    log.close()
+
+    with open(max(tmp_path.glob("*.wal")), "ab") as f:
+        f.write(b"\x50\x00\x00\x00\x01\x02")  # crash in the middle of writing a record
+    log = IngestLog(tmp_path)
+    values = _all(log)
+    assert len(values) == 100 and [r["value"] for r in values[:5]] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    log.append(_readings(1, message_id="after"))  # appends continue after the truncated tail
+    log.close()
+    log = IngestLog(tmp_path)
+    assert _all(log)[-1]["message_id"] == "after"
+    log.close()
+
+
+def test_checkpoint_drops_consumed_segments(tmp_path):
+    log = IngestLog(tmp_path, segment_bytes=1000, fsync_interval=0)
+    for i in range(30):
+        log.wait(log.append(_readings(3, message_id=f"m{i}")), timeout=5)
+    records, nxt = log.read(log.checkpoint(), 30)
+    assert sum(map(len, records)) == 30
+    log.commit(nxt)
+    assert log.segments()[0] == nxt.segment and (tmp_path / CHECKPOINT).exists()
+    log.close()
+    reopened = IngestLog(tmp_path)
+    assert reopened.checkpoint() == nxt and len(_all(reopened)) == 60
+    reopened.close()
+
+
+def test_slots_are_exclusive_per_process(tmp_path):
+    first = IngestLog.open_slot(tmp_path)
+    second = IngestLog.open_slot(tmp_path)
+    assert (first.directory.name, second.directory.name) == ("slot-0", "slot-1")
+    first.close()
+    third = IngestLog.open_slot(tmp_path)  # a restarted worker takes over the orphaned slot
+    assert third.directory.name == "slot-0"
+    second.close()
+    third.close()
+
+
+def test_orphaned_slots_are_drained_and_removed(client, tmp_path):
+    orphan = IngestLog(tmp_path / "slot-1", fsync_interval=0)
+    orphan.wait(orphan.append(_readings(5, "WAL-ORPHAN")), timeout=5)
+    orphan.close()  # its worker was scaled away
+    live = IngestLog.try_open(tmp_path / "slot-2", create=True)  # another worker's: left alone
+    own = IngestLog.open_slot(tmp_path)
+    live.wait(live.append(_readings(3, "WAL-LIVE")), timeout=5)
+    try:
+        with SessionLocal() as db:
+            assert WalConsumer().drain_orphans(db, own) == 5
+        assert not (tmp_path / "slot-1").exists() and live.directory.exists()
+        assert _count(client, "WAL-ORPHAN") == 5 and _count(client, "WAL-LIVE") == 0
+    finally:
+        own.close()
+        live.close()
+
+
+def test_full_log_rejects_with_retry_after(client, tmp_path):
+    log = IngestLog(tmp_path, max_bytes=500)
+    set_ingest_log(log)
+    try:
+        assert client.post("/api/v1/telemetry/batch", json={"readings": _readings(20)}).status_code == 202
+        r = client.post("/api/v1/telemetry/batch", json={"readings": _readings(20)})
+        assert r.status_code == 503 and r.headers["retry-after"]
+    finally:
+        set_ingest_log(None)
+        log.close()
+
+
+@pytest.fixture
+def wal(client, tmp_path):
+    log = IngestLog(tmp_path / "wal", fsync_interval=0.001)
+    set_ingest_log(log)
+    yield log
+    set_ingest_log(None)
+    log.close()
+
+
+def _drain(client, consumer, log):
+    with SessionLocal() as db:
+        return consumer.drain(db, log)
+
+
+def _count(client, sensor_id):
+    sensors = {s["sensor_id"]: s for s in client.get("/api/v1/analytics/overview").json()["sensors"]}
+    return sensors.get(sensor_id, {}).get("count", 0)
+
+
+def test_api_acks_durably_and_consumer_replays_idempotently(client, wal):
+    r = client.post("/api/v1/telemetry/batch", json={"readings": _readings(40) + _readings(10, "WAL-2", message_id="dup")})
+    assert r.status_code == 202 and r.json() == {"accepted": 50, "duplicates": 0}
+    assert client.post("/api/v1/telemetry/", json=_readings(1, "WAL-3")[0]).status_code == 202
+    assert client.post("/api/v1/telemetry/ndjson", content=b'{"sensor_id": "WAL-3", "sensor_type": "temp", "value": 1}\n').status_code == 202
+    assert _count(client, "WAL-1") == 0  # acknowledged, not yet loaded
+
+    consumer = WalConsumer(batch=20)
+    loaded = 0
+    while n := _drain(client, consumer, wal):
+        loaded += n
+    assert loaded == 52
+    assert (_count(client, "WAL-1"), _count(client, "WAL-2"), _count(client, "WAL-3")) == (40, 1, 2)
+
+    # A crash before the checkpoint was written replays everything: nothing is stored twice.
+    wal.commit(Position(0, 0))
+    assert _drain(client, WalConsumer(batch=1000), wal) == 52
+    assert (_count(client, "WAL-1"), _count(client, "WAL-2"), _count(client, "WAL-3")) == (40, 1, 2)
+
+
+def test_failed_load_keeps_the_checkpoint(client, wal):
+    client.post("/api/v1/telemetry/batch", json={"readings": _readings(5)})
+
+    class Down:
+        def __getattr__(self, name):
+            raise ConnectionError("database unreachable")
+
+    with pytest.raises(ConnectionError):
+        WalConsumer().drain(Down(), wal)
+    assert wal.checkpoint() == Position(0, 0)
+    assert _drain(client, WalConsumer(), wal) == 5
+
+
+def test_durable_resolves_waiters_from_the_fsync_thread(tmp_path):
+    log = IngestLog(tmp_path, fsync_interval=0.01)
+
+    async def main():
+        seqs = [log.append(_readings(1, message_id=f"m{i}")) for i in range(50)]
+        await asyncio.wait_for(asyncio.gather(*(log.durable(s) for s in seqs)), 5)
+
+    asyncio.run(main())
+    log.close()
+    log = IngestLog(tmp_path)
+    assert len(_all(log)) == 50
+    log.close()